@@ -1,12 +1,16 @@
 from __future__ import annotations
+import click
+import os
+import tempfile
 from flask import Flask, render_template, url_for
 from flask_login import LoginManager, login_required
 from pathlib import Path
-from collections import Counter
-from .helpers import armazenamento_json as repo
+from .helpers import armazenamento_json, cache_exportacao, kpis, seguranca
+from .helpers.uploads import Requisicao
 
 def criar_app():
     app = Flask(__name__, template_folder="templates", static_folder="static")
+    app.request_class = Requisicao  # uploads com SHA-256 e limite de tamanho (helpers/uploads)
     app.config["SECRET_KEY"] = "troque-esta-chave-em-producao"
 
     # Diretório de dados (JSONs)
@@ -15,17 +19,57 @@ def criar_app():
     dados_dir.mkdir(parents=True, exist_ok=True)
     app.config["DIRETORIO_DADOS"] = str(dados_dir)
 
+    # Permite sobrescrever a configuração por variáveis de ambiente (ex.: PORTAL_MOTOR_DADOS=journal)
+    app.config.from_prefixed_env("PORTAL")
+
+    # Motor de armazenamento: "json" (arquivo por coleção), "journal" (snapshot + log) ou "sqlite"
+    app.config.setdefault("MOTOR_DADOS", "json")
+
+    # Orçamento de memória do cache das coleções JSON (por processo)
+    app.config.setdefault("CACHE_DADOS_BYTES", 64 * 1024 * 1024)
+    armazenamento_json.configurar_cache(app.config["CACHE_DADOS_BYTES"])
+
+    # Importações rodam num pool de threads (False = na própria requisição, ex.: testes)
+    app.config.setdefault("IMPORTACAO_EM_SEGUNDO_PLANO", True)
+    app.config.setdefault("IMPORTACAO_WORKERS", 2)
+    # Importação em lote (vários arquivos/abas): processos que leem as planilhas em paralelo
+    app.config.setdefault("IMPORTACAO_PROCESSOS", min(4, os.cpu_count() or 1))
+    # Tamanho máximo de um arquivo enviado; a requisição inteira ganha uma folga para os demais campos
+    app.config.setdefault("IMPORTACAO_MAX_BYTES", 50 * 1024 * 1024)
+    app.config.setdefault("MAX_CONTENT_LENGTH", app.config["IMPORTACAO_MAX_BYTES"] + 1024 * 1024)
+
+    # Cache em disco das exportações XLSX/CSV (helpers/cache_exportacao); 0 desliga
+    app.config.setdefault("EXPORTACAO_CACHE_DIR", str(Path(tempfile.gettempdir()) / "portal-exportacoes"))
+    app.config.setdefault("EXPORTACAO_CACHE_BYTES", 256 * 1024 * 1024)
+    cache_exportacao.configurar(app.config["EXPORTACAO_CACHE_DIR"], app.config["EXPORTACAO_CACHE_BYTES"])
+
+    # Por quanto tempo os KPIs do painel (e da API /api/dashboard) são reaproveitados
+    app.config.setdefault("PAINEL_CACHE_SEGUNDOS", 30)
+
     # Configuração do Login
     from .blueprints.auth import Usuario
     lm = LoginManager(app)
     lm.login_view = "auth.login"
 
+    # Usuário da requisição: do cadastro em memória (blueprints/auth) ou, com
+    # SESSAO_USUARIO_ASSINADA, do próprio cookie de sessão por até SESSAO_USUARIO_VALIDADE segundos
+    app.config.setdefault("SESSAO_USUARIO_ASSINADA", False)
+    app.config.setdefault("SESSAO_USUARIO_VALIDADE", 300)
+
+    # Hash das senhas (helpers/seguranca): método do werkzeug com o fator de custo,
+    # ex. "scrypt:32768:8:1" ou "pbkdf2:sha256:600000"; medir com `flask --app run medir-login`
+    app.config.setdefault("SENHA_METODO", seguranca.METODO_PADRAO)
+    # Tentativas de login aceitas por janela, por login e por IP (0 desliga o limite)
+    app.config.setdefault("LOGIN_JANELA_SEGUNDOS", 300)
+    app.config.setdefault("LOGIN_MAX_TENTATIVAS", 5)
+    app.config.setdefault("LOGIN_MAX_TENTATIVAS_IP", 50)
+
     @lm.user_loader
     def load_user(uid):
-        return Usuario.obter_por_id(uid, base_dir=dados_dir)
+        return Usuario.carregar(uid, base_dir=app.config["DIRETORIO_DADOS"])
 
     # Importa e registra os blueprints DENTRO da função
-    from .blueprints import licencas, vpn, equipamentos, cameras, impressoras, auth, perifericos
+    from .blueprints import licencas, vpn, equipamentos, cameras, impressoras, auth, perifericos, busca, importacoes, filiais, painel
     from .blueprints.ferias import bp as ferias_bp
 
     app.register_blueprint(auth.bp, url_prefix="/auth")
@@ -36,50 +80,78 @@ def criar_app():
     app.register_blueprint(impressoras.bp, url_prefix="/impressoras")
     app.register_blueprint(perifericos.bp, url_prefix="/perifericos")
     app.register_blueprint(ferias_bp, url_prefix="/ferias")
+    app.register_blueprint(busca.bp, url_prefix="/buscar")
+    app.register_blueprint(importacoes.bp, url_prefix="/importacoes")
+    app.register_blueprint(filiais.bp, url_prefix="/filiais")
+    app.register_blueprint(painel.bp, url_prefix="/api/dashboard")
+
+    # Tabela de filiais (só grava na primeira vez; o filial_id dos registros antigos vem do recalcular-filiais)
+    from .helpers import filiais as dim_filiais
+    with app.app_context():
+        dim_filiais.iniciar()
+        kpis.iniciar()  # agregados do painel, montados do zero a cada subida
 
 
     # --- A ROTA PRINCIPAL PRECISA ESTAR DENTRO DE CRIAR_APP ---
     @app.route("/")
     @login_required
     def index():
-        dados_dir = Path(app.config["DIRETORIO_DADOS"])
-        
-        # Carregando todos os dados necessários
-        lic = repo.listar(dados_dir / "licencas.json")
-        vpn = repo.listar(dados_dir / "vpn.json")
-        eqp = repo.listar(dados_dir / "equipamentos.json")
-        entregas = repo.listar(dados_dir / "perifericos_entregas.json")
-        estoque = repo.listar(dados_dir / "perifericos_estoque.json")
-    
-        # KPIs de Estoque
-        total_perifericos_estoque = sum(int(item.get('qtd_estoque', 0)) for item in estoque)
-        itens_estoque_baixo = len([item for item in estoque if 0 < int(item.get('qtd_estoque', 0)) <= 5])
-        
-        # Dados para Gráficos
-        lic_ativas = [r for r in lic if r.get("situacao","ATIVO") != "INATIVO"]
-        contador_lic = Counter([r.get("licenca","") for r in lic_ativas])
-        top_licencas = contador_lic.most_common(5)
-        licencas_chart_data = {"labels": [i[0] for i in top_licencas], "data": [i[1] for i in top_licencas]}
-        
-        contador_equip = Counter([r.get("filial","Sem Filial") for r in eqp])
-        top_filiais = contador_equip.most_common(10)
-        equip_chart_data = {"labels": [i[0] for i in top_filiais], "data": [i[1] for i in top_filiais]}
-    
-        kpis = {
-            "vpn_pendentes": sum(1 for r in vpn if r.get("status","").upper() in ("PENDENTE","AGUARDANDO","")),
-            "lic_inativos": sum(1 for r in lic if r.get("situacao","").upper()=="INATIVO"),
-            "total_equipamentos": len(eqp),
-            "total_licencas": len(lic_ativas),
-            "ultimas_entregas": sorted(entregas, key=lambda x: x.get('id', ''), reverse=True)[:5],
-            
-            # Garante que os novos KPIs estejam sendo enviados
-            "total_perifericos_estoque": total_perifericos_estoque,
-            "itens_estoque_baixo": itens_estoque_baixo,
-    
-            "licencas_chart_data": licencas_chart_data,
-            "equip_chart_data": equip_chart_data
-        }
-        return render_template("index.html", kpis=kpis)
+        # KPIs dos agregados mantidos a cada gravação (helpers/kpis), em cache por alguns segundos;
+        # os gráficos são buscados pela página na API /api/dashboard
+        dados, _ = kpis.painel_em_cache()
+        return render_template("index.html", kpis=dados)
+
+    # Migração única dos JSONs para o SQLite: flask --app run migrar-sqlite
+    @app.cli.command("migrar-sqlite")
+    @click.option("--substituir", is_flag=True, help="Apaga e recarrega coleções que já existem no banco.")
+    def migrar_sqlite(substituir):
+        from .helpers import armazenamento_sqlite
+        resultado = armazenamento_sqlite.migrar_de_json(Path(app.config["DIRETORIO_DADOS"]), substituir=substituir)
+        for colecao, total in resultado.items():
+            click.echo(f"{colecao}: {total} registros migrados")
+        if resultado:
+            dim_filiais.recalcular()  # os JSONs antigos podem não ter filial_id
+        if not resultado:
+            click.echo("Nada a migrar (coleções já existem no banco).")
+
+    # filial_id de todos os registros, depois de mudar os aliases das filiais: flask --app run recalcular-filiais
+    @app.cli.command("recalcular-filiais")
+    def recalcular_filiais():
+        corrigidos = dim_filiais.recalcular()
+        for colecao, total in corrigidos.items():
+            click.echo(f"{colecao}: {total} registros com filial_id corrigido")
+        if not corrigidos:
+            click.echo("Nada a corrigir.")
+
+    # Fotografia dos KPIs para a série histórica (para agendar uma vez por dia): flask --app run registrar-kpis
+    @app.cli.command("registrar-kpis")
+    def registrar_kpis():
+        from .helpers import serie_kpis
+        click.echo(f"{serie_kpis.registrar(forcar=True)} valores registrados em {serie_kpis.caminho()}")
+
+    # Troca de uma vez as senhas em texto do usuarios.json por hash (sem isso, cada
+    # uma é convertida no primeiro login do usuário): flask --app run migrar-senhas
+    @app.cli.command("migrar-senhas")
+    def migrar_senhas():
+        total = Usuario.migrar_senhas(app.config["DIRETORIO_DADOS"])
+        click.echo(f"{total} senha(s) convertida(s) para hash ({app.config['SENHA_METODO']})." if total
+                   else "Nenhuma senha em texto no usuarios.json.")
+
+    # Quantos logins por segundo cada núcleo confere com o SENHA_METODO (ou --metodo),
+    # para escolher o fator de custo que aguenta o pico da manhã: flask --app run medir-login
+    @app.cli.command("medir-login")
+    @click.option("--metodo", "metodos", multiple=True, help="Método do werkzeug; pode repetir para comparar.")
+    @click.option("--segundos", default=3.0, show_default=True, help="Duração da medição de cada método.")
+    @click.option("--pico", default=0, help="Logins por minuto no pico, para estimar os núcleos ocupados.")
+    def medir_login(metodos, segundos, pico):
+        nucleos = os.cpu_count() or 1
+        for metodo in metodos or (app.config["SENHA_METODO"],):
+            n, decorrido = seguranca.medir(metodo, segundos)
+            por_nucleo = n / decorrido
+            click.echo(f"{metodo}: {1000 * decorrido / n:.1f} ms por login, {por_nucleo:.1f} logins/s por núcleo, "
+                       f"{por_nucleo * nucleos:.1f} logins/s com {nucleos} núcleo(s)")
+            if pico:
+                click.echo(f"  pico de {pico} logins/min ocupa {pico / 60 / por_nucleo:.2f} núcleo(s)")
 
     # O context_processor também deve estar dentro da função
     @app.context_processor
@@ -1,11 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, session
 from flask_login import login_user, logout_user, login_required
 from pathlib import Path
 from flask_login import UserMixin
-import json
+import json, os, tempfile, threading, time
+from ..helpers import seguranca
 
 bp = Blueprint("auth", __name__, template_folder="../templates")
 
+# --- CADASTRO DE USUÁRIOS EM MEMÓRIA ---
+# O user_loader roda em toda requisição autenticada. Em vez de ler e decodificar
+# usuarios.json a cada vez, o cadastro fica em memória indexado por id e por
+# login e só é relido quando a assinatura do arquivo (inode, tamanho, mtime)
+# muda. Com SESSAO_USUARIO_ASSINADA, id/login/nome/papel também vão no cookie de
+# sessão (assinado com a SECRET_KEY) e o usuário é remontado dali, sem tocar no
+# cadastro, por até SESSAO_USUARIO_VALIDADE segundos; depois disso é conferido
+# de novo no cadastro (usuário removido ou com papel alterado perde o acesso).
+SESSAO_USUARIO = "_usuario"
+
+_cadastros: dict[str, tuple] = {}  # caminho -> (assinatura, {id: usuário}, {login: usuário})
+_trava = threading.RLock()
+
 class Usuario(UserMixin):
     def __init__(self, id, login, nome, papel):
         self.id = id
@@ -27,28 +41,110 @@ class Usuario(UserMixin):
         if not p.exists() or not p.read_text(encoding="utf-8").strip():
             p.parent.mkdir(parents=True, exist_ok=True)
             defaults = [
-                {"id": "1", "login": "admin", "senha": "admin123", "nome": "Administrador TI", "papel": "ti"},
-                {"id": "2", "login": "leitor", "senha": "leitor123", "nome": "Leitor", "papel": "leitura"}
+                {"id": "1", "login": "admin", "senha_hash": seguranca.gerar_hash("admin123"), "nome": "Administrador TI", "papel": "ti"},
+                {"id": "2", "login": "leitor", "senha_hash": seguranca.gerar_hash("leitor123"), "nome": "Leitor", "papel": "leitura"}
             ]
-            p.write_text(json.dumps(defaults, ensure_ascii=False, indent=2), encoding="utf-8")
+            Usuario._gravar(base, defaults)
+
+    @staticmethod
+    def _gravar(base, usuarios: list) -> None:
+        """Reescreve o usuarios.json de uma vez (arquivo temporário + os.replace)."""
+        p = Usuario._path(base)
+        fd, tmp = tempfile.mkstemp(prefix=".usuarios-", dir=p.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(usuarios, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, p)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        _cadastros.pop(str(p), None)
+
+    @staticmethod
+    def migrar_senhas(base) -> int:
+        """Troca as senhas em texto do usuarios.json por hash. Devolve quantas converteu."""
+        with _trava:
+            Usuario._seed_if_missing(base)
+            usuarios = json.loads(Usuario._path(base).read_text(encoding="utf-8"))
+            convertidos = 0
+            for u in usuarios:
+                if "senha" in u:
+                    senha = str(u.pop("senha"))
+                    if not u.get("senha_hash"):
+                        u["senha_hash"] = seguranca.gerar_hash(senha)
+                    convertidos += 1
+            if convertidos:
+                Usuario._gravar(base, usuarios)
+            return convertidos
+
+    @staticmethod
+    def trocar_hash(base, login: str, senha: str) -> None:
+        """Regrava o hash do usuário com o SENHA_METODO atual (rehash no login)."""
+        with _trava:
+            usuarios = json.loads(Usuario._path(base).read_text(encoding="utf-8"))
+            for u in usuarios:
+                if u.get("login") == login:
+                    u.pop("senha", None)
+                    u["senha_hash"] = seguranca.gerar_hash(senha)
+            Usuario._gravar(base, usuarios)
+
+    @staticmethod
+    def _cadastro(base) -> tuple[dict, dict]:
+        """({id: dados}, {login: dados}) do usuarios.json, relido só quando o arquivo muda."""
+        p = Usuario._path(base)
+        try:
+            st = os.stat(p)
+            assinatura = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            assinatura = None
+        guardado = _cadastros.get(str(p))
+        if guardado and guardado[0] == assinatura and assinatura is not None:
+            return guardado[1], guardado[2]
+        with _trava:
+            Usuario._seed_if_missing(base)  # só quando o arquivo mudou (ou ainda não foi lido)
+            st = os.stat(p)
+            assinatura = (st.st_ino, st.st_size, st.st_mtime_ns)
+            usuarios = json.loads(p.read_text(encoding="utf-8"))
+            por_id = {str(u.get("id")): u for u in usuarios}
+            por_login = {u.get("login"): u for u in usuarios}
+            _cadastros[str(p)] = (assinatura, por_id, por_login)
+            return por_id, por_login
 
     @staticmethod
     def obter_por_id(id, base_dir):
-        Usuario._seed_if_missing(base_dir)
-        p = Usuario._path(base_dir)
-        for u in json.loads(p.read_text(encoding="utf-8")):
-            if str(u.get("id")) == str(id):
-                return Usuario(u["id"], u["login"], u["nome"], u["papel"])
-        return None
+        u = Usuario._cadastro(base_dir)[0].get(str(id))
+        return Usuario(u["id"], u["login"], u["nome"], u["papel"]) if u else None
 
     @staticmethod
     def obter_por_login(login, base_dir):
-        Usuario._seed_if_missing(base_dir)
-        p = Usuario._path(base_dir)
-        for u in json.loads(p.read_text(encoding="utf-8")):
-            if u.get("login") == login:
-                return u  # Retorna o dicionário de dados do usuário
-        return None
+        return Usuario._cadastro(base_dir)[1].get(login)  # Retorna o dicionário de dados do usuário
+
+    def guardar_na_sessao(self) -> None:
+        if current_app.config.get("SESSAO_USUARIO_ASSINADA"):
+            session[SESSAO_USUARIO] = {"id": self.id, "login": self.login, "nome": self.nome,
+                                       "papel": self.papel, "em": int(time.time())}
+
+    @staticmethod
+    def da_sessao(id):
+        """Usuário remontado do cookie de sessão (sem ler o cadastro), se ativado e ainda válido."""
+        if not current_app.config.get("SESSAO_USUARIO_ASSINADA"):
+            return None
+        d = session.get(SESSAO_USUARIO)
+        if not d or str(d.get("id")) != str(id):
+            return None
+        if time.time() - d.get("em", 0) > current_app.config["SESSAO_USUARIO_VALIDADE"]:
+            return None
+        return Usuario(d["id"], d["login"], d["nome"], d["papel"])
+
+    @staticmethod
+    def carregar(id, base_dir):
+        """Para o user_loader: da sessão assinada, se possível; senão do cadastro (e renova a sessão)."""
+        u = Usuario.da_sessao(id)
+        if u is None:
+            u = Usuario.obter_por_id(id, base_dir)
+            if u is not None:
+                u.guardar_na_sessao()
+        return u
 
 @bp.get("/login")
 def login():
@@ -59,14 +155,24 @@ def login_post():
     login = request.form.get("login", "").strip()
     senha = request.form.get("senha", "").strip()
     base = Path(current_app.config["DIRETORIO_DADOS"])
-    
+
+    # Rajadas de tentativas são recusadas antes de calcular o hash (helpers/seguranca)
+    espera = seguranca.limitador.tentar(login, request.remote_addr)
+    if espera:
+        flash(f"Muitas tentativas de login. Tente novamente em {(espera + 59) // 60} min.", "danger")
+        return render_template("login.html"), 429, {"Retry-After": str(espera)}
+
     u = Usuario.obter_por_login(login, base)  # Obtém o usuário do arquivo JSON
-    if not u or u.get("senha") != senha:
+    if not seguranca.verificar(u, senha):
         flash("Credenciais inválidas.", "danger")
         return redirect(url_for("auth.login"))
-    
+    seguranca.limitador.sucesso(login, request.remote_addr)
+    if seguranca.precisa_rehash(u):  # senha em texto ou SENHA_METODO mudou
+        Usuario.trocar_hash(base, u["login"], senha)
+
     usuario = Usuario(u["id"], u["login"], u["nome"], u["papel"])  # Atribui o papel ao usuário
     login_user(usuario)  # Usando o objeto Usuario para o login
+    usuario.guardar_na_sessao()
     flash("Bem-vindo!", "success")
     return redirect(url_for("index"))
 
@@ -75,6 +181,7 @@ def login_post():
 @login_required
 def logout():
     logout_user()
+    session.pop(SESSAO_USUARIO, None)
     flash("Sessão encerrada.", "info")
     return redirect(url_for("auth.login"))
 
@@ -0,0 +1,44 @@
+# app/blueprints/busca.py
+
+from __future__ import annotations
+from flask import Blueprint, current_app, render_template, request, jsonify, url_for
+from flask_login import login_required
+from pathlib import Path
+from ..helpers import repositorio as repo
+
+bp = Blueprint("busca", __name__, template_folder="../templates")
+
+# Coleções consultadas pela busca geral: (arquivo, rótulo, rota de edição, campos exibidos)
+FONTES = [
+    ("licencas.json", "Licenças", "licencas.editar", ["nome", "email", "licenca", "filial"]),
+    ("equipamentos.json", "Equipamentos", "equipamentos.editar", ["nome", "patrimonio", "numero_serie", "modelo"]),
+    ("vpn.json", "VPN", "vpn.editar", ["nome", "email", "status"]),
+    ("ferias.json", "Férias", "ferias.editar", ["nome", "data_saida", "data_retorno", "departamento_filial"]),
+    ("cameras.json", "Câmeras", "cameras.editar", ["nome", "ip", "localidade", "filial"]),
+    ("impressoras.json", "Impressoras", "impressoras.editar", ["impressora", "porta_ip", "serial", "filial"]),
+]
+
+@bp.get("/")
+@login_required
+def buscar():
+    """Busca um termo em todas as coleções de uma vez, com os resultados por relevância."""
+    termo = request.args.get("q", "").strip()
+    limite = min(request.args.get("limite", 50, type=int), 200)
+    resultados = []
+    if termo:
+        dados_dir = Path(current_app.config["DIRETORIO_DADOS"])
+        for arquivo, rotulo, rota, campos in FONTES:
+            for nota, item in repo.buscar(dados_dir / arquivo, termo, limite):
+                resultados.append({
+                    "colecao": rotulo,
+                    "pontuacao": round(nota, 1),
+                    "titulo": next((item.get(c) for c in campos if item.get(c)), item.get("id")),
+                    "detalhes": [item.get(c, "") for c in campos[1:] if item.get(c)],
+                    "url": url_for(rota, id=item["id"]),
+                })
+        resultados.sort(key=lambda r: r["pontuacao"], reverse=True)
+        resultados = resultados[:limite]
+
+    if request.args.get("formato") == "json" or request.accept_mimetypes.best == "application/json":
+        return jsonify(termo=termo, resultados=resultados)
+    return render_template("buscar.html", termo=termo, resultados=resultados)
@@ -1,11 +1,12 @@
 from __future__ import annotations
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, send_file
+from functools import partial
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from pathlib import Path
-from ..helpers import armazenamento_json as repo
+from ..helpers import repositorio as repo, colecoes, filiais, importacoes, sincronizacao
 from ..helpers.autorizacao import somente_ti
-from ..helpers.importador import importar_generico
-from ..helpers.exportador import gerar_xlsx
+from ..helpers.paginacao import paginar
+from ..helpers.exportador import resposta_exportacao
 
 bp = Blueprint("cameras", __name__, url_prefix="/cameras")
 
@@ -16,19 +17,19 @@ def caminho_arquivo():
 # --- CAMPOS ATUALIZADOS CONFORME A NOVA PLANILHA ---
 # Adicionado 'loja', 'localidade' e removido 'usuario', 'senha'
 CAMPOS = ['filial', 'loja', 'localidade', 'nome', 'acesso_web', 'ip', 'descricao', 'observacao', 'portas']
+colecoes.registrar("cameras", CAMPOS, indices=("filial",), busca=("nome", "ip", "localidade"),
+                   chaves=("ip",), filial="filial")
 
 @bp.get("/")
 @login_required
 def listar():
     """Exibe a lista de câmeras com filtros."""
-    registros = repo.listar(caminho_arquivo())
     filial = request.args.get('filial', '').strip()
     termo = request.args.get('q', '').strip().lower()
-    if termo:
-        registros = [r for r in registros if termo in (r.get('nome', '') + r.get('ip', '') + r.get('localidade', '')).lower()]
-    if filial:
-        registros = [r for r in registros if (r.get('filial') or '') == filial]
-    return render_template("cameras_listar.html", registros=registros, termo=termo, filial_atual=filial)
+    criterios = filiais.criterio(filial, caminho_arquivo())
+    pagina = paginar(caminho_arquivo(), criterios, busca=termo)
+    return render_template("cameras_listar.html", registros=pagina.registros, pagina=pagina,
+                           termo=termo, filial_atual=filial)
 
 @bp.get("/novo")
 @login_required
@@ -78,28 +79,44 @@ def importar_form():
     """Exibe a página de importação."""
     return render_template("cameras_importar.html")
 
+def _gravar(registros_brutos, job, sincronizar: bool = False) -> dict:
+    if sincronizar:
+        return sincronizacao.sincronizar(caminho_arquivo(), registros_brutos, validar=job.validar())
+    return repo.criar_lote(caminho_arquivo(), registros_brutos, validar=job.validar())
+
 @bp.post("/importar")
 @somente_ti
 def importar_post():
     """Processa a importação de um arquivo."""
-    arq = request.files.get("arquivo")
-    if not arq or not arq.filename:
+    arqs = [a for a in request.files.getlist("arquivo") if a.filename]
+    if not arqs:
         flash("Nenhum arquivo enviado. Por favor, envie um CSV ou XLSX.", "warning")
         return redirect(url_for("cameras.importar_form"))
-    try:
-        registros_brutos = importar_generico(arq.read(), arq.filename, MAPA_IMPORT)
-        for item in registros_brutos:
-            repo.criar(caminho_arquivo(), item)
-        flash(f"Importação concluída: {len(registros_brutos)} registros processados.", "success")
-    except Exception as e:
-        flash(f"Falha na importação: {e}", "danger")
-    return redirect(url_for("cameras.listar"))
+    modo = "sincronizar" if request.form.get("sincronizar") else "adicionar"
+    gravar = partial(_gravar, sincronizar=modo == "sincronizar")
+    job = importacoes.enviar("cameras", arqs, MAPA_IMPORT, gravar, destino=url_for("cameras.listar"), modo=modo)
+    return redirect(url_for("cameras.importar_form", job=job.id))
+
+@bp.post("/importar/previa")
+@somente_ti
+def importar_previa():
+    """Cabeçalhos, primeiras linhas e avisos da planilha, sem gravar nada."""
+    return importacoes.previa("cameras", MAPA_IMPORT)
+
+@bp.post("/importar/mapeamento")
+@somente_ti
+def importar_mapeamento():
+    """Lembra o mapeamento de colunas conferido na prévia."""
+    return importacoes.lembrar_mapeamento(MAPA_IMPORT)
 
 @bp.get("/exportar")
 @login_required
 def exportar():
-    """Exporta os dados de câmeras para um arquivo Excel."""
-    registros = repo.listar(caminho_arquivo())
+    """Exporta as câmeras (com os filtros da listagem) para Excel ou CSV."""
+    filial = request.args.get('filial', '').strip()
+    termo = request.args.get('q', '').strip().lower()
+    criterios = filiais.criterio(filial, caminho_arquivo())
+    registros = partial(repo.filtrar, caminho_arquivo(), busca=termo, **criterios)
     
     # --- MAPA DE EXPORTAÇÃO CORRIGIDO ---
     campos_exportacao = [
@@ -113,9 +130,8 @@ def exportar():
         ('Portas', 'portas')
     ]
     
-    buf = gerar_xlsx("Cameras", registros, campos_exportacao)
-    return send_file(buf, as_attachment=True, download_name="cameras.xlsx",
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return resposta_exportacao("Cameras", caminho_arquivo(), registros, campos_exportacao, "cameras",
+                               filtros={"q": termo, **criterios})
 
 # --- MAPA DE IMPORTAÇÃO CORRIGIDO ---
 MAPA_IMPORT = {
@@ -127,4 +143,4 @@ MAPA_IMPORT = {
     'ip': [],
     'descricao': []
     # 'usuario' e 'senha' foram removidos
-}
\ No newline at end of file
+}
@@ -1,14 +1,15 @@
 # app/blueprints/equipamentos.py
 
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, send_file
+from functools import partial
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from pathlib import Path
-from ..helpers import armazenamento_json as repo
+from ..helpers import repositorio as repo, colecoes, filiais, importacoes, sincronizacao
 from ..helpers.autorizacao import somente_ti
-from ..helpers.importador import importar_generico
-from ..helpers.exportador import gerar_xlsx
-# from ..helpers.constants import FILIAIS
-from ..helpers.padronizador import encontrar_filial_correspondente
+from ..helpers.paginacao import paginar
+from ..helpers.exportador import resposta_exportacao
+from ..constants import FILIAIS
+from ..helpers.padronizador import canonicalizar_coluna
 
 bp = Blueprint("equipamentos", __name__, template_folder="../templates")
 
@@ -20,23 +21,19 @@ CAMPOS = [
     'nome', 'cpf', 'cargo', 'filial', 'descricao_filial', 'cc', 'descricao_cc',
     'tipo', 'marca', 'modelo', 'numero_serie', 'patrimonio', 'acessorios', 'anc', 'termo_assinado'
 ]
+colecoes.registrar("equipamentos", CAMPOS, indices=("filial", "situacao"),
+                   busca=("nome", "patrimonio", "numero_serie", "modelo"),
+                   chaves=("numero_serie", "patrimonio"), filial="filial")
 
 @bp.get("/")
 @login_required
 def listar():
-    regs = repo.listar(caminho_arquivo())
     filial = request.args.get('filial', '').strip()
     termo  = request.args.get('q', '').strip().lower()
-    if termo:
-        regs = [r for r in regs if termo in (
-            r.get('nome','')+
-            r.get('patrimonio','')+
-            r.get('numero_serie','')+
-            r.get('modelo','')
-        ).lower()]
-    if filial:
-        regs = [r for r in regs if (r.get('filial') or '') == filial]
-    return render_template("equipamentos_listar.html", registros=regs, termo=termo)
+    criterios = filiais.criterio(filial, caminho_arquivo())
+    pagina = paginar(caminho_arquivo(), criterios, busca=termo)
+    return render_template("equipamentos_listar.html", registros=pagina.registros, pagina=pagina,
+                           termo=termo, filial_atual=filial)
 
 @bp.get("/novo")
 @login_required
@@ -83,48 +80,53 @@ def excluir(id: str):
 def importar_form():
     return render_template("equipamentos_importar.html")
 
-# Em app/blueprints/licencas.py
+def _gravar(registros, job, sincronizar: bool = False) -> dict:
+    def preparar(item):
+        if not sincronizar:  # na sincronização, situação vazia mantém a que já está gravada
+            item["situacao"] = item.get("situacao") or "ATIVO"
+        return item
+
+    # As linhas chegam sob demanda e são gravadas de uma vez (uma leitura + uma gravação do arquivo)
+    # Filial no nome oficial ("Tracbel Agro Franca" -> "14-Franca"), cada valor distinto resolvido uma vez
+    registros_brutos = map(preparar, canonicalizar_coluna(registros, 'filial', FILIAIS))
+    validar = job.validar(lambda it: it.get('nome') or it.get('email'))
+    if sincronizar:
+        return sincronizacao.sincronizar(caminho_arquivo(), registros_brutos, validar=validar,
+                                         padroes={"situacao": "ATIVO"})
+    return repo.criar_lote(caminho_arquivo(), registros_brutos, validar=validar)
 
 @bp.post("/importar")
 @somente_ti
 def importar_post():
-    arq = request.files.get("arquivo")
-    if not arq or not arq.filename:
+    arqs = [a for a in request.files.getlist("arquivo") if a.filename]
+    if not arqs:
         flash("Nenhum arquivo enviado. Por favor, selecione um arquivo CSV ou XLSX.", "warning")
         return redirect(url_for("licencas.importar_form"))
-    try:
-        registros_brutos = importar_generico(arq.read(), arq.filename, MAPA_IMPORT)
-        
-        registros_processados = 0
-        for item in registros_brutos:
-            if not item.get('nome') and not item.get('email'):
-                continue
-
-            # --- LÓGICA DE FILIAIS DESATIVADA ---
-            # A linha abaixo foi comentada para ignorar o processamento de filial
-            # item['filial'] = encontrar_filial_correspondente(item.get('filial', ''), FILIAIS)
+    modo = "sincronizar" if request.form.get("sincronizar") else "adicionar"
+    gravar = partial(_gravar, sincronizar=modo == "sincronizar")
+    job = importacoes.enviar("equipamentos", arqs, MAPA_IMPORT, gravar, destino=url_for("equipamentos.listar"), modo=modo)
+    return redirect(url_for("equipamentos.importar_form", job=job.id))
 
-            item["situacao"] = item.get("situacao") or "ATIVO"
-            
-            repo.criar(caminho_arquivo(), item)
-            registros_processados += 1
+@bp.post("/importar/previa")
+@somente_ti
+def importar_previa():
+    """Cabeçalhos, primeiras linhas e avisos da planilha, sem gravar nada."""
+    return importacoes.previa("equipamentos", MAPA_IMPORT, ("nome",))
 
-        flash(f"Importação concluída: {registros_processados} registros processados.", "success")
-    except Exception as e:
-        flash(f"Falha na importação: {e}", "danger")
-    return redirect(url_for("equipamentos.listar"))
+@bp.post("/importar/mapeamento")
+@somente_ti
+def importar_mapeamento():
+    """Lembra o mapeamento de colunas conferido na prévia."""
+    return importacoes.lembrar_mapeamento(MAPA_IMPORT)
 
 @bp.get("/exportar")
 @login_required
 def exportar():
-    regs = repo.listar(caminho_arquivo())
     # Adicionando a mesma lógica de filtro da listagem para a exportação
     filial = request.args.get('filial', '').strip()
     termo  = request.args.get('q', '').strip().lower()
-    if termo:
-        regs = [r for r in regs if termo in (r.get('nome','')+r.get('patrimonio','')+r.get('numero_serie','')).lower()]
-    if filial:
-        regs = [r for r in regs if (r.get('filial') or '') == filial]
+    criterios = filiais.criterio(filial, caminho_arquivo())
+    regs = partial(repo.filtrar, caminho_arquivo(), busca=termo, **criterios)
 
     campos_exportacao = [
         ('NOME', 'nome'), ('CPF', 'cpf'), ('CARGO', 'cargo'), ('FILIAL', 'filial'),
@@ -132,9 +134,8 @@ def exportar():
         ('TIPO', 'tipo'), ('MARCA', 'marca'), ('MODELO', 'modelo'), ('NÚMERO DE SÉRIE', 'numero_serie'),
         ('PATRIMÔNIO', 'patrimonio'), ('ACESSÓRIOS', 'acessorios'), ('ANC', 'anc'), ('TERMO ASSINADO', 'termo_assinado')
     ]
-    buf = gerar_xlsx("Equipamentos", regs, campos_exportacao)
-    return send_file(buf, as_attachment=True, download_name="equipamentos.xlsx",
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return resposta_exportacao("Equipamentos", caminho_arquivo(), regs, campos_exportacao, "equipamentos",
+                               filtros={"q": termo, **criterios})
 
 # Mapa para a importação de planilhas, com vários nomes possíveis para cada coluna
 # Em app/blueprints/equipamentos.py
@@ -155,4 +156,4 @@ MAPA_IMPORT = {
     'acessorios': ['observacao'],
     'anc': [],
     'termo_assinado': ['termo']
-}
\ No newline at end of file
+}
@@ -1,14 +1,15 @@
 # app/blueprints/ferias.py
 
 from __future__ import annotations
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, send_file
+from functools import partial
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from pathlib import Path
-from ..helpers import armazenamento_json as repo
+from ..helpers import repositorio as repo, colecoes, importacoes, sincronizacao
 from ..helpers.autorizacao import somente_ti
-from ..helpers.importador import importar_generico
-from ..helpers.exportador import gerar_xlsx
-from ..helpers.importador import importar_generico, analisar_cabecalhos_planilha
+from ..helpers.paginacao import paginar
+from ..helpers.exportador import resposta_exportacao
+from ..helpers.importador import analisar_cabecalhos_planilha
 
 bp = Blueprint("ferias", __name__, template_folder="../templates")
 
@@ -18,6 +19,8 @@ def caminho_arquivo():
 # Garanta que esta lista de campos esteja assim:
 CAMPOS = ['nome', 'data_saida', 'data_retorno', 'departamento_filial', 
           'ad', 'email', 'totvs', 'crm', 'john_deere', 'atendente']
+colecoes.registrar("ferias", CAMPOS, busca=("nome", "atendente", "departamento_filial"),
+                   chaves=(("nome", "data_saida"),))
 
 # Lista de aplicativos disponíveis para bloqueio
 APPS_BLOQUEAVEIS = ['AD', 'Email', 'TOTVS', 'CRM', 'John Deere']
@@ -25,11 +28,9 @@ APPS_BLOQUEAVEIS = ['AD', 'Email', 'TOTVS', 'CRM', 'John Deere']
 @bp.get("/")
 @login_required
 def listar_ferias():
-    registros = repo.listar(caminho_arquivo())
     termo = request.args.get('q', '').strip().lower()
-    if termo:
-        registros = [r for r in registros if termo in (r.get('nome', '') + r.get('atendente', '') + r.get('departamento', '')).lower()]
-    return render_template("ferias_listar.html", registros=registros, termo=termo)
+    pagina = paginar(caminho_arquivo(), busca=termo)
+    return render_template("ferias_listar.html", registros=pagina.registros, pagina=pagina, termo=termo)
 
 @bp.get("/novo")
 @login_required
@@ -73,7 +74,8 @@ def excluir(id: str):
 @bp.get("/exportar")
 @login_required
 def exportar_ferias():
-    regs = repo.listar(caminho_arquivo())
+    termo = request.args.get('q', '').strip().lower()
+    regs = partial(repo.filtrar, caminho_arquivo(), busca=termo)
 
 
     # --- MAPA DE EXPORTAÇÃO CORRIGIDO ---
@@ -90,42 +92,44 @@ def exportar_ferias():
         ('ATENDENTE', 'atendente')
     ]
 
-    buf = gerar_xlsx("Controle de Ferias", regs, campos)
-    
-    return send_file(buf, as_attachment=True, download_name="controle_ferias.xlsx", 
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return resposta_exportacao("Controle de Ferias", caminho_arquivo(), regs, campos, "controle_ferias",
+                               filtros={"q": termo})
 
 @bp.get("/importar")
 @login_required
 def importar_form():
     return render_template("ferias_importar.html")
 
+def _gravar(regs, job, sincronizar: bool = False) -> dict:
+    # Pula linhas que não tenham um nome de colaborador e salva o resto de uma vez
+    validar = job.validar(lambda it: it.get('nome'))
+    if sincronizar:
+        return sincronizacao.sincronizar(caminho_arquivo(), regs, validar=validar)
+    return repo.criar_lote(caminho_arquivo(), regs, validar=validar)
+
 @bp.post("/importar")
 @somente_ti
 def importar_post():
-    arq = request.files.get("arquivo")
-    if not arq or not arq.filename:
+    arqs = [a for a in request.files.getlist("arquivo") if a.filename]
+    if not arqs:
         flash("Envie um arquivo CSV ou Excel.", "warning")
         return redirect(url_for("ferias.importar_form"))
-    try:
-        # A função agora usa o MAPA_IMPORT corrigido
-        regs = importar_generico(arq.read(), arq.filename, MAPA_IMPORT)
-        
-        registros_processados = 0
-        for item in regs:
-            # Pula linhas que não tenham um nome de colaborador
-            if not item.get('nome'):
-                continue
-            
-            # Salva o registro limpo
-            repo.criar(caminho_arquivo(), item)
-            registros_processados += 1
-        
-        flash(f"Importação concluída: {registros_processados} registros processados.", "success")
-    except Exception as e:
-        flash(f"Falha na importação: {e}", "danger")
-        
-    return redirect(url_for("ferias.listar_ferias"))
+    modo = "sincronizar" if request.form.get("sincronizar") else "adicionar"
+    gravar = partial(_gravar, sincronizar=modo == "sincronizar")
+    job = importacoes.enviar("ferias", arqs, MAPA_IMPORT, gravar, destino=url_for("ferias.listar_ferias"), modo=modo)
+    return redirect(url_for("ferias.importar_form", job=job.id))
+
+@bp.post("/importar/previa")
+@somente_ti
+def importar_previa():
+    """Cabeçalhos, primeiras linhas e avisos da planilha, sem gravar nada."""
+    return importacoes.previa("ferias", MAPA_IMPORT, ("nome",))
+
+@bp.post("/importar/mapeamento")
+@somente_ti
+def importar_mapeamento():
+    """Lembra o mapeamento de colunas conferido na prévia."""
+    return importacoes.lembrar_mapeamento(MAPA_IMPORT)
 
 
 # --- MAPA DE IMPORTAÇÃO CORRIGIDO CONFORME O RELATÓRIO ---
@@ -141,3 +145,4 @@ MAPA_IMPORT = {
     'john_deere': ['john_deere'],
     'atendente': ['atendente']
 }
+
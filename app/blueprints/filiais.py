@@ -0,0 +1,35 @@
+# app/blueprints/filiais.py
+
+from __future__ import annotations
+from flask import Blueprint, abort, render_template
+from flask_login import login_required
+from ..helpers import filiais
+
+bp = Blueprint("filiais", __name__)
+
+@bp.get("/")
+@login_required
+def resumo():
+    """Resumo por filial: equipamentos, licenças ativas, câmeras, impressoras e VPNs pendentes."""
+    por_filial = filiais.resumo()
+    zerado = {i[0]: 0 for i in filiais.INDICADORES}
+    linhas = [(f, por_filial.get(f["id"], zerado)) for f in filiais.listar()]
+    return render_template("filiais_resumo.html", linhas=linhas, indicadores=filiais.INDICADORES,
+                           sem_filial=por_filial.get(filiais.SEM_FILIAL))
+
+@bp.get("/<filial_id>")
+@login_required
+def detalhe(filial_id: str):
+    filial = filiais.obter(filial_id)
+    if filial is None:
+        abort(404)
+    contagens = filiais.resumo().get(filial_id, {i[0]: 0 for i in filiais.INDICADORES})
+    return render_template("filiais_detalhe.html", filial=filial, contagens=contagens,
+                           indicadores=filiais.INDICADORES)
+
+@bp.app_context_processor
+def _filiais_oficiais():
+    # Opções do filtro de filial (includes/filtro_filial.html) vindas da tabela de filiais
+    def filiais_oficiais():
+        return [f["nome"] for f in filiais.listar()]
+    return {"filiais_oficiais": filiais_oficiais}
@@ -0,0 +1,36 @@
+# app/blueprints/importacoes.py
+
+from __future__ import annotations
+from flask import Blueprint, current_app, flash, jsonify, redirect, request
+from flask_login import login_required
+from werkzeug.exceptions import RequestEntityTooLarge
+from ..helpers import importacoes
+
+bp = Blueprint("importacoes", __name__)
+
+@bp.get("/<job_id>")
+@login_required
+def status(job_id: str):
+    """Progresso de uma importação em segundo plano (consultado pelas telas *_importar)."""
+    job = importacoes.obter(job_id)
+    if not job:
+        return jsonify({"erro": "Importação não encontrada."}), 404
+    return jsonify(job)
+
+@bp.app_context_processor
+def _importacao_da_url():
+    # As telas de importação recebem ?job=<id> depois do envio e mostram o progresso
+    def importacao_da_url():
+        job_id = request.args.get("job", "")
+        return importacoes.obter(job_id) if job_id else None
+    return {"importacao_da_url": importacao_da_url}
+
+@bp.app_errorhandler(RequestEntityTooLarge)
+def _arquivo_grande_demais(e):
+    # Vale para todos os uploads: a prévia responde JSON, os formulários voltam para a tela
+    limite = current_app.config.get("IMPORTACAO_MAX_BYTES", 0) // (1024 * 1024)
+    mensagem = f"Arquivo maior que o limite de {limite} MB."
+    if request.path.endswith("/previa"):
+        return jsonify({"erro": mensagem}), 413
+    flash(mensagem, "warning")
+    return redirect(request.path)
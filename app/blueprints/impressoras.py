@@ -1,13 +1,14 @@
 # app/blueprints/impressoras.py
 
 from __future__ import annotations
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, send_file
+from functools import partial
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from pathlib import Path
-from ..helpers import armazenamento_json as repo
+from ..helpers import repositorio as repo, colecoes, filiais, importacoes
 from ..helpers.autorizacao import somente_ti
-from ..helpers.importador import importar_generico
-from ..helpers.exportador import gerar_xlsx
+from ..helpers.paginacao import paginar
+from ..helpers.exportador import resposta_exportacao
 
 bp = Blueprint("impressoras", __name__, template_folder="../templates")
 
@@ -15,18 +16,20 @@ def caminho_arquivo():
     return Path(current_app.config["DIRETORIO_DADOS"]) / "impressoras.json"
 
 CAMPOS = ['filial','porta_ip','impressora','modelo','serial','login','senha','scanner','nf','departamento','responsavel','mod_toner']
+colecoes.registrar("impressoras", CAMPOS, indices=("filial",), busca=("impressora", "modelo", "porta_ip", "serial"),
+                   filial="filial")
 
 # ... (as rotas listar, novo, criar, editar, atualizar, excluir ficam iguais) ...
 
 @bp.get("/")
 @login_required
 def listar():
-    regs = repo.listar(caminho_arquivo())
     filial = request.args.get('filial','').strip()
     termo  = request.args.get('q','').strip().lower()
-    if termo:  regs = [r for r in regs if termo in (r.get('impressora','')+r.get('modelo','')+r.get('porta_ip','')).lower()]
-    if filial: regs = [r for r in regs if (r.get('filial') or '') == filial]
-    return render_template("impressoras_listar.html", registros=regs, termo=termo, filial_atual=filial)
+    criterios = filiais.criterio(filial, caminho_arquivo())
+    pagina = paginar(caminho_arquivo(), criterios, busca=termo)
+    return render_template("impressoras_listar.html", registros=pagina.registros, pagina=pagina,
+                           termo=termo, filial_atual=filial)
 
 @bp.get("/novo")
 @login_required
@@ -65,29 +68,37 @@ def excluir(id: str):
 def importar_form():
     return render_template("impressoras_importar.html")
 
+def _gravar(regs, job) -> dict:
+    return repo.criar_lote(caminho_arquivo(), regs, validar=job.validar())
+
 @bp.post("/importar")
 @somente_ti
 def importar_post():
-    arq = request.files.get("arquivo")
-    if not arq or not arq.filename:
+    arqs = [a for a in request.files.getlist("arquivo") if a.filename]
+    if not arqs:
         flash("Envie CSV/XLSX.", "warning"); return redirect(url_for("impressoras.importar_form"))
-    try:
-        regs = importar_generico(arq.read(), arq.filename, MAPA_IMPORT)
-        for it in regs: repo.criar(caminho_arquivo(), it)
-        flash(f"Importação concluída: {len(regs)} registros.", "success")
-    except Exception as e:
-        flash(f"Falha na importação: {e}", "danger")
-    return redirect(url_for("impressoras.listar"))
+    job = importacoes.enviar("impressoras", arqs, MAPA_IMPORT, _gravar, destino=url_for("impressoras.listar"))
+    return redirect(url_for("impressoras.importar_form", job=job.id))
+
+@bp.post("/importar/previa")
+@somente_ti
+def importar_previa():
+    """Cabeçalhos, primeiras linhas e avisos da planilha, sem gravar nada."""
+    return importacoes.previa("impressoras", MAPA_IMPORT)
+
+@bp.post("/importar/mapeamento")
+@somente_ti
+def importar_mapeamento():
+    """Lembra o mapeamento de colunas conferido na prévia."""
+    return importacoes.lembrar_mapeamento(MAPA_IMPORT)
 
 @bp.get("/exportar")
 @login_required
 def exportar():
-    regs = repo.listar(caminho_arquivo())
     filial = request.args.get('filial','').strip()
     termo = request.args.get('q','').strip().lower()
-    
-    if termo: regs = [r for r in regs if termo in (r.get('impressora','') + r.get('modelo','') + r.get('porta_ip','')).lower()]
-    if filial: regs = [r for r in regs if (r.get('filial') or '') == filial]
+    criterios = filiais.criterio(filial, caminho_arquivo())
+    regs = partial(repo.filtrar, caminho_arquivo(), busca=termo, **criterios)
     
     campos = [
         ('Filial','filial'), ('Porta IP','porta_ip'), ('Impressora','impressora'),
@@ -96,16 +107,12 @@ def exportar():
         ('Responsável','responsavel'), ('Mod. Toner','mod_toner')
     ]
     
-    buf = gerar_xlsx("Impressoras", regs, campos)
-    
-    return send_file(
-        buf, as_attachment=True, download_name="impressoras.xlsx",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    return resposta_exportacao("Impressoras", caminho_arquivo(), regs, campos, "impressoras",
+                               filtros={"q": termo, **criterios})
 
 MAPA_IMPORT = {
     'filial':['filial'],'porta_ip':['porta_ip','ip'],'impressora':['impressora'],'modelo':['modelo'],
     'serial':['serial','numero_serie'],'login':['login','usuario'],'senha':['senha'],
     'scanner':['scanner'],'nf':['nf'],'departamento':['departamento'],'responsavel':['responsavel'],
     'mod_toner':['mod_toner','modelo_toner']
-}
\ No newline at end of file
+}
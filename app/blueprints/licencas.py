@@ -1,18 +1,19 @@
 from __future__ import annotations
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, send_file
+from functools import partial
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from pathlib import Path
 from datetime import date
 
 # Helpers do seu projeto
-from ..helpers import armazenamento_json as repo
+from ..helpers import repositorio as repo, colecoes, importacoes, sincronizacao
 from ..helpers.autorizacao import somente_ti
-from ..helpers.importador import importar_generico
-from ..helpers.exportador import gerar_xlsx
-# from ..helpers.constants import FILIAIS
-from ..helpers.padronizador import encontrar_filial_correspondente
+from ..helpers.paginacao import paginar
+from ..helpers.exportador import resposta_exportacao
+from ..constants import FILIAIS
+from ..helpers.padronizador import canonicalizar_coluna
 # No topo de licenças.py
-from ..helpers.importador import importar_generico, analisar_cabecalhos_planilha
+from ..helpers.importador import analisar_cabecalhos_planilha
 
 bp = Blueprint("licencas", __name__, url_prefix="/licencas")
 
@@ -25,29 +26,25 @@ CAMPOS = [
     'email', 'matricula', 'nome', 'filial', 'cargo', 'licenca', 'qtde',
     'departamento', 'empresa', 'observacao', 'situacao', 'data_desligamento'
 ]
+colecoes.registrar("licencas", CAMPOS, indices=("filial", "situacao"), busca=("nome", "email", "matricula"),
+                   chaves=("email", "matricula"), filial="filial")
 
 @bp.get("/")
 @login_required
 def listar():
     """Lista as licenças ativas."""
-    registros = repo.listar(caminho_arquivo())
-    
-    # Filtra para mostrar apenas registros ativos por padrão
-    registros_ativos = [r for r in registros if r.get('situacao', 'ATIVO') != 'INATIVO']
-
     termo = request.args.get('q', '').strip().lower()
-    if termo:
-        registros_ativos = [r for r in registros_ativos if termo in (r.get('email', '') + r.get('nome', '')).lower()]
-    
-    return render_template("licencas_listar.html", registros=registros_ativos, termo=termo)
+    # Mostra apenas registros ativos por padrão (índice de situação + índice de busca),
+    # uma página por vez
+    pagina = paginar(caminho_arquivo(), excluir={'situacao': 'INATIVO'}, busca=termo)
+    return render_template("licencas_listar.html", registros=pagina.registros, pagina=pagina, termo=termo)
 
 @bp.get("/inativos")
 @login_required
 def inativos():
     """Lista as licenças marcadas como inativas."""
-    registros = repo.listar(caminho_arquivo())
-    registros_inativos = [r for r in registros if r.get('situacao') == 'INATIVO']
-    return render_template("licencas_inativos.html", registros=registros_inativos)
+    pagina = paginar(caminho_arquivo(), {'situacao': 'INATIVO'})
+    return render_template("licencas_inativos.html", registros=pagina.registros, pagina=pagina)
 
 @bp.get("/novo")
 @login_required
@@ -113,40 +110,65 @@ def reativar(id: str):
 def importar_form():
     return render_template("licencas_importar.html")
 
+def _gravar(registros, job, sincronizar: bool = False, inativar_ausentes: bool = False) -> dict:
+    def preparar(item):
+        if not sincronizar:  # na sincronização, situação vazia mantém a que já está gravada
+            item["situacao"] = item.get("situacao") or "ATIVO"
+        return item
+
+    # As linhas chegam sob demanda e são gravadas de uma vez (uma leitura + uma gravação do arquivo)
+    # Filial no nome oficial ("Tracbel Agro Franca" -> "14-Franca"), cada valor distinto resolvido uma vez
+    registros_brutos = map(preparar, canonicalizar_coluna(registros, 'filial', FILIAIS))
+    def inativar(item):
+        # Mesmo efeito do botão "inativar" para quem saiu do export
+        if item.get('situacao') == 'INATIVO':
+            return None
+        return {**item, 'situacao': 'INATIVO', 'data_desligamento': date.today().isoformat()}
+    def reativar_se_preciso(atual, novo):
+        # Reativado pela planilha: mesmo efeito do botão "reativar"
+        inativo = lambda it: colecoes.chave_indice(it.get('situacao')) == 'INATIVO'
+        if inativo(atual) and not inativo(novo):
+            novo['data_desligamento'] = ''
+        return novo
+
+    validar = job.validar(lambda it: it.get('nome') or it.get('email'))
+    if sincronizar:
+        # Reimportação do export mensal: casa por e-mail/matrícula em vez de duplicar
+        return sincronizacao.sincronizar(caminho_arquivo(), registros_brutos, validar=validar,
+                                         padroes={"situacao": "ATIVO"}, ajustar=reativar_se_preciso,
+                                         marcar_ausentes=inativar if inativar_ausentes else None)
+    return repo.criar_lote(caminho_arquivo(), registros_brutos, validar=validar)
+
 @bp.post("/importar")
 @somente_ti
 def importar_post():
-    arq = request.files.get("arquivo")
-    if not arq or not arq.filename:
+    arqs = [a for a in request.files.getlist("arquivo") if a.filename]
+    if not arqs:
         flash("Nenhum arquivo enviado. Por favor, selecione um arquivo CSV ou XLSX.", "warning")
         return redirect(url_for("licencas.importar_form"))
-    try:
-        registros_brutos = importar_generico(arq.read(), arq.filename, MAPA_IMPORT)
-        
-        registros_processados = 0
-        for item in registros_brutos:
-            if not item.get('nome') and not item.get('email'):
-                continue
-
-            # --- LÓGICA DE FILIAIS DESATIVADA ---
-            # A linha abaixo foi comentada para ignorar o processamento de filial
-            # item['filial'] = encontrar_filial_correspondente(item.get('filial', ''), FILIAIS)
+    modo = "sincronizar" if request.form.get("sincronizar") else "adicionar"
+    gravar = partial(_gravar, sincronizar=modo == "sincronizar",
+                     inativar_ausentes=bool(request.form.get("inativar_ausentes")))
+    job = importacoes.enviar("licencas", arqs, MAPA_IMPORT, gravar, destino=url_for("licencas.listar"), modo=modo)
+    return redirect(url_for("licencas.importar_form", job=job.id))
 
-            item["situacao"] = item.get("situacao") or "ATIVO"
-            
-            repo.criar(caminho_arquivo(), item)
-            registros_processados += 1
+@bp.post("/importar/previa")
+@somente_ti
+def importar_previa():
+    """Cabeçalhos, primeiras linhas e avisos da planilha, sem gravar nada."""
+    return importacoes.previa("licencas", MAPA_IMPORT, ("nome", "email"))
 
-        flash(f"Importação concluída: {registros_processados} registros processados.", "success")
-    except Exception as e:
-        flash(f"Falha na importação: {e}", "danger")
-    return redirect(url_for("licencas.listar"))
+@bp.post("/importar/mapeamento")
+@somente_ti
+def importar_mapeamento():
+    """Lembra o mapeamento de colunas conferido na prévia."""
+    return importacoes.lembrar_mapeamento(MAPA_IMPORT)
 
 @bp.get("/exportar")
 @login_required
 def exportar():
-    registros = repo.listar(caminho_arquivo())
-    registros_ativos = [r for r in registros if (r.get("situacao", "ATIVO") or "ATIVO").strip().upper() != "INATIVO"]
+    termo = request.args.get('q', '').strip().lower()
+    registros_ativos = partial(repo.filtrar, caminho_arquivo(), excluir={"situacao": "INATIVO"}, busca=termo)
 
     # --- MAPA DE EXPORTAÇÃO CORRIGIDO ---
     campos_exportacao = [
@@ -161,9 +183,8 @@ def exportar():
         ('Empresa', 'empresa')
     ]
 
-    buf = gerar_xlsx("Licencas Ativas", registros_ativos, campos_exportacao)
-    return send_file(buf, as_attachment=True, download_name="licencas_ativas.xlsx",
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return resposta_exportacao("Licencas Ativas", caminho_arquivo(), registros_ativos, campos_exportacao,
+                               "licencas_ativas", filtros={"q": termo})
 
 # --- MAPA DE IMPORTAÇÃO AJUSTADO PARA SUAS COLUNAS ---
 MAPA_IMPORT = {
@@ -178,6 +199,7 @@ MAPA_IMPORT = {
     'empresa': []
 }
 
+
 # Lista de tipos de licença para o formulário
 tipos_de_licencas = [
     'Microsoft Power Automate Free', 'Microsoft Power Automate Premium', 'Microsoft Stream Trial',
@@ -0,0 +1,63 @@
+# app/blueprints/painel.py
+
+from __future__ import annotations
+from datetime import date
+import hashlib
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import login_required
+from ..helpers import filiais, kpis, serie_kpis
+
+bp = Blueprint("painel", __name__)
+
+# Gráficos do painel: nome na URL -> chave em kpis.painel()
+GRAFICOS = {
+    "licencas": "licencas_chart_data",
+    "equipamentos": "equip_chart_data",
+}
+
+def _resposta(dados, etag: str):
+    """JSON com ETag (304 se o navegador já tem) e cache privado pelo tempo do TTL."""
+    resp = jsonify(dados)
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.max_age = int(current_app.config["PAINEL_CACHE_SEGUNDOS"])
+    return resp.make_conditional(request)
+
+@bp.get("/kpis")
+@login_required
+def kpis_painel():
+    dados, etag = kpis.painel_em_cache()
+    return _resposta({k: v for k, v in dados.items() if k not in GRAFICOS.values()}, etag)
+
+@bp.get("/charts/<nome>")
+@login_required
+def grafico(nome: str):
+    if nome not in GRAFICOS:
+        return jsonify({"erro": f"Gráfico desconhecido: {nome}"}), 404
+    dados, etag = kpis.painel_em_cache()
+    return _resposta(dados[GRAFICOS[nome]], f"{etag}-{nome}")
+
+@bp.get("/tendencias/<metrica>")
+@login_required
+def tendencia(metrica: str):
+    """Série de um KPI (total ou de uma filial: ?filial=<filial_id>) nos últimos ?dias= dias."""
+    if metrica not in serie_kpis.METRICAS:
+        return jsonify({"erro": f"Indicador desconhecido: {metrica}"}), 404
+    dimensao = request.args.get("filial", "").strip()
+    dias = min(max(request.args.get("dias", 90, type=int), 1), serie_kpis.RETENCAO_DIAS)
+    # A resposta só muda com a série ou com o dia (a janela de `dias` anda)
+    chave = (serie_kpis.versao(), date.today().isoformat(), metrica, dimensao, dias)
+    etag = hashlib.sha1(repr(chave).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        return _resposta(None, etag)  # 304: a série nem é consultada
+    dados = {"metrica": metrica, "rotulo": serie_kpis.METRICAS[metrica], "filial": dimensao,
+             **serie_kpis.tendencia(metrica, dimensao, dias)}
+    return _resposta(dados, etag)
+
+@bp.app_context_processor
+def _metricas_tendencia():
+    # Opções do gráfico de evolução (includes/grafico_tendencia.html)
+    def metricas_tendencia(por_filial: bool = False) -> dict[str, str]:
+        chaves = [i[0] for i in filiais.INDICADORES] if por_filial else serie_kpis.METRICAS
+        return {k: serie_kpis.METRICAS[k] for k in chaves}
+    return {"metricas_tendencia": metricas_tendencia}
@@ -1,12 +1,13 @@
 # app/blueprints/perifericos.py
 
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, send_file
+from functools import partial
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from pathlib import Path
-from ..helpers import armazenamento_json as repo
+from ..helpers import repositorio as repo, colecoes, importacoes
 from ..helpers.autorizacao import somente_ti
-from ..helpers.importador import importar_generico
-from ..helpers.exportador import gerar_xlsx
+from ..helpers.paginacao import paginar
+from ..helpers.exportador import resposta_exportacao
 
 bp = Blueprint("perifericos", __name__, url_prefix="/perifericos")
 
@@ -20,14 +21,21 @@ def caminho_entregas_arquivo():
 # --- CONTROLE DE ESTOQUE DE PERIFÉRICOS ---
 CAMPOS_ESTOQUE = ['produto', 'qtd_estoque', 'cod_totvs', 'onde_comprar']
 
+# Mapa de importação específico para o estoque de periféricos
+MAPA_IMPORT_ESTOQUE = {
+    'produto': ['produto', 'item', 'descrição'],
+    'qtd_estoque': ['qtd estoque', 'qtd_estoque', 'estoque', 'quantidade'],
+    'cod_totvs': ['cod totvs', 'codigo', 'cód totvs'],
+    'onde_comprar': ['onde comprar', 'fornecedor', 'comprar em']
+}
+colecoes.registrar("perifericos_estoque", CAMPOS_ESTOQUE, busca=("produto",))
+
 @bp.get("/")
 @login_required
 def listar_estoque():
-    registros = repo.listar(caminho_estoque_arquivo())
     termo = request.args.get('q', '').strip().lower()
-    if termo:
-        registros = [r for r in registros if termo in r.get('produto', '').lower()]
-    return render_template("perifericos_listar.html", registros=registros, termo=termo)
+    pagina = paginar(caminho_estoque_arquivo(), busca=termo)
+    return render_template("perifericos_listar.html", registros=pagina.registros, pagina=pagina, termo=termo)
 
 @bp.get("/novo")
 @login_required
@@ -69,15 +77,14 @@ def excluir_item_estoque(id: str):
 
 # --- CONTROLE DE ENTREGAS (COM LÓGICA INTEGRADA) ---
 CAMPOS_ENTREGA = ['glpi', 'solicitante', 'produto_id', 'produto_nome', 'qtd', 'observacao']
+colecoes.registrar("perifericos_entregas", CAMPOS_ENTREGA, busca=("solicitante", "produto_nome"))
 
 @bp.get("/entregas")
 @login_required
 def listar_entregas():
-    registros = repo.listar(caminho_entregas_arquivo())
     termo = request.args.get('q', '').strip().lower()
-    if termo:
-        registros = [r for r in registros if termo in r.get('solicitante', '').lower() or termo in r.get('produto_nome', '').lower()]
-    return render_template("entregas_listar.html", registros=registros, termo=termo)
+    pagina = paginar(caminho_entregas_arquivo(), busca=termo)
+    return render_template("entregas_listar.html", registros=pagina.registros, pagina=pagina, termo=termo)
 
 @bp.get("/entregas/nova")
 @login_required
@@ -145,60 +152,53 @@ def criar_entrega():
 def importar_estoque_form():
     return render_template("perifericos_importar.html")
 
+def _gravar_estoque(registros, job) -> dict:
+    # Salva os registros no arquivo de estoque, pulando linhas sem nome de produto
+    return repo.criar_lote(caminho_estoque_arquivo(), registros, validar=job.validar(lambda it: it.get('produto')))
+
 @bp.post("/estoque/importar")
 @somente_ti
 def importar_estoque_post():
-    arq = request.files.get("arquivo")
-    if not arq or not arq.filename:
+    arqs = [a for a in request.files.getlist("arquivo") if a.filename]
+    if not arqs:
         flash("Nenhum arquivo enviado. Por favor, selecione um arquivo CSV ou XLSX.", "warning")
         return redirect(url_for("perifericos.importar_estoque_form"))
-    try:
-        # Mapa de importação específico para o estoque de periféricos
-        mapa = {
-            'produto': ['produto', 'item', 'descrição'],
-            'qtd_estoque': ['qtd estoque', 'qtd_estoque', 'estoque', 'quantidade'],
-            'cod_totvs': ['cod totvs', 'codigo', 'cód totvs'],
-            'onde_comprar': ['onde comprar', 'fornecedor', 'comprar em']
-        }
-
-        # Chama o importador genérico
-        registros = importar_generico(arq.read(), arq.filename, mapa)
-
-        # Salva cada registro no arquivo de estoque
-        for item in registros:
-            # Pula linhas que não tenham um nome de produto
-            if not item.get('produto'):
-                continue
-            repo.criar(caminho_estoque_arquivo(), item)
-
-        flash(f"Importação de estoque concluída: {len(registros)} registros processados.", "success")
-
-    except Exception as e:
-        flash(f"Falha na importação: {e}", "danger")
-
-    # Esta linha de redirect resolve o erro TypeError
-    return redirect(url_for("perifericos.listar_estoque"))
+    job = importacoes.enviar("perifericos_estoque", arqs, MAPA_IMPORT_ESTOQUE, _gravar_estoque,
+                              destino=url_for("perifericos.listar_estoque"))
+    return redirect(url_for("perifericos.importar_estoque_form", job=job.id))
+
+@bp.post("/estoque/importar/previa")
+@somente_ti
+def importar_estoque_previa():
+    """Cabeçalhos, primeiras linhas e avisos da planilha, sem gravar nada."""
+    return importacoes.previa("perifericos_estoque", MAPA_IMPORT_ESTOQUE, ("produto",))
+
+@bp.post("/estoque/importar/mapeamento")
+@somente_ti
+def importar_estoque_mapeamento():
+    """Lembra o mapeamento de colunas conferido na prévia."""
+    return importacoes.lembrar_mapeamento(MAPA_IMPORT_ESTOQUE)
 
 @bp.get("/estoque/exportar")
 @login_required
 def exportar_estoque():
-    regs = repo.listar(caminho_estoque_arquivo())
+    termo = request.args.get('q', '').strip().lower()
+    regs = partial(repo.filtrar, caminho_estoque_arquivo(), busca=termo)
     campos = [
         ('PRODUTO', 'produto'), ('QTD ESTOQUE', 'qtd_estoque'),
         ('COD TOTVS', 'cod_totvs'), ('ONDE COMPRAR', 'onde_comprar')
     ]
-    buf = gerar_xlsx("Estoque de Perifericos", regs, campos)
-    return send_file(buf, as_attachment=True, download_name="estoque_perifericos.xlsx",
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return resposta_exportacao("Estoque de Perifericos", caminho_estoque_arquivo(), regs, campos,
+                               "estoque_perifericos", filtros={"q": termo})
 
 @bp.get("/entregas/exportar")
 @login_required
 def exportar_entregas():
-    regs = repo.listar(caminho_entregas_arquivo())
+    termo = request.args.get('q', '').strip().lower()
+    regs = partial(repo.filtrar, caminho_entregas_arquivo(), busca=termo)
     campos = [
         ('GLPI', 'glpi'), ('DESCRIÇÃO/SOLICITANTE', 'descricao_solicitante'),
         ('EQUIPAMENTO', 'equipamento'), ('QTD', 'qtd'), ('OBSERVAÇÃO', 'observacao')
     ]
-    buf = gerar_xlsx("Entregas de Perifericos", regs, campos)
-    return send_file(buf, as_attachment=True, download_name="entregas_perifericos.xlsx",
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
\ No newline at end of file
+    return resposta_exportacao("Entregas de Perifericos", caminho_entregas_arquivo(), regs, campos,
+                               "entregas_perifericos", filtros={"q": termo})
\ No newline at end of file
@@ -1,14 +1,15 @@
 from __future__ import annotations
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, send_file
+from functools import partial
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from pathlib import Path
-from ..helpers import armazenamento_json as repo
+from ..helpers import repositorio as repo, colecoes, filiais, importacoes
 from ..helpers.autorizacao import somente_ti
-from ..helpers.importador import importar_generico
-from ..helpers.exportador import gerar_xlsx
+from ..helpers.paginacao import paginar
+from ..helpers.exportador import resposta_exportacao
 from ..helpers.padronizador import encontrar_filial_correspondente
 # No topo de licenças.py
-from ..helpers.importador import importar_generico, analisar_cabecalhos_planilha
+from ..helpers.importador import analisar_cabecalhos_planilha
 # from ..helpers.constants import FILIAIS
 
 bp = Blueprint("vpn", __name__, template_folder="../templates")
@@ -17,19 +18,22 @@ def caminho_arquivo():
     return Path(current_app.config["DIRETORIO_DADOS"]) / "vpn.json"
 
 CAMPOS = ['nome','email','filial','data_solicitacao','data_retirada','status','glpi_chamado']
+colecoes.registrar("vpn", CAMPOS, indices=("filial", "status"), busca=("nome", "email"), filial="filial")
 
 @bp.get("/")
 @login_required
 def listar():
-    registros = repo.listar(caminho_arquivo())
     filial = request.args.get('filial','').strip()
     termo  = request.args.get('q','').strip().lower()
     status = request.args.get('status','').strip().upper()
-    if termo:  registros = [r for r in registros if termo in (r.get('nome','') + r.get('email','')).lower()]
-    if filial: registros = [r for r in registros if (r.get('filial') or '') == filial]
-    if status: registros = [r for r in registros if (r.get('status','').upper() == status)]
-    registros.sort(key=lambda x: x.get('data_solicitacao',''), reverse=True)
-    return render_template("vpn_listar.html", registros=registros, termo=termo, filial_atual=filial, status_atual=status)
+    # filial/status e o termo de busca saem dos índices
+    criterios = filiais.criterio(filial, caminho_arquivo())
+    if status:
+        criterios['status'] = status
+    # Mais recentes primeiro, a não ser que a tela peça outra ordem (?sort=)
+    pagina = paginar(caminho_arquivo(), criterios, busca=termo, ordem_padrao='-data_solicitacao')
+    return render_template("vpn_listar.html", registros=pagina.registros, pagina=pagina,
+                           termo=termo, filial_atual=filial, status_atual=status)
 
 @bp.get("/novo")
 @login_required
@@ -71,42 +75,45 @@ def importar_form():
 
 # Em app/blueprints/vpn.py
 
+def _gravar(registros_brutos, job) -> dict:
+    # A lógica de filiais está desativada, como solicitado
+    return repo.criar_lote(caminho_arquivo(), registros_brutos, validar=job.validar(lambda it: it.get('nome')))
+
 # Em app/blueprints/vpn.py
 
 @bp.route("/importar", methods=['POST']) # <--- VERSÃO CORRIGIDA
 @somente_ti
 def importar_post():
-    arq = request.files.get("arquivo")
-    if not arq or not arq.filename:
+    arqs = [a for a in request.files.getlist("arquivo") if a.filename]
+    if not arqs:
         flash("Nenhum arquivo enviado. Por favor, selecione um arquivo CSV ou XLSX.", "warning")
         return redirect(url_for("vpn.importar_form"))
-    try:
-        # Sua lógica de importação...
-        registros_brutos = importar_generico(arq.read(), arq.filename, MAPA_IMPORT)
-
-        registros_processados = 0
-        for item in registros_brutos:
-            if not item.get('nome'):
-                continue
-
-            # A lógica de filiais está desativada, como solicitado
+    job = importacoes.enviar("vpn", arqs, MAPA_IMPORT, _gravar, destino=url_for("vpn.listar"))
+    return redirect(url_for("vpn.importar_form", job=job.id))
 
-            repo.criar(caminho_arquivo(), item)
-            registros_processados += 1
-
-        flash(f"Importação concluída: {registros_processados} registros processados.", "success")
-    except Exception as e:
-        flash(f"Falha na importação: {e}", "danger")
+@bp.post("/importar/previa")
+@somente_ti
+def importar_previa():
+    """Cabeçalhos, primeiras linhas e avisos da planilha, sem gravar nada."""
+    return importacoes.previa("vpn", MAPA_IMPORT, ("nome",))
 
-    return redirect(url_for("vpn.listar"))
+@bp.post("/importar/mapeamento")
+@somente_ti
+def importar_mapeamento():
+    """Lembra o mapeamento de colunas conferido na prévia."""
+    return importacoes.lembrar_mapeamento(MAPA_IMPORT)
 
 @bp.get("/exportar")
 @login_required
 def exportar():
-    registros = repo.listar(caminho_arquivo())
-    # Filtros (opcional, mas bom manter)
+    # Mesmos filtros da listagem
+    filial = request.args.get('filial','').strip()
     termo  = request.args.get('q','').strip().lower()
-    if termo:  registros = [r for r in registros if termo in (r.get('nome','')+r.get('email','')).lower()]
+    status = request.args.get('status','').strip().upper()
+    criterios = filiais.criterio(filial, caminho_arquivo())
+    if status:
+        criterios['status'] = status
+    registros = partial(repo.filtrar, caminho_arquivo(), busca=termo, **criterios)
 
     # --- MAPA DE EXPORTAÇÃO CORRIGIDO ---
     campos = [
@@ -117,9 +124,8 @@ def exportar():
         ('GLPI', 'glpi_chamado')
     ]
 
-    buf = gerar_xlsx("Liberacao_VPN", registros, campos)
-    return send_file(buf, as_attachment=True, download_name="liberacao_vpn.xlsx",
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return resposta_exportacao("Liberacao_VPN", caminho_arquivo(), registros, campos, "liberacao_vpn",
+                               filtros={"q": termo, **criterios})
 
 # Em app/blueprints/vpn.py
 
@@ -132,4 +138,4 @@ MAPA_IMPORT = {
     'data_retirada': ['data de retirada', 'data retirada'],
     'status': ['status', 'feito', 'situação'],
     'glpi_chamado': ['glpi', 'chamado', 'nº chamado']
-}
\ No newline at end of file
+}
@@ -3,3 +3,11 @@ FILIAIS = [
 '07-Ituverava','08-Guaira','09-Barretos','10-Araraquara','11-Monte Alto',
 '12-Bebedouro','13-Orlandia','14-Franca','15-Itapolis','16-Ribeirao Preto'
 ]
+
+# Outros nomes pelos quais as filiais aparecem nas planilhas (ver helpers/padronizador).
+# Nomes que já contêm o da filial ("Tracbel Agro Franca") não precisam estar aqui.
+ALIASES_FILIAIS = {
+    'Sao Jose do Rio Preto': '01-Rio Preto',
+    'SJRP': '01-Rio Preto',
+    'S J Rio Preto': '01-Rio Preto',
+}
@@ -0,0 +1,262 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+import json, os, tempfile, threading, uuid, copy
+
+try:  # trava entre processos (só existe em sistemas Unix)
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# --- MOTOR "JOURNAL" ---
+# Cada coleção vira um snapshot (JSON) + um log append-only (uma mutação por linha):
+#   dados/journal/<colecao>.snapshot.json
+#   dados/journal/<colecao>.log.jsonl
+# Gravar um registro custa só uma linha no log. O estado é snapshot + log e, quando o
+# log cresce demais, uma thread em segundo plano gera um snapshot novo e zera o log.
+# Na primeira vez, o dados/<colecao>.json existente vira o snapshot inicial.
+#
+# As operações do log são idempotentes ("put" grava o registro inteiro, "del" remove
+# pelo id), então reaplicar o log sobre um snapshot mais novo não estraga nada.
+COMPACTAR_MIN_BYTES = 1024 * 1024  # log mínimo antes de pensar em compactar
+COMPACTAR_RAZAO = 0.5              # ...e ele precisa passar de 50% do snapshot
+FSYNC = False                      # True = fsync a cada gravação (mais lento, mais seguro)
+
+class _Colecao:
+    def __init__(self, origem: Path):
+        self.origem = origem
+        pasta = origem.parent / "journal"
+        self.snapshot = pasta / f"{origem.stem}.snapshot.json"
+        self.log = pasta / f"{origem.stem}.log.jsonl"
+        self.trava_arquivo = pasta / f"{origem.stem}.lock"
+        self.registros: dict[str, dict] = {}
+        self.versao = None       # (inode do snapshot, inode do log) carregados
+        self.offset = 0          # bytes do log já aplicados
+        self.cauda_parcial = False
+        self.compactando = False
+        self.trava = threading.RLock()
+
+_colecoes: dict[str, _Colecao] = {}
+_trava_global = threading.Lock()
+
+@contextmanager
+def _exclusivo(col: _Colecao):
+    """Trava de arquivo para as gravações no log e para a troca do snapshot."""
+    if fcntl is None:
+        yield
+        return
+    with open(col.trava_arquivo, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _gravar_atomico(path: Path, conteudo: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo)
+            f.flush()
+            if FSYNC: os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+def _aplicar(col: _Colecao, op: dict) -> None:
+    if op.get("op") == "put":
+        col.registros[op["id"]] = op["dados"]
+    elif op.get("op") == "del":
+        col.registros.pop(op["id"], None)
+
+def _reaplicar_log(col: _Colecao) -> None:
+    """Aplica as linhas completas do log a partir de col.offset."""
+    with open(col.log, "rb") as f:
+        f.seek(col.offset)
+        bruto = f.read()
+    fim = bruto.rfind(b"\n") + 1
+    for linha in bruto[:fim].splitlines():
+        if not linha.strip():
+            continue
+        try:
+            _aplicar(col, json.loads(linha))
+        except (ValueError, KeyError):
+            continue  # linha corrompida (queda no meio de uma gravação)
+    col.offset += fim
+    col.cauda_parcial = fim < len(bruto)
+
+def _importar_legado(col: _Colecao) -> None:
+    """Primeiro uso: o dados/<colecao>.json atual vira o snapshot inicial."""
+    lista = []
+    if col.origem.exists():
+        try:
+            lista = json.loads(col.origem.read_text(encoding="utf-8") or "[]")
+        except ValueError:
+            lista = []
+    for it in lista:
+        it["id"] = it.get("id") or str(uuid.uuid4())
+    _gravar_atomico(col.snapshot, json.dumps(lista, ensure_ascii=False).encode("utf-8"))
+    col.log.touch()
+
+def _sincronizar(col: _Colecao) -> None:
+    """Deixa o estado em memória igual a snapshot + log (inclusive gravações de outros processos)."""
+    if not col.snapshot.exists():
+        col.snapshot.parent.mkdir(parents=True, exist_ok=True)
+        with _exclusivo(col):
+            if not col.snapshot.exists():
+                _importar_legado(col)
+    if not col.log.exists():
+        col.log.touch()
+    st_log, st_snap = os.stat(col.log), os.stat(col.snapshot)
+    versao = (st_snap.st_ino, st_log.st_ino)
+    if versao != col.versao or st_log.st_size < col.offset:
+        # Primeira carga ou outro processo compactou: recarrega tudo
+        lista = json.loads(col.snapshot.read_text(encoding="utf-8") or "[]")
+        col.registros = {it["id"]: it for it in lista}
+        col.versao, col.offset = versao, 0
+        _reaplicar_log(col)
+    elif st_log.st_size > col.offset:
+        _reaplicar_log(col)
+
+def _abrir(path: Path) -> _Colecao:
+    chave = str(Path(path).resolve())
+    with _trava_global:
+        col = _colecoes.get(chave)
+        if col is None:
+            col = _colecoes[chave] = _Colecao(Path(path))
+    with col.trava:
+        _sincronizar(col)
+    return col
+
+def _anexar(col: _Colecao, ops: list[dict]) -> None:
+    """Grava as operações no fim do log (uma única escrita) e aplica em memória."""
+    dados = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops).encode("utf-8")
+    if col.cauda_parcial:
+        dados = b"\n" + dados  # isola a linha quebrada deixada por uma queda
+    with _exclusivo(col):
+        fd = os.open(col.log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            tamanho_antes = os.fstat(fd).st_size
+            os.write(fd, dados)
+            if FSYNC: os.fsync(fd)
+        finally:
+            os.close(fd)
+    if tamanho_antes == col.offset:
+        # Ninguém escreveu entre a sincronização e a nossa gravação
+        col.offset += len(dados)
+        col.cauda_parcial = False
+        for op in ops:
+            _aplicar(col, op)
+    else:
+        _reaplicar_log(col)
+    _talvez_compactar(col)
+
+# --- COMPACTAÇÃO EM SEGUNDO PLANO ---
+
+def _talvez_compactar(col: _Colecao) -> None:
+    if col.compactando or col.offset < COMPACTAR_MIN_BYTES:
+        return
+    if col.offset < COMPACTAR_RAZAO * os.stat(col.snapshot).st_size:
+        return
+    col.compactando = True
+    threading.Thread(target=_compactar, args=(col,), daemon=True).start()
+
+def _compactar(col: _Colecao) -> None:
+    try:
+        with col.trava:
+            _sincronizar(col)
+            estado, corte, versao = list(col.registros.values()), col.offset, col.versao
+        # Serializar o snapshot é a parte cara: fica fora da trava
+        conteudo = json.dumps(estado, ensure_ascii=False).encode("utf-8")
+        with col.trava, _exclusivo(col):
+            _sincronizar(col)
+            if col.versao != versao:
+                return  # outro processo compactou antes
+            with open(col.log, "rb") as f:
+                f.seek(corte)
+                resto = f.read()  # o que foi gravado enquanto o snapshot era gerado
+            _gravar_atomico(col.snapshot, conteudo)
+            _gravar_atomico(col.log, resto)
+            col.versao = (os.stat(col.snapshot).st_ino, os.stat(col.log).st_ino)
+            col.offset = 0
+            col.registros = {it["id"]: it for it in estado}
+            _reaplicar_log(col)
+    finally:
+        col.compactando = False
+
+def compactar(path: Path) -> None:
+    """Compacta a coleção imediatamente (na thread atual)."""
+    col = _abrir(path)
+    col.compactando = True
+    _compactar(col)
+
+# --- API (mesmas funções do armazenamento_json) ---
+
+def versao(path: Path):
+    """Muda a cada gravação no log ou compactação (deste ou de outro processo)."""
+    col = _abrir(path)
+    with col.trava:
+        return (col.versao, col.offset)
+
+def listar(path: Path) -> list[dict]:
+    """Cópias dos registros: quem altera o resultado não mexe no estado em memória."""
+    col = _abrir(path)
+    with col.trava:
+        return [dict(it) for it in col.registros.values()]
+
+def criar(path: Path, dados: dict) -> dict:
+    col = _abrir(path)
+    item = copy.deepcopy(dados)
+    item["id"] = item.get("id") or str(uuid.uuid4())
+    with col.trava:
+        _anexar(col, [{"op": "put", "id": item["id"], "dados": item}])
+    return item
+
+def criar_lote(path: Path, registros, validar=None) -> dict:
+    novos, ignorados = [], 0
+    for dados in registros:
+        if validar and not validar(dados):
+            ignorados += 1
+            continue
+        item = dict(dados)
+        item["id"] = item.get("id") or str(uuid.uuid4())
+        novos.append({"op": "put", "id": item["id"], "dados": item})
+    if novos:
+        col = _abrir(path)
+        with col.trava:
+            _anexar(col, novos)
+    return {"inseridos": len(novos), "ignorados": ignorados, "registros": [op["dados"] for op in novos]}
+
+def gravar_lote(path: Path, itens: list[dict]) -> None:
+    """Registros completos (com id), novos ou já existentes, numa única escrita no log."""
+    if not itens:
+        return
+    col = _abrir(path)
+    with col.trava:
+        _anexar(col, [{"op": "put", "id": it["id"], "dados": dict(it)} for it in itens])
+
+def atualizar(path: Path, id: str, dados: dict) -> bool:
+    col = _abrir(path)
+    with col.trava:
+        if id not in col.registros:
+            return False
+        novo = copy.deepcopy(dados)
+        novo["id"] = id
+        _anexar(col, [{"op": "put", "id": id, "dados": novo}])
+    return True
+
+def excluir(path: Path, id: str) -> bool:
+    col = _abrir(path)
+    with col.trava:
+        if id not in col.registros:
+            return False
+        _anexar(col, [{"op": "del", "id": id}])
+    return True
+
+def obter_por_id(path: Path, id: str) -> dict | None:
+    col = _abrir(path)
+    with col.trava:
+        it = col.registros.get(id)
+    return dict(it) if it else None
@@ -1,50 +1,181 @@
 from __future__ import annotations
+from collections import OrderedDict
 from pathlib import Path
-import json, uuid, copy
+import json, os, tempfile, threading, uuid, copy
+
+# --- CACHE DAS COLEÇÕES EM MEMÓRIA ---
+# Cada arquivo lido fica em memória já convertido (lista de dicts) junto com a
+# "assinatura" do arquivo (inode, tamanho, mtime). Se outro worker regravar o
+# arquivo a assinatura muda e a próxima leitura volta ao disco.
+LIMITE_CACHE_BYTES = 64 * 1024 * 1024  # orçamento total, medido pelo tamanho dos arquivos
+
+_cache: "OrderedDict[str, tuple[tuple, list[dict], int]]" = OrderedDict()
+_bytes_em_cache = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_trava = threading.RLock()
+
+def _assinatura(st: os.stat_result) -> tuple:
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _guardar_cache(chave: str, assinatura: tuple, lista: list[dict]) -> None:
+    global _bytes_em_cache
+    tamanho = assinatura[1]
+    antigo = _cache.pop(chave, None)
+    if antigo:
+        _bytes_em_cache -= antigo[2]
+    if tamanho > LIMITE_CACHE_BYTES:
+        return  # arquivo maior que o orçamento inteiro: não vale a pena guardar
+    _cache[chave] = (assinatura, lista, tamanho)
+    _bytes_em_cache += tamanho
+    while _bytes_em_cache > LIMITE_CACHE_BYTES and _cache:
+        _, (_, _, liberado) = _cache.popitem(last=False)
+        _bytes_em_cache -= liberado
+        _stats["evictions"] += 1
+
+def configurar_cache(limite_bytes: int) -> None:
+    """Ajusta o orçamento de memória do cache (descarta o que passar do limite)."""
+    global LIMITE_CACHE_BYTES, _bytes_em_cache
+    with _trava:
+        LIMITE_CACHE_BYTES = int(limite_bytes)
+        while _bytes_em_cache > LIMITE_CACHE_BYTES and _cache:
+            _, (_, _, liberado) = _cache.popitem(last=False)
+            _bytes_em_cache -= liberado
+            _stats["evictions"] += 1
+
+def limpar_cache() -> None:
+    global _bytes_em_cache
+    with _trava:
+        _cache.clear()
+        _bytes_em_cache = 0
+
+def estatisticas_cache() -> dict:
+    """Contadores do cache: hits, misses, evictions, entradas e bytes ocupados."""
+    with _trava:
+        return {**_stats, "entradas": len(_cache), "bytes": _bytes_em_cache}
+
+# --- LEITURA / GRAVAÇÃO ---
 
 def _ler(path: Path) -> list[dict]:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    if not path.exists():
+    """Retorna a lista da coleção (a lista do cache: quem for alterar deve copiar)."""
+    chave = str(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
         path.write_text("[]", encoding="utf-8")
+        st = os.stat(path)
+    assinatura = _assinatura(st)
+    with _trava:
+        entrada = _cache.get(chave)
+        if entrada and entrada[0] == assinatura:
+            _cache.move_to_end(chave)
+            _stats["hits"] += 1
+            return entrada[1]
+        _stats["misses"] += 1
     try:
-        return json.loads(path.read_text(encoding="utf-8") or "[]")
+        lista = json.loads(path.read_text(encoding="utf-8") or "[]")
     except Exception:
         return []
+    with _trava:
+        _guardar_cache(chave, assinatura, lista)
+    return lista
 
 def _gravar(path: Path, lista: list[dict]) -> None:
-    path.write_text(json.dumps(lista, ensure_ascii=False, indent=2), encoding="utf-8")
+    """Grava em arquivo temporário e troca de forma atômica, atualizando o cache."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(lista, f, ensure_ascii=False, indent=2)
+            f.flush()
+            st = os.fstat(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    with _trava:
+        _guardar_cache(str(path), _assinatura(st), lista)
+
+def versao(path: Path):
+    """Assinatura atual do arquivo: muda a cada gravação (nossa ou de outro processo)."""
+    try:
+        return _assinatura(os.stat(path))
+    except FileNotFoundError:
+        return None
 
 def listar(path: Path) -> list[dict]:
-    return _ler(path)
+    """Cópias dos registros: quem altera o resultado não mexe no cache."""
+    return [dict(it) for it in _ler(path)]
 
 def criar(path: Path, dados: dict) -> dict:
-    lista = _ler(path)
-    item = copy.deepcopy(dados)
-    item["id"] = item.get("id") or str(uuid.uuid4())
-    lista.append(item)
-    _gravar(path, lista)
+    with _trava:
+        lista = list(_ler(path))
+        item = copy.deepcopy(dados)
+        item["id"] = item.get("id") or str(uuid.uuid4())
+        lista.append(item)
+        _gravar(path, lista)
     return item
 
+def criar_lote(path: Path, registros, validar=None) -> dict:
+    """
+    Insere vários registros com uma única leitura e uma única gravação.
+    `validar(item)` (opcional) decide se a linha entra; as recusadas são contadas como ignoradas.
+    Devolve {"inseridos", "ignorados", "registros"} (registros = os itens gravados, já com id).
+    """
+    novos, ignorados = [], 0
+    for dados in registros:
+        if validar and not validar(dados):
+            ignorados += 1
+            continue
+        item = dict(dados)  # registros de importação são planos (str), cópia rasa basta
+        item["id"] = item.get("id") or str(uuid.uuid4())
+        novos.append(item)
+    if novos:
+        with _trava:
+            lista = list(_ler(path))
+            lista.extend(novos)
+            _gravar(path, lista)
+    return {"inseridos": len(novos), "ignorados": ignorados, "registros": novos}
+
+def gravar_lote(path: Path, itens: list[dict]) -> None:
+    """Grava vários registros completos (com id) numa única gravação: substitui os que já existem, acrescenta os novos."""
+    if not itens:
+        return
+    with _trava:
+        lista = list(_ler(path))
+        posicao = {it.get("id"): i for i, it in enumerate(lista)}
+        for item in itens:
+            i = posicao.get(item["id"])
+            if i is None:
+                posicao[item["id"]] = len(lista)
+                lista.append(dict(item))
+            else:
+                lista[i] = dict(item)
+        _gravar(path, lista)
+
 def atualizar(path: Path, id: str, dados: dict) -> bool:
-    lista = _ler(path)
-    ok = False
-    for i, it in enumerate(lista):
-        if it.get("id") == id:
-            novo = copy.deepcopy(dados)
-            novo["id"] = id
-            lista[i] = novo
-            ok = True
-            break
-    if ok: _gravar(path, lista)
+    with _trava:
+        lista = list(_ler(path))
+        ok = False
+        for i, it in enumerate(lista):
+            if it.get("id") == id:
+                novo = copy.deepcopy(dados)
+                novo["id"] = id
+                lista[i] = novo
+                ok = True
+                break
+        if ok: _gravar(path, lista)
     return ok
 
 def excluir(path: Path, id: str) -> bool:
-    lista = _ler(path); size = len(lista)
-    lista = [it for it in lista if it.get("id") != id]
-    _gravar(path, lista)
+    with _trava:
+        lista = _ler(path); size = len(lista)
+        lista = [it for it in lista if it.get("id") != id]
+        _gravar(path, lista)
     return len(lista) != size
 
 def obter_por_id(path: Path, id: str) -> dict | None:
     for it in _ler(path):
-        if it.get("id") == id: return it
+        if it.get("id") == id: return dict(it)
     return None
@@ -0,0 +1,360 @@
+from __future__ import annotations
+from pathlib import Path
+import json, re, sqlite3, threading, uuid
+
+from . import colecoes
+
+# --- MOTOR SQLITE ---
+# Todas as coleções ficam em dados/portal.sqlite3, uma tabela por coleção.
+# Os CAMPOS registrados (helpers/colecoes.py) viram colunas de verdade e os
+# campos declarados como índice ganham índice próprio; qualquer outro campo
+# do registro vai para a coluna "extras" (JSON). Cada campo indexado tem ainda
+# uma coluna "_ix_<campo>" com o valor normalizado (colecoes.chave_indice), que
+# é a que recebe o índice e atende filtrar()/contar(). A tabela _versoes guarda
+# um contador por coleção, incrementado na mesma transação de cada gravação
+# (é a "versão" usada pelos índices de busca e caches). Modo WAL: leitores não
+# bloqueiam o gravador.
+ARQUIVO_BANCO = "portal.sqlite3"
+TAMANHO_LOTE = 1000
+
+_IDENT = re.compile(r"^[a-z_][a-z0-9_]*$")
+_local = threading.local()
+_esquemas: set[tuple[str, str]] = set()
+_trava_esquema = threading.Lock()
+
+def _banco(path: Path) -> Path:
+    return Path(path).parent / ARQUIVO_BANCO
+
+def _conexao(path: Path) -> sqlite3.Connection:
+    """Uma conexão por thread e por banco."""
+    conexoes = getattr(_local, "conexoes", None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    banco = str(_banco(path))
+    con = conexoes.get(banco)
+    if con is None:
+        con = sqlite3.connect(banco, timeout=30, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        # Mesma chave de ordenação dos índices em memória (ORDER BY chave("campo"))
+        con.create_function("chave", 1, colecoes.chave_indice, deterministic=True)
+        conexoes[banco] = con
+    return con
+
+def _colunas(path: Path) -> list[str]:
+    info = colecoes.obter(path)
+    cols = []
+    for c in [*info["campos"], *info["indices"]]:
+        if c != "id" and c not in cols and _IDENT.match(c):
+            cols.append(c)
+    return cols
+
+def _tabela(path: Path) -> str:
+    nome = colecoes.nome_da_colecao(path)
+    if not _IDENT.match(nome):
+        raise ValueError(f"Nome de coleção inválido para o SQLite: {nome}")
+    return nome
+
+def _indexados(path: Path) -> list[str]:
+    return [c for c in colecoes.obter(path)["indices"] if _IDENT.match(c)]
+
+def _preparar(path: Path) -> tuple[sqlite3.Connection, str, list[str]]:
+    """Garante tabela, colunas e índices da coleção (uma vez por processo)."""
+    con, tabela, cols = _conexao(path), _tabela(path), _colunas(path)
+    chave = (str(_banco(path)), tabela)
+    if chave in _esquemas:
+        return con, tabela, cols
+    with _trava_esquema:
+        con.execute("CREATE TABLE IF NOT EXISTS _versoes (colecao TEXT PRIMARY KEY, versao INTEGER NOT NULL)")
+        con.execute(f'CREATE TABLE IF NOT EXISTS "{tabela}" ('
+                    'seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, extras TEXT)')
+        existentes = {r[1] for r in con.execute(f'PRAGMA table_info("{tabela}")')}
+        for c in cols:
+            if c not in existentes:
+                con.execute(f'ALTER TABLE "{tabela}" ADD COLUMN "{c}" TEXT')
+        novos_ix = [c for c in _indexados(path) if f"_ix_{c}" not in existentes]
+        for c in novos_ix:
+            con.execute(f'ALTER TABLE "{tabela}" ADD COLUMN "_ix_{c}" TEXT')
+        if novos_ix and existentes:
+            _preencher_indices(con, tabela, cols, novos_ix)
+        for c in _indexados(path):
+            con.execute(f'DROP INDEX IF EXISTS "ix_{tabela}_{c}"')  # índice antigo, na coluna sem normalizar
+            con.execute(f'CREATE INDEX IF NOT EXISTS "ixn_{tabela}_{c}" ON "{tabela}" ("_ix_{c}")')
+        _esquemas.add(chave)
+    return con, tabela, cols
+
+def _preencher_indices(con: sqlite3.Connection, tabela: str, cols: list[str], campos: list[str]) -> None:
+    """Calcula as colunas _ix_ de linhas que já existiam antes do índice ser declarado."""
+    linhas = [_para_dict(l, cols) for l in con.execute(_select(tabela, cols))]
+    sets = ", ".join(f'"_ix_{c}" = ?' for c in campos)
+    with con:
+        con.execute("BEGIN")
+        con.executemany(f'UPDATE "{tabela}" SET {sets} WHERE id = ?',
+                        [[*(colecoes.chave_indice(it.get(c)) for c in campos), it["id"]] for it in linhas])
+
+def _para_linha(item: dict, cols: list[str], ixs: list[str]) -> list:
+    """dict -> valores das colunas (id, extras, *cols, *_ix_). Valores que não são texto vão para extras."""
+    extras = {}
+    for k, v in item.items():
+        if k == "id":
+            continue
+        if k not in cols or not isinstance(v, str):
+            extras[k] = v
+    valores = [item.get(c) if isinstance(item.get(c), str) else None for c in cols]
+    normalizados = [colecoes.chave_indice(item.get(c)) for c in ixs]
+    return [item["id"], json.dumps(extras, ensure_ascii=False) if extras else None, *valores, *normalizados]
+
+def _para_dict(linha: sqlite3.Row | tuple, cols: list[str]) -> dict:
+    # linha = (seq, id, extras, *cols)
+    item = {c: v for c, v in zip(cols, linha[3:]) if v is not None}
+    if linha[2]:
+        item.update(json.loads(linha[2]))
+    item["id"] = linha[1]
+    return item
+
+def _select(tabela: str, cols: list[str]) -> str:
+    lista = ", ".join(f'"{c}"' for c in cols)
+    return f'SELECT seq, id, extras{", " + lista if lista else ""} FROM "{tabela}"'
+
+def _insert(tabela: str, cols: list[str], ixs: list[str], modo: str = "INSERT") -> str:
+    nomes = ", ".join(["id", "extras", *(f'"{c}"' for c in cols), *(f'"_ix_{c}"' for c in ixs)])
+    marcas = ", ".join("?" * (len(cols) + len(ixs) + 2))
+    return f'{modo} INTO "{tabela}" ({nomes}) VALUES ({marcas})'
+
+def _tocar(con: sqlite3.Connection, tabela: str) -> None:
+    """Incrementa a versão da coleção (chamar dentro da transação da gravação)."""
+    con.execute("INSERT INTO _versoes (colecao, versao) VALUES (?, 1) "
+                "ON CONFLICT(colecao) DO UPDATE SET versao = versao + 1", (tabela,))
+
+# --- API (mesmas funções do armazenamento_json) ---
+
+def versao(path: Path):
+    con, tabela, _ = _preparar(path)
+    linha = con.execute("SELECT versao FROM _versoes WHERE colecao = ?", (tabela,)).fetchone()
+    return (str(_banco(path)), tabela, linha[0] if linha else 0)
+
+def listar(path: Path) -> list[dict]:
+    con, tabela, cols = _preparar(path)
+    return [_para_dict(l, cols) for l in con.execute(_select(tabela, cols) + " ORDER BY seq")]
+
+def obter_por_id(path: Path, id: str) -> dict | None:
+    con, tabela, cols = _preparar(path)
+    linha = con.execute(_select(tabela, cols) + " WHERE id = ?", (id,)).fetchone()
+    return _para_dict(linha, cols) if linha else None
+
+def criar(path: Path, dados: dict) -> dict:
+    con, tabela, cols = _preparar(path)
+    item = dict(dados)
+    item["id"] = item.get("id") or str(uuid.uuid4())
+    ixs = _indexados(path)
+    with con:
+        con.execute("BEGIN")
+        con.execute(_insert(tabela, cols, ixs), _para_linha(item, cols, ixs))
+        _tocar(con, tabela)
+    return item
+
+def criar_lote(path: Path, registros, validar=None) -> dict:
+    """`registros` pode ser um gerador: as linhas vão para o banco em blocos de TAMANHO_LOTE."""
+    con, tabela, cols = _preparar(path)
+    ixs = _indexados(path)
+    sql = _insert(tabela, cols, ixs)
+    novos, ignorados, lote = [], 0, []
+    with con:  # uma transação para o lote inteiro (erro no meio = nada gravado)
+        con.execute("BEGIN")
+        for dados in registros:
+            if validar and not validar(dados):
+                ignorados += 1
+                continue
+            item = dict(dados)
+            item["id"] = item.get("id") or str(uuid.uuid4())
+            novos.append(item)
+            lote.append(_para_linha(item, cols, ixs))
+            if len(lote) >= TAMANHO_LOTE:
+                con.executemany(sql, lote)
+                lote = []
+        if lote:
+            con.executemany(sql, lote)
+        if novos:
+            _tocar(con, tabela)
+    return {"inseridos": len(novos), "ignorados": ignorados, "registros": novos}
+
+def gravar_lote(path: Path, itens: list[dict]) -> None:
+    """Registros completos (com id) numa transação: os existentes são atualizados no lugar (mantêm o seq)."""
+    if not itens:
+        return
+    con, tabela, cols = _preparar(path)
+    ixs = _indexados(path)
+    sets = ", ".join(["extras = excluded.extras", *(f'"{c}" = excluded."{c}"' for c in cols),
+                      *(f'"_ix_{c}" = excluded."_ix_{c}"' for c in ixs)])
+    sql = _insert(tabela, cols, ixs) + f" ON CONFLICT(id) DO UPDATE SET {sets}"
+    with con:
+        con.execute("BEGIN")
+        for i in range(0, len(itens), TAMANHO_LOTE):
+            con.executemany(sql, [_para_linha(it, cols, ixs) for it in itens[i:i + TAMANHO_LOTE]])
+        _tocar(con, tabela)
+
+def atualizar(path: Path, id: str, dados: dict) -> bool:
+    con, tabela, cols = _preparar(path)
+    novo = dict(dados)
+    novo["id"] = id
+    ixs = _indexados(path)
+    valores = _para_linha(novo, cols, ixs)
+    sets = ", ".join(["extras = ?", *(f'"{c}" = ?' for c in cols), *(f'"_ix_{c}" = ?' for c in ixs)])
+    with con:
+        con.execute("BEGIN")
+        ok = con.execute(f'UPDATE "{tabela}" SET {sets} WHERE id = ?', [*valores[1:], id]).rowcount > 0
+        if ok: _tocar(con, tabela)
+    return ok
+
+def excluir(path: Path, id: str) -> bool:
+    con, tabela, _ = _preparar(path)
+    with con:
+        con.execute("BEGIN")
+        ok = con.execute(f'DELETE FROM "{tabela}" WHERE id = ?', (id,)).rowcount > 0
+        if ok: _tocar(con, tabela)
+    return ok
+
+# --- CONSULTAS POR ÍNDICE (mesma semântica de helpers/indices.py) ---
+
+def _como_tupla(valor) -> tuple:
+    return tuple(valor) if isinstance(valor, (list, tuple, set)) else (valor,)
+
+def _where(path: Path, criterios: dict, excluir: dict | None) -> tuple[str, list, dict]:
+    """Monta o WHERE com os campos indexados; o resto é conferido em Python."""
+    ixs = set(_indexados(path))
+    partes, params, restantes = [], [], {}
+    for negado, grupo in ((False, criterios), (True, excluir or {})):
+        for c, v in grupo.items():
+            valores = [colecoes.chave_indice(x) for x in _como_tupla(v)]
+            if c in ixs:
+                marcas = ", ".join("?" * len(valores))
+                partes.append(f'"_ix_{c}" {"NOT IN" if negado else "IN"} ({marcas})')
+                params.extend(valores)
+            else:
+                restantes[("!" if negado else "") + c] = set(valores)
+    return (" WHERE " + " AND ".join(partes)) if partes else "", params, restantes
+
+def _confere(item: dict, restantes: dict) -> bool:
+    for c, aceitos in restantes.items():
+        negado = c.startswith("!")
+        if (colecoes.chave_indice(item.get(c.lstrip("!"))) in aceitos) == negado:
+            return False
+    return True
+
+def filtrar(path: Path, criterios: dict, excluir: dict | None = None) -> list[dict]:
+    con, tabela, cols = _preparar(path)
+    where, params, restantes = _where(path, criterios, excluir)
+    linhas = (_para_dict(l, cols) for l in con.execute(_select(tabela, cols) + where + " ORDER BY seq", params))
+    return [it for it in linhas if _confere(it, restantes)] if restantes else list(linhas)
+
+def contar(path: Path, criterios: dict, excluir: dict | None = None) -> int:
+    con, tabela, _ = _preparar(path)
+    where, params, restantes = _where(path, criterios, excluir)
+    if restantes:
+        return len(filtrar(path, criterios, excluir))
+    return con.execute(f'SELECT COUNT(*) FROM "{tabela}"' + where, params).fetchone()[0]
+
+def contar_por(path: Path, campo: str, criterios: dict, excluir: dict | None = None) -> dict[str, int]:
+    con, tabela, _ = _preparar(path)
+    where, params, restantes = _where(path, criterios, excluir)
+    if restantes or campo not in _indexados(path):
+        contagem: dict[str, int] = {}
+        for r in filtrar(path, criterios, excluir):
+            chave = colecoes.chave_indice(r.get(campo))
+            contagem[chave] = contagem.get(chave, 0) + 1
+        return contagem
+    sql = f'SELECT "_ix_{campo}", COUNT(*) FROM "{tabela}"' + where + " GROUP BY 1"
+    return {v or "": n for v, n in con.execute(sql, params)}
+
+def _order_by(path: Path, cols: list[str], ordem: tuple[str, bool] | None) -> str:
+    if not ordem or ordem[0] not in cols:
+        return " ORDER BY seq"
+    campo, sentido = ordem[0], (" DESC" if ordem[1] else "")
+    expr = f'"_ix_{campo}"' if campo in _indexados(path) else f'chave("{campo}")'
+    return f" ORDER BY {expr}{sentido}, seq{sentido}"
+
+def pagina(path: Path, criterios: dict, excluir: dict | None = None, permitidos: set[str] | None = None,
+           ordem: tuple[str, bool] | None = None, offset: int = 0, limit: int = 50) -> tuple[list[dict], int]:
+    """Janela [offset, offset + limit) de filtrar() e o total, com LIMIT/OFFSET quando dá."""
+    con, tabela, cols = _preparar(path)
+    where, params, restantes = _where(path, criterios, excluir)
+    sql = _select(tabela, cols) + where + _order_by(path, cols, ordem)
+    if permitidos is None and not restantes:
+        total = con.execute(f'SELECT COUNT(*) FROM "{tabela}"' + where, params).fetchone()[0]
+        linhas = con.execute(sql + " LIMIT ? OFFSET ?", [*params, limit, offset])
+        return [_para_dict(l, cols) for l in linhas], total
+    # Busca textual ou campos sem índice: percorre o cursor e só converte o necessário
+    janela, total = [], 0
+    for l in con.execute(sql, params):
+        if permitidos is not None and l[1] not in permitidos:
+            continue
+        if restantes or offset <= total < offset + limit:
+            item = _para_dict(l, cols)
+            if restantes and not _confere(item, restantes):
+                continue
+            if offset <= total < offset + limit:
+                janela.append(item)
+        total += 1
+    return janela, total
+
+# --- MIGRAÇÃO JSON -> SQLITE ---
+
+def _iterar_json(path: Path, tamanho_bloco: int = 64 * 1024):
+    """Lê um arquivo com um array JSON item a item, sem carregar o arquivo inteiro."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf, pos, dentro = "", 0, False
+        while True:
+            bloco = f.read(tamanho_bloco)
+            buf = buf[pos:] + bloco
+            pos = 0
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if not dentro:
+                    if pos < len(buf) and buf[pos] == "[":
+                        dentro, pos = True, pos + 1
+                        continue
+                    break
+                if pos < len(buf) and buf[pos] == "]":
+                    return
+                try:
+                    item, fim = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    break  # item incompleto: precisa do próximo bloco
+                yield item
+                pos = fim
+            if not bloco:
+                return
+
+def migrar_de_json(pasta_dados: Path, substituir: bool = False,
+                   ignorar=("usuarios", "mapeamentos_importacao", "importacoes", "importacoes_arquivos")) -> dict[str, int]:
+    """
+    Copia os dados/*.json para o banco SQLite, em lotes, sem carregar cada arquivo inteiro.
+    Coleções que já têm linhas no banco são puladas (a não ser com substituir=True).
+    """
+    resultado = {}
+    for arquivo in sorted(Path(pasta_dados).glob("*.json")):
+        if arquivo.stem in ignorar or not _IDENT.match(arquivo.stem):
+            continue
+        con, tabela, cols = _preparar(arquivo)
+        ixs = _indexados(arquivo)
+        if not substituir and con.execute(f'SELECT 1 FROM "{tabela}" LIMIT 1').fetchone():
+            continue
+        total, lote = 0, []
+        with con:
+            con.execute("BEGIN")
+            if substituir:
+                con.execute(f'DELETE FROM "{tabela}"')
+            for item in _iterar_json(arquivo):
+                item["id"] = item.get("id") or str(uuid.uuid4())
+                lote.append(_para_linha(item, cols, ixs))
+                if len(lote) >= TAMANHO_LOTE:
+                    con.executemany(_insert(tabela, cols, ixs, "INSERT OR REPLACE"), lote)
+                    total += len(lote); lote = []
+            if lote:
+                con.executemany(_insert(tabela, cols, ixs, "INSERT OR REPLACE"), lote)
+                total += len(lote)
+            _tocar(con, tabela)
+        resultado[arquivo.stem] = total
+    return resultado
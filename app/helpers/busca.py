@@ -0,0 +1,177 @@
+from __future__ import annotations
+from pathlib import Path
+import itertools, threading
+
+from . import colecoes
+from .importador import _normalizar
+
+# --- ÍNDICE DE BUSCA POR TRIGRAMAS ---
+# Para cada coleção, cada campo declarado em colecoes.registrar(..., busca=...)
+# é normalizado (minúsculas, sem acentos) e quebrado em trigramas ("joa", "oao"...).
+# Guardamos {trigrama: {ids}}: uma busca pega os ids que têm todos os trigramas
+# do termo e só confere esses poucos candidatos. A comparação é campo a campo,
+# então "silva" não casa com o fim de um nome + começo de um e-mail. O texto é
+# indexado com um espaço na frente, então " si" só aparece em início de palavra
+# e serve para achar primeiro os resultados mais relevantes.
+# Assim como helpers/indices, o índice guarda a versão do armazenamento e é
+# atualizado a cada gravação feita pela fachada.
+
+ORCAMENTO = 2000  # candidatos conferidos por faixa de relevância em pontuar()
+
+class _IndiceBusca:
+    def __init__(self, versao, campos: tuple[str, ...]):
+        self.versao = versao
+        self.campos = campos
+        self.textos: dict[str, tuple[str, ...]] = {}
+        self.trigramas: dict[str, set[str]] = {}
+        self.exatos: dict[str, set[str]] = {}  # texto completo de um campo -> ids
+
+    def adicionar(self, item: dict) -> None:
+        id = item.get("id")
+        if not id:
+            return
+        if id in self.textos:
+            self.remover(id)
+        textos = tuple(_normalizar(_texto(item.get(c))) for c in self.campos)
+        self.textos[id] = textos
+        for tri in _trigramas_de(textos):
+            self.trigramas.setdefault(tri, set()).add(id)
+        for t in textos:
+            if t:
+                self.exatos.setdefault(t, set()).add(id)
+
+    def remover(self, id: str) -> None:
+        textos = self.textos.pop(id, None)
+        if textos is None:
+            return
+        for tri in _trigramas_de(textos):
+            ids = self.trigramas.get(tri)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self.trigramas[tri]
+        for t in textos:
+            ids = self.exatos.get(t)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self.exatos[t]
+
+def _texto(valor) -> str:
+    if isinstance(valor, list):
+        return " ".join(map(str, valor))
+    return "" if valor is None else str(valor)
+
+def _trigramas(texto: str) -> set[str]:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+def _trigramas_de(textos: tuple[str, ...]) -> set[str]:
+    tris = set()
+    for t in textos:
+        if t:
+            tris |= _trigramas(" " + t)
+    return tris
+
+_indices: dict[str, _IndiceBusca] = {}
+_trava = threading.RLock()
+
+def obter(path: Path, motor) -> _IndiceBusca:
+    chave = str(path)
+    versao = motor.versao(path)
+    with _trava:
+        idx = _indices.get(chave)
+        if idx is not None and idx.versao == versao:
+            return idx
+        idx = _IndiceBusca(versao, colecoes.obter(path)["busca"])
+        for item in motor.listar(path):
+            idx.adicionar(item)
+        _indices[chave] = idx
+        return idx
+
+def ao_gravar(path: Path, versao_antes, versao_depois, gravados=(), removidos=()) -> None:
+    with _trava:
+        idx = _indices.get(str(path))
+        if idx is None:
+            return
+        if idx.versao != versao_antes:
+            del _indices[str(path)]
+            return
+        for item in gravados:
+            idx.adicionar(item)
+        for id in removidos:
+            idx.remover(id)
+        idx.versao = versao_depois
+
+def descartar(path: Path) -> None:
+    with _trava:
+        _indices.pop(str(path), None)
+
+def _candidatos(idx: _IndiceBusca, termo: str, preguicoso: bool = False):
+    """
+    Ids que têm todos os trigramas do termo (ainda precisam ser conferidos).
+    Com preguicoso=True e conjuntos grandes devolve um gerador que percorre o menor
+    conjunto e testa os outros sob demanda, para quem só vai consumir os primeiros
+    candidatos (termos genéricos, em que quase todo registro casa).
+    """
+    tris = _trigramas(termo)
+    if not tris:
+        return idx.textos.keys()  # termo curto (< 3 letras): confere todos
+    conjuntos = []
+    for tri in tris:
+        ids = idx.trigramas.get(tri)
+        if not ids:
+            return ()
+        conjuntos.append(ids)
+    conjuntos.sort(key=len)
+    menor, outros = conjuntos[0], conjuntos[1:]
+    if preguicoso and len(menor) > 4 * ORCAMENTO:
+        return (i for i in menor if all(i in c for c in outros))
+    return menor.intersection(*outros)
+
+def ids(idx: _IndiceBusca, termo: str) -> set[str]:
+    """Ids dos registros em que algum campo de busca contém o termo."""
+    termo = _normalizar(termo)
+    if not termo:
+        return set(idx.textos)
+    return {id for id in _candidatos(idx, termo) if any(termo in t for t in idx.textos[id])}
+
+def _nota(texto: str, termo: str) -> int:
+    if texto == termo:
+        return 100
+    if texto.startswith(termo):
+        return 80
+    if f" {termo}" in texto or f".{termo}" in texto or f"@{termo}" in texto:
+        return 60
+    return 40 if termo in texto else 0
+
+def pontuar(idx: _IndiceBusca, termo: str, limite: int = 20) -> list[tuple[float, str]]:
+    """
+    Melhores (pontuação, id) para o termo. Campo igual ao termo vale mais que
+    começar com ele, que vale mais que uma palavra começando com ele, que vale
+    mais que só conter; campos declarados primeiro pesam um pouco mais.
+
+    As faixas são visitadas da mais relevante para a menos (iguais -> início de
+    palavra -> qualquer posição) e param quando já há `limite` resultados; em
+    cada faixa no máximo ORCAMENTO candidatos são conferidos, o que mantém termos
+    genéricos ("tracbel", presente em todo e-mail) rápidos.
+    """
+    termo = _normalizar(termo)
+    if not termo:
+        return []
+    notas: dict[str, float] = {}
+    faixas = (lambda: idx.exatos.get(termo, ()),
+              lambda: _candidatos(idx, " " + termo, preguicoso=True),
+              lambda: _candidatos(idx, termo, preguicoso=True))
+    for proxima in faixas:
+        faixa = proxima()
+        for id in itertools.islice((i for i in faixa if i not in notas), ORCAMENTO):
+            melhor = 0.0
+            for pos, texto in enumerate(idx.textos[id]):
+                nota = _nota(texto, termo)
+                if nota:
+                    melhor = max(melhor, nota - 2 * pos + 10 * len(termo) / len(texto))
+            if melhor:
+                notas[id] = melhor
+        if len(notas) >= limite:
+            break
+    return sorted(((n, i) for i, n in notas.items()), reverse=True)[:limite]
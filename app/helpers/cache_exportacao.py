@@ -0,0 +1,123 @@
+from __future__ import annotations
+from contextlib import suppress
+import hashlib, json, os, tempfile, threading, time
+from pathlib import Path
+from typing import BinaryIO
+
+# --- CACHE DE EXPORTAÇÕES ---
+# Cada exportação pronta (XLSX ou CSV) fica num arquivo da pasta de cache, com
+# nome "<coleção>-<chave><extensão>". A chave é o hash de (caminho da coleção,
+# versão do armazenamento, título, campos, formato e filtros normalizados) e é
+# também o ETag da resposta: repetir o download sem mudança nos dados devolve
+# o arquivo pronto ou 304. Qualquer gravação na coleção (repositorio, via
+# ao_gravar) apaga as exportações dela; gravações de outro processo mudam a
+# versão e, com ela, a chave. A pasta tem um tamanho máximo: ao passar dele,
+# saem primeiro os arquivos usados há mais tempo (o uso atualiza o mtime).
+PREFIXO_TEMPORARIO = ".tmp-"
+TEMPORARIO_ABANDONADO = 3600  # segundos; temporários mais velhos são lixo de downloads interrompidos
+
+_pasta: Path | None = None
+_limite_bytes = 0
+_trava = threading.Lock()
+
+def configurar(pasta: str | Path, limite_bytes: int) -> None:
+    """Pasta e tamanho máximo do cache (0 desliga)."""
+    global _pasta, _limite_bytes
+    _pasta = Path(pasta)
+    _limite_bytes = max(0, int(limite_bytes))
+    if _limite_bytes:
+        _pasta.mkdir(parents=True, exist_ok=True)
+
+def ativo() -> bool:
+    return _pasta is not None and _limite_bytes > 0
+
+def chave(path: Path, versao, *partes) -> str:
+    dados = json.dumps([str(path), versao, *partes], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(dados.encode("utf-8")).hexdigest()[:40]
+
+def _arquivo(colecao: str, chave: str, extensao: str) -> Path:
+    return _pasta / f"{colecao}-{chave}{extensao}"
+
+def obter(colecao: str, chave: str, extensao: str) -> BinaryIO | None:
+    """
+    Arquivo já exportado com essa chave, aberto para leitura (e marcado como usado
+    agora), ou None. Quem chama envia o arquivo aberto: se uma invalidação ou a poda
+    apagá-lo no meio tempo, o envio continua.
+    """
+    arquivo = _arquivo(colecao, chave, extensao)
+    try:
+        f = open(arquivo, "rb")
+    except FileNotFoundError:
+        return None
+    with suppress(FileNotFoundError):
+        os.utime(arquivo)
+    return f
+
+def temporario() -> Path:
+    """Arquivo temporário na pasta do cache (mesmo disco: publicar é só um rename)."""
+    fd, caminho = tempfile.mkstemp(prefix=PREFIXO_TEMPORARIO, dir=_pasta)
+    os.close(fd)
+    return Path(caminho)
+
+def publicar(tmp: Path, colecao: str, chave: str, extensao: str) -> Path:
+    """Move o temporário pronto para o cache e poda o que passou do limite."""
+    arquivo = _arquivo(colecao, chave, extensao)
+    os.replace(tmp, arquivo)
+    _podar()
+    return arquivo
+
+def gravar_enquanto_envia(pedacos, colecao: str, chave: str, extensao: str, atual):
+    """
+    Repassa os pedaços (bytes) de uma resposta em streaming e guarda uma cópia;
+    ao final, publica a cópia se `atual()` ainda for verdadeiro (os dados não mudaram
+    durante a exportação). Download interrompido ou com erro não deixa nada no cache.
+    """
+    tmp = temporario()
+    completo = False
+    try:
+        with open(tmp, "wb") as destino:
+            for pedaco in pedacos:
+                destino.write(pedaco)
+                yield pedaco
+        completo = True
+    finally:
+        if completo and atual():
+            publicar(tmp, colecao, chave, extensao)
+        else:
+            with suppress(OSError):
+                os.unlink(tmp)
+
+def invalidar(colecao: str) -> int:
+    """Apaga as exportações da coleção; devolve quantas eram."""
+    if not ativo():
+        return 0
+    n = 0
+    with _trava:
+        for arquivo in _pasta.glob(f"{colecao}-*"):
+            with suppress(OSError):
+                arquivo.unlink()
+                n += 1
+    return n
+
+def ao_gravar(path: Path, versao_antes, versao_depois, gravados=(), removidos=()) -> None:
+    invalidar(Path(path).stem)
+
+def _podar() -> None:
+    agora = time.time()
+    with _trava:
+        arquivos = []
+        for arquivo in _pasta.iterdir():
+            with suppress(OSError):
+                st = arquivo.stat()
+                if arquivo.name.startswith(PREFIXO_TEMPORARIO):
+                    if agora - st.st_mtime > TEMPORARIO_ABANDONADO:
+                        arquivo.unlink()
+                    continue
+                arquivos.append((st.st_mtime, st.st_size, arquivo))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, arquivo in sorted(arquivos, key=lambda a: a[0]):
+            if total <= _limite_bytes:
+                break
+            with suppress(OSError):
+                arquivo.unlink()
+                total -= tamanho
@@ -0,0 +1,48 @@
+from __future__ import annotations
+import hashlib, json, threading, time
+
+# --- CACHE COM VALIDADE (TTL) ---
+# Valores caros de calcular (ex.: os KPIs do painel) guardados por chave durante
+# `ttl` segundos, por processo. Quando o valor vence, só uma thread recalcula: as
+# outras continuam recebendo o valor anterior até o novo ficar pronto, em vez de
+# todas recalcularem juntas (ex.: todo mundo abrindo o portal às 8h). Só quem
+# chega sem valor nenhum (primeiro acesso) espera o cálculo em andamento.
+# Cada valor vem com um ETag (hash do JSON) para respostas condicionais.
+
+class _Entrada:
+    def __init__(self):
+        self.recalculo = threading.Lock()
+        self.dados: tuple | None = None  # (valor, etag, vence_em), trocado de uma vez
+
+    def valida(self) -> bool:
+        return self.dados is not None and self.dados[2] > time.monotonic()
+
+class CacheTTL:
+    def __init__(self, ttl: float = 30):
+        self.ttl = ttl
+        self._entradas: dict[str, _Entrada] = {}
+        self._trava = threading.Lock()
+
+    def obter(self, chave: str, calcular, ttl: float | None = None) -> tuple:
+        """(valor, etag) da chave; `calcular()` só roda se o valor venceu e ninguém já o está recalculando."""
+        with self._trava:
+            entrada = self._entradas.setdefault(chave, _Entrada())
+        if not entrada.valida():
+            # Sem valor: espera quem está calculando. Com valor vencido: se outro já recalcula, usa o antigo.
+            if entrada.recalculo.acquire(blocking=entrada.dados is None):
+                try:
+                    if not entrada.valida():
+                        valor = calcular()
+                        etag = hashlib.sha1(json.dumps(valor, sort_keys=True, default=str).encode()).hexdigest()
+                        entrada.dados = (valor, etag, time.monotonic() + (self.ttl if ttl is None else ttl))
+                finally:
+                    entrada.recalculo.release()
+        valor, etag, _ = entrada.dados
+        return valor, etag
+
+    def descartar(self, chave: str | None = None) -> None:
+        with self._trava:
+            if chave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(chave, None)
@@ -0,0 +1,36 @@
+from __future__ import annotations
+from pathlib import Path
+
+# Registro das coleções: cada blueprint declara aqui os seus CAMPOS, os campos
+# que merecem índice (filial, situacao, status...) e os campos usados na busca
+# textual (caixa "q" e /buscar) e, opcionalmente, a chave natural usada pela
+# importação em modo sincronizar (helpers/sincronizacao.py) e o campo com o nome
+# da filial, resolvido para `filial_id` a cada gravação (helpers/filiais.py).
+# Os motores de armazenamento usam esse registro para montar colunas/índices;
+# coleções não registradas continuam funcionando, só que sem colunas próprias.
+COLECOES: dict[str, dict] = {}
+
+def registrar(nome: str, campos: list[str], indices: tuple[str, ...] = (), busca: tuple[str, ...] = (),
+              chaves: tuple = (), filial: str = "") -> None:
+    """
+    `chaves` = chaves naturais, em ordem de preferência; cada uma é um campo ou uma
+    tupla de campos. Ex.: chaves=("email", "matricula"), chaves=(("nome", "data_saida"),).
+    `filial` = campo com o nome da filial; a coleção ganha o campo indexado `filial_id`.
+    """
+    chaves = tuple((c,) if isinstance(c, str) else tuple(c) for c in chaves)
+    indices = tuple(indices)
+    if filial and "filial_id" not in indices:
+        indices += ("filial_id",)
+    COLECOES[nome] = {"campos": list(campos), "indices": indices, "busca": tuple(busca), "chaves": chaves,
+                      "filial": filial}
+
+def nome_da_colecao(path: Path | str) -> str:
+    """O nome da coleção é o nome do arquivo sem extensão (ex.: dados/vpn.json -> vpn)."""
+    return Path(path).stem
+
+def obter(path: Path | str) -> dict:
+    return COLECOES.get(nome_da_colecao(path), {"campos": [], "indices": (), "busca": (), "chaves": (), "filial": ""})
+
+def chave_indice(valor) -> str:
+    """Forma normalizada usada nos índices (sem espaços nas pontas, maiúsculas)."""
+    return ("" if valor is None else str(valor)).strip().upper()
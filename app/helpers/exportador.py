@@ -1,24 +1,177 @@
 from __future__ import annotations
-from io import BytesIO
+import csv
+from io import BytesIO, StringIO
+from itertools import chain, islice
+from pathlib import Path
+import os
+import tempfile
+
+from flask import Response, request, send_file, stream_with_context
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 
-def gerar_xlsx(titulo: str, registros: list[dict], campos: list[tuple[str,str]]) -> BytesIO:
+from . import cache_exportacao, repositorio as repo
+
+# --- EXPORTAÇÃO XLSX ---
+# A planilha é montada em modo write_only: cada linha vai direto para o XML da
+# aba (nada de uma célula Python por valor) e o arquivo final é gravado num
+# temporário que fica em memória até EM_MEMORIA_ATE e depois vai para o disco.
+# A resposta lê esse arquivo aos pedaços; a memória não cresce com linhas × colunas.
+# As larguras das colunas saem do rótulo e das primeiras AMOSTRA_LARGURAS linhas.
+EM_MEMORIA_ATE = 8 * 1024 * 1024
+AMOSTRA_LARGURAS = 200
+LARGURA_MINIMA = 12
+LARGURA_MAXIMA = 60
+MIMETYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def _valor(valor):
+    # Se o valor for uma lista, converte para um texto separado por vírgulas
+    if isinstance(valor, list):
+        return ", ".join(map(str, valor))
+    return "" if valor is None else valor
+
+def _larguras(campos: list[tuple[str, str]], amostra: list[dict]) -> list[int]:
+    larguras = []
+    for rotulo, key in campos:
+        maior = max((len(str(_valor(r.get(key, "")))) for r in amostra), default=0)
+        larguras.append(min(LARGURA_MAXIMA, max(LARGURA_MINIMA, len(rotulo) + 2, maior + 2)))
+    return larguras
+
+def escrever_xlsx(destino, titulo: str, registros, campos: list[tuple[str, str]]) -> None:
+    """Grava em `destino` (arquivo binário) um XLSX com os registros (qualquer iterável)."""
+    registros = iter(registros)
+    amostra = list(islice(registros, AMOSTRA_LARGURAS))
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet((titulo or "Planilha")[:31])
+    for j, largura in enumerate(_larguras(campos, amostra), start=1):
+        ws.column_dimensions[get_column_letter(j)].width = largura
+    ws.append([rotulo for rotulo, _ in campos])
+    chaves = [key for _, key in campos]
+    for r in chain(amostra, registros):
+        ws.append([_valor(r.get(key, "")) for key in chaves])
+    wb.save(destino)
+
+def gerar_xlsx(titulo: str, registros, campos: list[tuple[str,str]]) -> BytesIO:
     """Gera um XLSX em memória a partir de registros."""
-    wb = Workbook(); ws = wb.active; ws.title = (titulo or "Planilha")[:31]
-    for j, (rotulo, _) in enumerate(campos, start=1):
-        ws.cell(row=1, column=j, value=rotulo)
-        ws.column_dimensions[get_column_letter(j)].width = max(12, len(rotulo) + 2)
-    
-    for i, r in enumerate(registros, start=2):
-        for j, (_, key) in enumerate(campos, start=1):
-            valor = r.get(key, "")
-            # --- INÍCIO DA CORREÇÃO ---
-            # Se o valor for uma lista, converte para um texto separado por vírgulas
-            if isinstance(valor, list):
-                valor = ", ".join(map(str, valor))
-            # --- FIM DA CORREÇÃO ---
-            ws.cell(row=i, column=j, value=valor)
-            
-    buf = BytesIO(); wb.save(buf); buf.seek(0)
+    buf = BytesIO()
+    escrever_xlsx(buf, titulo, registros, campos)
+    buf.seek(0)
     return buf
+
+def resposta_xlsx(titulo: str, registros, campos: list[tuple[str, str]], nome_arquivo: str):
+    """Resposta de download do XLSX, lida aos pedaços de um arquivo temporário."""
+    arquivo = tempfile.SpooledTemporaryFile(max_size=EM_MEMORIA_ATE, mode="w+b")
+    try:
+        escrever_xlsx(arquivo, titulo, registros, campos)
+    except Exception:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return send_file(arquivo, as_attachment=True, download_name=nome_arquivo, mimetype=MIMETYPE_XLSX)
+
+# --- EXPORTAÇÃO CSV ---
+# O CSV sai como resposta em streaming: um gerador que escreve LINHAS_POR_PEDACO
+# linhas num buffer de texto, entrega os bytes em UTF-8 e recomeça; o arquivo
+# nunca fica inteiro na memória. Começa com BOM para o Excel reconhecer o UTF-8 e,
+# por padrão, usa ";" (o separador do Excel em português); ?sep=, troca por vírgula.
+# As colunas e a junção de listas são as mesmas do XLSX.
+LINHAS_POR_PEDACO = 2000
+DELIMITADORES = (";", ",")
+MIMETYPE_CSV = "text/csv"  # o Werkzeug acrescenta "; charset=utf-8"
+
+def gerar_csv(registros, campos: list[tuple[str, str]], delimitador: str = ";"):
+    """Gerador de pedaços (bytes) de um CSV com os registros (qualquer iterável)."""
+    buf = StringIO()
+    escritor = csv.writer(buf, delimiter=delimitador, lineterminator="\r\n")
+    buf.write("\ufeff")
+    escritor.writerow([rotulo for rotulo, _ in campos])
+    chaves = [key for _, key in campos]
+    registros = iter(registros)
+    while True:
+        pedaco = list(islice(registros, LINHAS_POR_PEDACO))
+        escritor.writerows([_valor(r.get(key, "")) for key in chaves] for r in pedaco)
+        if buf.tell():
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+        if len(pedaco) < LINHAS_POR_PEDACO:
+            return
+
+def resposta_csv(registros, campos: list[tuple[str, str]], nome_arquivo: str, delimitador: str = ";") -> Response:
+    """Resposta de download do CSV, gerado aos pedaços enquanto é enviado."""
+    return Response(gerar_csv(registros, campos, delimitador), mimetype=MIMETYPE_CSV,
+                    headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'})
+
+# --- RESPOSTA DAS ROTAS DE EXPORTAÇÃO ---
+# As rotas passam os registros como função (ex.: partial(repo.filtrar, ...)): com o
+# arquivo já no cache (helpers/cache_exportacao) os dados nem são lidos, e um ETag
+# igual ao do navegador vira 304.
+
+def _cabecalhos_cache(resp, etag: str | None = None):
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    if etag:
+        resp.set_etag(etag)
+    return resp
+
+def _enviar_aberto(arquivo, download_name: str, mimetype: str, etag: str):
+    """send_file de um arquivo já aberto do cache, com o tamanho (que o send_file só sabe de caminhos)."""
+    resp = send_file(arquivo, as_attachment=True, download_name=download_name, mimetype=mimetype,
+                     etag=etag, conditional=True)
+    if resp.status_code == 200:
+        resp.content_length = os.fstat(arquivo.fileno()).st_size
+    return _cabecalhos_cache(resp)
+
+def resposta_exportacao(titulo: str, path: Path, registros, campos: list[tuple[str, str]],
+                        nome_base: str, filtros: dict | None = None):
+    """
+    XLSX (padrão) ou CSV (?formato=csv; ?sep= escolhe o separador) da coleção em `path`.
+    `registros` é uma função sem argumentos que devolve os registros já filtrados;
+    `filtros` são os filtros normalizados usados nela (entram na chave do cache).
+    """
+    em_csv = request.args.get("formato", "").lower() == "csv"
+    sep = request.args.get("sep", ";") if em_csv else ""
+    if em_csv and sep not in DELIMITADORES:
+        sep = ";"
+    extensao = ".csv" if em_csv else ".xlsx"
+    if not cache_exportacao.ativo():
+        if em_csv:
+            return resposta_csv(registros(), campos, nome_base + extensao, sep)
+        return resposta_xlsx(titulo, registros(), campos, nome_base + extensao)
+
+    mot = repo.motor()
+    versao = mot.versao(path)
+    filtros = {k: v for k, v in (filtros or {}).items() if v}
+    etag = cache_exportacao.chave(path, versao, titulo, campos, extensao, sep, filtros)
+    if request.if_none_match.contains(etag):
+        return _cabecalhos_cache(Response(status=304), etag)
+
+    colecao = Path(path).stem
+    mimetype = MIMETYPE_CSV if em_csv else MIMETYPE_XLSX
+    pronto = cache_exportacao.obter(colecao, etag, extensao)
+    if pronto is not None:
+        return _enviar_aberto(pronto, nome_base + extensao, mimetype, etag)
+
+    atual = lambda: mot.versao(path) == versao
+    if em_csv:
+        pedacos = cache_exportacao.gravar_enquanto_envia(gerar_csv(registros(), campos, sep),
+                                                         colecao, etag, extensao, atual)
+        resp = Response(stream_with_context(pedacos), mimetype=MIMETYPE_CSV,
+                        headers={"Content-Disposition": f'attachment; filename="{nome_base}{extensao}"'})
+        return _cabecalhos_cache(resp, etag)
+
+    tmp = cache_exportacao.temporario()
+    try:
+        with open(tmp, "wb") as destino:
+            escrever_xlsx(destino, titulo, registros(), campos)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+    if not atual():
+        # Os dados mudaram durante a exportação: envia o arquivo, mas sem guardar nem ETag
+        resp = send_file(tmp, as_attachment=True, download_name=nome_base + extensao, mimetype=mimetype)
+        resp.call_on_close(lambda: tmp.unlink(missing_ok=True))
+        return _cabecalhos_cache(resp)
+    arquivo = open(tmp, "rb")  # aberto antes de publicar: uma invalidação logo depois não atrapalha o envio
+    cache_exportacao.publicar(tmp, colecao, etag, extensao)
+    return _enviar_aberto(arquivo, nome_base + extensao, mimetype, etag)
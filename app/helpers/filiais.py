@@ -0,0 +1,186 @@
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+import threading
+
+from flask import current_app
+
+from . import colecoes, repositorio as repo
+from .padronizador import LIMITE_MEMO_FILIAIS, procurar_filial
+from ..constants import ALIASES_FILIAIS, FILIAIS
+
+# --- DIMENSÃO DE FILIAIS ---
+# Cada coleção escreve a filial do seu jeito ("Tracbel Agro Catanduva",
+# "02-Catanduva", "2"...). A tabela dados/filiais.json guarda a forma canônica
+# (codigo, nome, aliases) e, a cada gravação, o repositório resolve o campo de
+# filial da coleção (colecoes.registrar(..., filial="filial")) para `filial_id`,
+# que é indexado: filtrar ou contar por filial vira consulta de índice.
+# A tabela nasce de constants.FILIAIS / ALIASES_FILIAIS na subida da aplicação.
+# Depois de editar os aliases no arquivo (ou para dados gravados antes da tabela),
+# `flask --app run recalcular-filiais` acerta o filial_id de todos os registros;
+# a subida em si não reescreve nenhuma coleção. Enquanto uma coleção tiver
+# registros sem filial_id, criterio() e resumo() usam o campo de filial bruto
+# (também indexado), resolvendo cada texto distinto uma vez.
+ARQUIVO_FILIAIS = "filiais.json"
+SEM_FILIAL = ""  # filial_id de registros cuja filial não foi reconhecida
+
+colecoes.registrar("filiais", ["codigo", "nome", "aliases"], chaves=("codigo",))
+
+class _Dimensao:
+    def __init__(self, versao, filiais: list[dict]):
+        self.versao = versao
+        self.filiais = sorted(filiais, key=lambda f: f.get("codigo", ""))
+        self.nomes = [f["nome"] for f in self.filiais]
+        self.por_nome = {f["nome"]: f for f in self.filiais}
+        self.por_id = {f["id"]: f for f in self.filiais}
+        self.aliases = {a: f["nome"] for f in self.filiais for a in (f.get("aliases") or [])}
+
+        self.resolver = lru_cache(maxsize=LIMITE_MEMO_FILIAIS)(self._resolver)
+
+    def _resolver(self, texto) -> str:
+        nome = procurar_filial(str(texto or ""), self.nomes, self.aliases)
+        return self.por_nome[nome]["id"] if nome else SEM_FILIAL
+
+_dimensoes: dict[str, _Dimensao] = {}
+_trava = threading.Lock()
+
+def caminho(pasta: str | Path | None = None) -> Path:
+    return Path(pasta or current_app.config["DIRETORIO_DADOS"]) / ARQUIVO_FILIAIS
+
+def _codigo(nome: str) -> str:
+    return nome.split("-", 1)[0].strip() if "-" in nome else nome
+
+def _padrao() -> list[dict]:
+    filiais = []
+    for nome in FILIAIS:
+        aliases = sorted(a for a, f in ALIASES_FILIAIS.items() if f == nome)
+        filiais.append({"id": _codigo(nome), "codigo": _codigo(nome), "nome": nome, "aliases": aliases})
+    return filiais
+
+def dimensao(pasta: str | Path | None = None) -> _Dimensao:
+    """A tabela de filiais, relida só quando o armazenamento muda."""
+    path = caminho(pasta)
+    versao = repo.motor().versao(path)
+    dim = _dimensoes.get(str(path))
+    if dim is None or dim.versao != versao:
+        with _trava:
+            dim = _dimensoes[str(path)] = _Dimensao(versao, repo.listar(path))
+    return dim
+
+def listar(pasta: str | Path | None = None) -> list[dict]:
+    return dimensao(pasta).filiais
+
+def obter(filial_id: str) -> dict | None:
+    return dimensao().por_id.get(filial_id)
+
+def resolver(texto, pasta: str | Path | None = None) -> str:
+    """filial_id do texto (nome, código, alias...) ou SEM_FILIAL."""
+    return dimensao(pasta).resolver(texto)
+
+def _sem_filial_id(path: Path, campo: str) -> bool:
+    """True se a coleção tem registros gravados sem filial_id (antes de recalcular-filiais)."""
+    vazios = repo.contar_por(path, "filial_id").get(SEM_FILIAL, 0)
+    if not vazios:
+        return False
+    dim = dimensao(Path(path).parent)
+    nao_reconhecidos = sum(n for texto, n in repo.contar_por(path, campo).items() if not dim.resolver(texto))
+    return vazios > nao_reconhecidos
+
+def criterio(texto: str, path: Path) -> dict:
+    """
+    Critério para ?filial= na listagem de `path`: pelo filial_id quando o texto é uma filial
+    conhecida (ou pelos textos de filial que resolvem para ela, se há registros sem filial_id).
+    """
+    if not texto:
+        return {}
+    dim = dimensao(Path(path).parent)
+    filial_id = dim.resolver(texto)
+    campo = colecoes.obter(path).get("filial") or "filial"
+    if not filial_id:
+        return {campo: texto}
+    if not _sem_filial_id(path, campo):
+        return {"filial_id": filial_id}
+    textos = tuple(t for t in repo.contar_por(path, campo) if dim.resolver(t) == filial_id)
+    return {campo: textos or texto}
+
+def preparar_gravacao(path: Path):
+    """
+    Função item -> item com `filial_id` para as gravações da coleção em `path`
+    (None se a coleção não tem campo de filial). A dimensão é lida uma vez por gravação.
+    """
+    campo = colecoes.obter(path).get("filial")
+    if not campo:
+        return None
+    dim = dimensao(Path(path).parent)
+
+    def _preparar(item: dict) -> dict:
+        if campo not in item:
+            return item  # atualização parcial: o filial_id gravado continua valendo
+        return {**item, "filial_id": dim.resolver(item.get(campo))}
+    return _preparar
+
+def iniciar(pasta: str | Path | None = None) -> None:
+    """Cria a tabela de filiais, se ainda não existe."""
+    pasta = Path(pasta or current_app.config["DIRETORIO_DADOS"])
+    if not repo.listar(caminho(pasta)):
+        repo.gravar_lote(caminho(pasta), _padrao())
+
+def recalcular(pasta: str | Path | None = None) -> dict[str, int]:
+    """
+    Acerta o filial_id dos registros gravados antes da tabela de filiais ou com aliases
+    antigos. Devolve {coleção: registros corrigidos}.
+    """
+    pasta = Path(pasta or current_app.config["DIRETORIO_DADOS"])
+    iniciar(pasta)
+    dim = dimensao(pasta)
+    corrigidos = {}
+    for nome, info in list(colecoes.COLECOES.items()):
+        campo = info.get("filial")
+        if not campo:
+            continue
+        path = pasta / f"{nome}.json"
+        mudou = [{**item, "filial_id": novo} for item in repo.listar(path)
+                 if item.get("id") and item.get("filial_id") != (novo := dim.resolver(item.get(campo)))]
+        if mudou:
+            repo.gravar_lote(path, mudou)
+            corrigidos[nome] = len(mudou)
+    return corrigidos
+
+# --- RESUMO POR FILIAL ---
+# Contagens por filial_id de cada coleção, guardadas junto com as versões das
+# coleções usadas: só são recalculadas (por contar_por, no índice) depois que
+# alguma delas é gravada.
+INDICADORES = [
+    # (chave, rótulo, arquivo, critérios, excluir, rota da listagem)
+    ("equipamentos", "Equipamentos", "equipamentos.json", {}, None, "equipamentos.listar"),
+    ("licencas_ativas", "Licenças ativas", "licencas.json", {}, {"situacao": "INATIVO"}, "licencas.listar"),
+    ("cameras", "Câmeras", "cameras.json", {}, None, "cameras.listar"),
+    ("impressoras", "Impressoras", "impressoras.json", {}, None, "impressoras.listar"),
+    ("vpn_pendentes", "VPNs pendentes", "vpn.json", {"status": ("PENDENTE", "AGUARDANDO", "")}, None, "vpn.listar"),
+]
+
+_resumos: dict[str, tuple] = {}
+
+def resumo(pasta: str | Path | None = None) -> dict[str, dict[str, int]]:
+    """{filial_id: {indicador: quantidade}} (SEM_FILIAL = registros com filial não reconhecida)."""
+    pasta = Path(pasta or current_app.config["DIRETORIO_DADOS"])
+    mot = repo.motor()
+    versoes = tuple(mot.versao(pasta / arquivo) for _, _, arquivo, _, _, _ in INDICADORES)
+    guardado = _resumos.get(str(pasta))
+    if guardado and guardado[0] == versoes:
+        return guardado[1]
+    zerado = {i[0]: 0 for i in INDICADORES}
+    por_filial: dict[str, dict[str, int]] = {}
+    dim = dimensao(pasta)
+    for chave, _, arquivo, criterios, excluir, _ in INDICADORES:
+        path = pasta / arquivo
+        campo = colecoes.obter(path).get("filial") or "filial"
+        if _sem_filial_id(path, campo):
+            for texto, n in repo.contar_por(path, campo, excluir=excluir, **criterios).items():
+                linha = por_filial.setdefault(dim.resolver(texto), dict(zerado))
+                linha[chave] += n
+        else:
+            for filial_id, n in repo.contar_por(path, "filial_id", excluir=excluir, **criterios).items():
+                por_filial.setdefault(filial_id, dict(zerado))[chave] = n
+    _resumos[str(pasta)] = (versoes, por_filial)
+    return por_filial
@@ -0,0 +1,404 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+import multiprocessing, os, threading, time, uuid
+
+from flask import current_app, jsonify, request
+
+from . import armazenamento_json, colecoes, uploads
+from .importador import abas_da_planilha, confirmar_mapeamento, iterar_registros, ler_aba, previa_importacao, LINHAS_PREVIA
+
+# --- IMPORTAÇÕES EM SEGUNDO PLANO ---
+# O importar_post de cada blueprint só guarda o arquivo enviado e registra um
+# "job"; quem lê a planilha e grava é um pool de threads (IMPORTACAO_WORKERS).
+# Jobs de coleções diferentes rodam em paralelo; na mesma coleção, um de cada vez.
+# O `gravar(registros, job)` que o blueprint passa ao enviar (o _gravar de cada
+# um) roda nessa thread, com contexto de aplicação, e recebe sob demanda as
+# linhas de todas as planilhas/abas do envio; a tela de importação do blueprint
+# (com ?job=<id>) acompanha o progresso.
+# A tabela de jobs fica em memória e é copiada para dados/importacoes.json nas
+# mudanças de estado (e no máximo a cada INTERVALO_GRAVACAO durante o progresso),
+# para que /importacoes/<job_id> funcione mesmo atendido por outro processo.
+# Com IMPORTACAO_EM_SEGUNDO_PLANO = False o job roda na própria requisição.
+# Cada importação concluída fica registrada em dados/importacoes_arquivos.json pelo
+# SHA-256 do arquivo (calculado durante o upload, ver helpers/uploads): enviar o
+# mesmo arquivo de novo para a mesma coleção não reprocessa nada, a menos que o
+# formulário peça (campo "reimportar").
+ARQUIVO_JOBS = "importacoes.json"
+ARQUIVO_REGISTRO = "importacoes_arquivos.json"
+INTERVALO_GRAVACAO = 1.0  # segundos entre gravações de progresso
+MANTER_JOBS = 200         # jobs mais antigos que isso saem da tabela
+MANTER_REGISTROS = 1000   # arquivos lembrados no registro de importações
+
+_jobs: dict[str, "Job"] = {}
+_travas_colecao: dict[str, threading.Lock] = {}
+_trava = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_processos: ProcessPoolExecutor | None = None
+
+class Job:
+    def __init__(self, colecao: str, arquivo: str, pasta: str, destino: str = "", modo: str = "adicionar"):
+        self.id = uuid.uuid4().hex
+        self.colecao = colecao
+        self.arquivo = arquivo
+        self.destino = destino  # tela para onde o usuário vai ao terminar
+        self.modo = modo          # adicionar | sincronizar (ver helpers/sincronizacao)
+        self.estado = "na_fila"   # na_fila -> processando -> concluido | erro
+        self.lidos = 0
+        self.gravados = 0
+        self.ignorados = 0
+        self.atualizados = 0      # só no modo sincronizar
+        self.inalterados = 0
+        self.ausentes = 0
+        self.mensagem = ""
+        self.sha256 = ""
+        self.tamanho = 0
+        self.duplicado_de = ""    # job que já tinha importado este mesmo arquivo
+        self.planilhas: list[dict] = []  # importação em lote: uma entrada por arquivo/aba lida
+        self.criado_em = datetime.now().isoformat(timespec="seconds")
+        self.concluido_em = ""
+        self._pasta = pasta
+        self._gravado_em = 0.0
+        self._planilha: dict | None = None  # entrada de `planilhas` sendo gravada agora
+
+    def como_dict(self) -> dict:
+        return {k: v for k, v in vars(self).items() if not k.startswith("_")}
+
+    def contar(self, registros):
+        """Repassa os registros contando as linhas lidas (o progresso que a tela mostra)."""
+        for item in registros:
+            self.lidos += 1
+            if self.lidos % 500 == 0:
+                self._salvar()
+            yield item
+
+    def validar(self, funcao=None):
+        """Envolve o `validar` do criar_lote contando as linhas recusadas."""
+        def _validar(item) -> bool:
+            if funcao is None or funcao(item):
+                return True
+            self.ignorados += 1
+            if self._planilha is not None:
+                self._planilha["ignorados"] += 1
+            return False
+        return _validar
+
+    def _salvar(self, forcar: bool = False) -> None:
+        agora = time.monotonic()
+        if not forcar and agora - self._gravado_em < INTERVALO_GRAVACAO:
+            return
+        self._gravado_em = agora
+        try:
+            arquivo = _arquivo_jobs(self._pasta)
+            if not armazenamento_json.atualizar(arquivo, self.id, self.como_dict()):
+                armazenamento_json.criar(arquivo, self.como_dict())
+        except OSError:
+            pass  # a tabela em disco é só um espelho; o job continua
+
+def _arquivo_jobs(pasta: str | Path) -> Path:
+    return Path(pasta) / ARQUIVO_JOBS
+
+def _arquivo_registro(pasta: str | Path) -> Path:
+    return Path(pasta) / ARQUIVO_REGISTRO
+
+def _id_registro(colecao: str, sha256: str) -> str:
+    return f"{colecao}-{sha256}"
+
+def _ja_importado(job: Job, sha256: str | None = None) -> dict | None:
+    return armazenamento_json.obter_por_id(_arquivo_registro(job._pasta), _id_registro(job.colecao, sha256 or job.sha256))
+
+def _registrar(job: Job, sha256: str | None = None, nome: str | None = None, tamanho: int | None = None) -> None:
+    """Lembra o arquivo importado pelo job (no lote, cada arquivo é registrado à parte)."""
+    arquivo = _arquivo_registro(job._pasta)
+    sha256 = sha256 or job.sha256
+    item = {"id": _id_registro(job.colecao, sha256), "colecao": job.colecao, "sha256": sha256,
+            "arquivo": nome or job.arquivo, "tamanho": job.tamanho if tamanho is None else tamanho,
+            "job": job.id, "modo": job.modo, "mensagem": job.mensagem, "importado_em": job.concluido_em}
+    if not armazenamento_json.atualizar(arquivo, item["id"], item):
+        armazenamento_json.criar(arquivo, item)
+        for antigo in armazenamento_json.listar(arquivo)[:-MANTER_REGISTROS]:
+            armazenamento_json.excluir(arquivo, antigo["id"])
+
+def _pular_duplicado(job: Job, anterior: dict) -> None:
+    job.estado = "concluido"
+    job.duplicado_de = anterior.get("job", "")
+    job.mensagem = (f"Este arquivo já foi importado em {anterior.get('importado_em', '')} "
+                    f"({anterior.get('arquivo', '')}): nada foi gravado. "
+                    "Marque \"importar mesmo assim\" para repetir a importação.")
+    job.concluido_em = datetime.now().isoformat(timespec="seconds")
+
+def _pool(app) -> ThreadPoolExecutor:
+    global _executor
+    with _trava:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get("IMPORTACAO_WORKERS", 2),
+                                           thread_name_prefix="importacao")
+        return _executor
+
+def _pool_processos(processos: int) -> ProcessPoolExecutor:
+    # "spawn": o processo da aplicação tem threads (pool de importação, servidor), e fork com threads pode travar
+    global _processos
+    with _trava:
+        if _processos is None:
+            _processos = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn"))
+        return _processos
+
+def _descartar_pool_processos() -> None:
+    """Um processo do pool morreu (ex.: falta de memória): o próximo lote cria outro pool."""
+    global _processos
+    with _trava:
+        pool, _processos = _processos, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _trava_da_colecao(colecao: str) -> threading.Lock:
+    with _trava:
+        return _travas_colecao.setdefault(colecao, threading.Lock())
+
+def _podar(pasta: str) -> None:
+    with _trava:
+        antigos = sorted(_jobs.values(), key=lambda j: j.criado_em)[:-MANTER_JOBS]
+        for job in antigos:
+            _jobs.pop(job.id, None)
+    arquivo = _arquivo_jobs(pasta)
+    lista = armazenamento_json.listar(arquivo)
+    for item in lista[:-MANTER_JOBS]:
+        armazenamento_json.excluir(arquivo, item["id"])
+
+def _executar(app, job: Job, arquivo: uploads.ArquivoRecebido, mapa_sistema: dict[str, list[str]],
+              gravar, reimportar: bool) -> None:
+    with app.app_context(), _trava_da_colecao(job.colecao):
+        anterior = None if reimportar else _ja_importado(job)
+        if anterior:  # o mesmo arquivo terminou de ser importado enquanto este esperava na fila
+            _pular_duplicado(job, anterior)
+            job._salvar(forcar=True)
+            arquivo.fechar()
+            return
+        job.estado = "processando"
+        job._salvar(forcar=True)
+        try:
+            _concluir(job, gravar(job.contar(iterar_registros(arquivo, job.arquivo, mapa_sistema)), job))
+        except Exception as e:
+            job.estado = "erro"
+            job.mensagem = f"Falha na importação: {e}"
+        finally:
+            job.concluido_em = datetime.now().isoformat(timespec="seconds")
+            job._salvar(forcar=True)
+            arquivo.fechar()
+        if job.estado == "concluido":
+            _registrar(job)
+
+def _concluir(job: Job, res: dict) -> None:
+    """Copia para o job o resultado do criar_lote / sincronizar e monta a mensagem final."""
+    job.ignorados = res.get("ignorados", job.ignorados)
+    job.estado = "concluido"
+    if "atualizados" in res:
+        job.atualizados, job.inalterados, job.ausentes = res["atualizados"], res["inalterados"], res["ausentes"]
+        job.gravados = res["inseridos"] + res["atualizados"]
+        job.mensagem = (f"Sincronização concluída: {res['inseridos']} registros inseridos, "
+                        f"{job.atualizados} atualizados, {job.inalterados} sem alteração, "
+                        f"{job.ignorados} ignorados. {job.ausentes} registros não estavam na planilha")
+        job.mensagem += f" ({res['marcados']} marcados como inativos)." if res.get("marcados") else "."
+    else:
+        job.gravados = res.get("inseridos", 0)
+        job.mensagem = (f"Importação concluída: {job.gravados} registros inseridos, "
+                        f"{job.ignorados} ignorados.")
+
+def enviar(colecao: str, arqs: list, mapa_sistema: dict[str, list[str]], gravar,
+           destino: str = "", modo: str = "adicionar") -> Job:
+    """
+    Fica com os uploads (`arqs` = [FileStorage]) e agenda a importação: as linhas lidas
+    com `mapa_sistema` passam por gravar(registros, job) -> resultado do criar_lote
+    (ou do sincronizacao.sincronizar, com modo="sincronizar").
+    Vários arquivos, ou o formulário com "todas_abas", vão para a importação em lote.
+    Se o mesmo arquivo já foi importado nesta coleção o job já nasce concluído,
+    sem ler nada (a não ser que o formulário traga "reimportar").
+    """
+    if len(arqs) > 1 or request.form.get("todas_abas"):
+        return _enviar_lote(colecao, arqs, mapa_sistema, gravar, destino, modo)
+    arq = arqs[0]
+    app = current_app._get_current_object()
+    pasta = app.config["DIRETORIO_DADOS"]
+    arquivo = uploads.receber(arq)
+    reimportar = bool(request.form.get("reimportar"))
+    job = Job(colecao, arq.filename, pasta, destino, modo)
+    job.sha256, job.tamanho = arquivo.sha256, arquivo.tamanho
+    with _trava:
+        _jobs[job.id] = job
+    anterior = None if reimportar else _ja_importado(job)
+    if anterior:
+        _pular_duplicado(job, anterior)
+        arquivo.fechar()
+    job._salvar(forcar=True)
+    _podar(pasta)
+    if anterior:
+        return job
+    if app.config.get("IMPORTACAO_EM_SEGUNDO_PLANO", True):
+        _pool(app).submit(_executar, app, job, arquivo, mapa_sistema, gravar, reimportar)
+    else:
+        _executar(app, job, arquivo, mapa_sistema, gravar, reimportar)
+    return job
+
+# --- IMPORTAÇÃO EM LOTE ---
+# As filiais mandam uma planilha cada, ou uma planilha com uma aba por filial.
+# Com vários arquivos (ou "todas_abas" no formulário) o enviar lê TODAS as abas de cada um:
+# cada arquivo/aba é lido (cabeçalhos + mapeamento + linhas) num processo do pool
+# (IMPORTACAO_PROCESSOS; 0 ou 1 = na própria thread do job), com no máximo
+# IMPORTACAO_PROCESSOS abas lidas em memória por vez, e os registros de todos vão
+# para a coleção numa única gravação, na ordem em que os arquivos foram enviados. O job traz em `planilhas` o resultado de cada arquivo/aba.
+# Arquivos já importados nesta coleção são pulados um a um (salvo "reimportar").
+
+def _ler_lote(app, job: Job, arquivos: list[tuple[str, str]], mapa_sistema: dict[str, list[str]]):
+    """Gera os registros de todas as abas de `arquivos` ([(nome, caminho no disco)])."""
+    processos = app.config.get("IMPORTACAO_PROCESSOS", 0)
+    pool = _pool_processos(processos) if processos > 1 else None
+    pendentes = deque()
+    for nome, caminho in arquivos:
+        try:
+            with open(caminho, "rb") as f:
+                abas = abas_da_planilha(f, nome)
+        except Exception as e:  # arquivo corrompido ou formato não suportado: os demais seguem
+            job.planilhas.append({"arquivo": nome, "aba": "", "colunas": [], "lidos": 0, "ignorados": 0, "erro": str(e)})
+            continue
+        for aba in abas:
+            entrada = {"arquivo": nome, "aba": aba or "", "colunas": [], "lidos": 0, "ignorados": 0, "erro": ""}
+            pendentes.append((entrada, (caminho, nome, aba, mapa_sistema, job._pasta)))
+
+    # Cada aba lida vem inteira do processo; para a memória não crescer com o número
+    # de abas, só `processos` delas ficam no pool (ou prontas) ao mesmo tempo: a
+    # próxima é enviada depois que a anterior foi toda consumida pela gravação.
+    em_leitura = deque()
+    def enviar_proximas():
+        while pendentes and len(em_leitura) < max(processos, 1):
+            entrada, args = pendentes.popleft()
+            em_leitura.append((entrada, pool.submit(ler_aba, *args) if pool else args))
+    try:
+        enviar_proximas()
+        while em_leitura:
+            entrada, tarefa = em_leitura.popleft()
+            job.planilhas.append(entrada)
+            try:
+                lido = tarefa.result() if pool else ler_aba(*tarefa)
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                entrada["erro"] = str(e)
+                enviar_proximas()
+                continue
+            del tarefa  # o Future também guarda o resultado
+            entrada["colunas"], entrada["lidos"] = lido["colunas"], len(lido["registros"])
+            if not lido["colunas"]:
+                entrada["erro"] = "Nenhuma coluna reconhecida."
+            job._planilha = entrada
+            yield from lido["registros"]
+            job._planilha = None
+            del lido
+            enviar_proximas()
+    finally:
+        if pool:  # gravação interrompida: as abas que nem começaram não precisam ser lidas
+            for _, tarefa in em_leitura:
+                tarefa.cancel()
+
+def _executar_lote(app, job: Job, arquivos: list[tuple[str, uploads.ArquivoRecebido]],
+                   mapa_sistema: dict[str, list[str]], gravar, reimportar: bool) -> None:
+    caminhos: list[str] = []
+    lidos: list[tuple[str, uploads.ArquivoRecebido]] = []
+    with app.app_context(), _trava_da_colecao(job.colecao):
+        job.estado = "processando"
+        job._salvar(forcar=True)
+        try:
+            ler = []
+            for nome, arquivo in arquivos:
+                anterior = None if reimportar else _ja_importado(job, arquivo.sha256)
+                if anterior:
+                    job.planilhas.append({"arquivo": nome, "aba": "", "colunas": [], "lidos": 0, "ignorados": 0,
+                                          "erro": "", "duplicado_de": anterior.get("job", "")})
+                    continue
+                caminhos.append(uploads.copiar_para_disco(arquivo, Path(nome).suffix))
+                ler.append((nome, caminhos[-1]))
+                lidos.append((nome, arquivo))
+            _concluir(job, gravar(job.contar(_ler_lote(app, job, ler, mapa_sistema)), job))
+            if lidos:
+                abas = sum(1 for p in job.planilhas if p["lidos"])
+                job.mensagem += f" {abas} aba(s) de {len(lidos)} arquivo(s) lidas."
+            if len(lidos) < len(arquivos):
+                job.mensagem += f" {len(arquivos) - len(lidos)} arquivo(s) já importado(s) antes foram pulados."
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                _descartar_pool_processos()
+            job.estado = "erro"
+            job.mensagem = f"Falha na importação: {e}"
+        finally:
+            job.concluido_em = datetime.now().isoformat(timespec="seconds")
+            job._salvar(forcar=True)
+            for caminho in caminhos:
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    pass
+            for _, arquivo in arquivos:
+                arquivo.fechar()
+        if job.estado == "concluido":
+            for nome, arquivo in lidos:
+                _registrar(job, arquivo.sha256, nome, arquivo.tamanho)
+
+def _enviar_lote(colecao: str, arqs: list, mapa_sistema: dict[str, list[str]], gravar,
+                 destino: str, modo: str) -> Job:
+    """O enviar de vários arquivos: gravar recebe as linhas de todos eles juntas."""
+    app = current_app._get_current_object()
+    pasta = app.config["DIRETORIO_DADOS"]
+    arquivos = [(arq.filename, uploads.receber(arq)) for arq in arqs]
+    reimportar = bool(request.form.get("reimportar"))
+    nome = arquivos[0][0] if len(arquivos) == 1 else f"{len(arquivos)} arquivos"
+    job = Job(colecao, nome, pasta, destino, modo)
+    job.tamanho = sum(arquivo.tamanho for _, arquivo in arquivos)
+    with _trava:
+        _jobs[job.id] = job
+    job._salvar(forcar=True)
+    _podar(pasta)
+    if app.config.get("IMPORTACAO_EM_SEGUNDO_PLANO", True):
+        _pool(app).submit(_executar_lote, app, job, arquivos, mapa_sistema, gravar, reimportar)
+    else:
+        _executar_lote(app, job, arquivos, mapa_sistema, gravar, reimportar)
+    return job
+
+def obter(job_id: str) -> dict | None:
+    """Estado do job: primeiro o da memória (deste processo), senão o espelho em disco."""
+    with _trava:
+        job = _jobs.get(job_id)
+    if job is not None:
+        return job.como_dict()
+    return armazenamento_json.obter_por_id(_arquivo_jobs(current_app.config["DIRETORIO_DADOS"]), job_id)
+
+# --- PRÉVIA E MAPEAMENTO ---
+# Usados pelas rotas <blueprint>/importar/previa e <blueprint>/importar/mapeamento:
+# a tela de importação mostra como a planilha vai ser lida antes de enviar de verdade
+# e permite gravar o mapeamento de colunas corrigido pelo operador.
+
+def previa(colecao: str, mapa_sistema: dict[str, list[str]], obrigatorios: tuple[str, ...] = ()):
+    """Resposta JSON com cabeçalhos, amostra e avisos do arquivo enviado (nada é gravado)."""
+    arq = request.files.get("arquivo")
+    if not arq or not arq.filename:
+        return jsonify({"erro": "Nenhum arquivo enviado."}), 400
+    try:
+        linhas = int(request.form.get("linhas", LINHAS_PREVIA))
+    except ValueError:
+        linhas = LINHAS_PREVIA
+    try:
+        resultado = previa_importacao(arq.stream, arq.filename, mapa_sistema, linhas,
+                                      obrigatorios, colecoes.COLECOES.get(colecao, {}).get("chaves", ()))
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    return jsonify({"arquivo": arq.filename, **resultado})
+
+def lembrar_mapeamento(mapa_sistema: dict[str, list[str]]):
+    """Grava {cabeçalho: campo} vindo da prévia para as próximas planilhas com o mesmo layout."""
+    dados = request.get_json(silent=True) or {}
+    cabecalhos, mapa = dados.get("cabecalhos"), dados.get("mapa")
+    if not isinstance(cabecalhos, list) or not isinstance(mapa, dict):
+        return jsonify({"erro": "Envie 'cabecalhos' (lista) e 'mapa' ({cabeçalho: campo})."}), 400
+    confirmar_mapeamento([str(c) for c in cabecalhos], mapa_sistema, mapa)
+    return jsonify({"ok": True})
@@ -1,133 +1,424 @@
 from __future__ import annotations
+import codecs
 import csv
+import hashlib
 import io
+import itertools
+import json
+import threading
 import unicodedata
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Iterator
+from xml.etree import ElementTree
+from flask import current_app, has_app_context
 from openpyxl import load_workbook
-from thefuzz import process
+from thefuzz import process, utils as fz_utils
+
+try:  # o thefuzz usa o rapidfuzz por baixo; com ele (e o numpy do cdist) a pontuação sai numa matriz só
+    import numpy  # noqa: F401 - rapidfuzz.process.cdist devolve um numpy.ndarray
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+except ImportError:  # pragma: no cover - thefuzz antigo (python-Levenshtein) ou sem numpy
+    rf_process = None
+
+from . import armazenamento_json
 
 # --- FUNÇÕES AUXILIARES ---
 
 def _normalizar(s: str) -> str:
     """Limpa e padroniza uma string para comparação de similaridade."""
     s = (s or "").strip().lower()
+    if s.isascii():
+        return s  # nada para decompor: caminho rápido
     return "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
 
-def _ler_planilha(bytes_data: bytes, filename: str) -> tuple[list[str], list[dict]]:
-    """Lê um arquivo CSV ou XLSX e retorna os cabeçalhos e as linhas de dados."""
-    ext = (filename or "").split(".")[-1].lower()
-    header_original = []
-    linhas_com_cabecalho_original = []
+def _como_arquivo(fonte: bytes | BinaryIO) -> BinaryIO:
+    """Aceita os bytes do upload ou um arquivo binário já aberto (ex.: FileStorage.stream)."""
+    return io.BytesIO(fonte) if isinstance(fonte, (bytes, bytearray)) else fonte
 
-    if ext in ("csv", "txt"):
-        data = bytes_data.decode("utf-8", errors="ignore")
+# CSV: codificação e separador são descobertos numa amostra do começo do arquivo
+# (AMOSTRA_CSV bytes) e o resto é decodificado aos poucos pelo TextIOWrapper.
+# As exportações do Excel daqui vêm em UTF-8, UTF-8 com BOM ou cp1252. Um byte
+# inválido em UTF-8 depois da amostra (ex.: um "é" em cp1252 no fim de um arquivo
+# com o começo todo em ASCII) faz a leitura recomeçar em cp1252 a partir da linha
+# em que parou; nenhum byte é descartado.
+AMOSTRA_CSV = 64 * 1024
+LINHAS_AMOSTRA_CSV = 20
+DELIMITADORES_CSV = ";,\t|"
+
+def _codificacao_csv(amostra: bytes) -> str:
+    if amostra.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # final=False: a amostra pode terminar no meio de um caractere
+        codecs.getincrementaldecoder("utf-8")().decode(amostra, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+def _dialeto_csv(texto: str):
+    linhas = texto.splitlines()[:LINHAS_AMOSTRA_CSV]
+    try:
+        return csv.Sniffer().sniff("\n".join(linhas), delimiters=DELIMITADORES_CSV)
+    except csv.Error:
+        pass
+    # Sniffer indeciso (ex.: só o cabeçalho): fica com o separador mais frequente nele
+    cabecalho = linhas[0] if linhas else ""
+    delimitador = max(DELIMITADORES_CSV, key=cabecalho.count)
+    if not cabecalho.count(delimitador):
+        return "excel"
+    class _Dialeto(csv.excel):
+        delimiter = delimitador
+    return _Dialeto
+
+def _erro_codificacao(e: UnicodeDecodeError) -> ValueError:
+    return ValueError(f"Não foi possível ler o CSV: o byte 0x{e.object[e.start]:02x} não é "
+                      "UTF-8 nem cp1252. Salve o arquivo de novo como CSV UTF-8.")
+
+def _ler_csv(arquivo: BinaryIO, codificacao: str, dialeto) -> Iterator[list[str]]:
+    texto = io.TextIOWrapper(arquivo, encoding=codificacao, errors="strict", newline="")
+    try:
+        yield from csv.reader(texto, dialeto)
+    finally:
+        texto.detach()  # não fecha o arquivo de quem chamou
+
+def _linhas_csv(arquivo: BinaryIO) -> Iterator[list[str]]:
+    inicio = arquivo.tell()
+    amostra = arquivo.read(AMOSTRA_CSV)
+    arquivo.seek(inicio)
+    codificacao = _codificacao_csv(amostra)
+    try:
+        texto_amostra = codecs.getincrementaldecoder(codificacao)().decode(amostra, final=False)
+    except UnicodeDecodeError as e:
+        raise _erro_codificacao(e) from e
+    if len(amostra) == AMOSTRA_CSV:
+        texto_amostra = texto_amostra.rsplit("\n", 1)[0]  # a última linha pode ter sido cortada
+    dialeto = _dialeto_csv(texto_amostra)
+    lidas = 0
+    try:
+        for linha in _ler_csv(arquivo, codificacao, dialeto):
+            yield linha
+            lidas += 1
+    except UnicodeDecodeError as e:
+        if codificacao == "cp1252":
+            raise _erro_codificacao(e) from e
+        # As linhas já entregues não mudam de limite em cp1252 (separadores, aspas e
+        # quebras são ASCII): relê do começo e continua de onde parou
+        arquivo.seek(inicio + (len(codecs.BOM_UTF8) if codificacao == "utf-8-sig" else 0))
         try:
-            dialect = csv.Sniffer().sniff(data.splitlines()[0], delimiters=',;')
-        except (csv.Error, IndexError):
-            dialect = 'excel'
-        
-        reader = csv.reader(io.StringIO(data), dialect)
-        linhas = list(reader)
-        if not linhas: return [], []
-        
-        header_original = linhas[0]
-        for row in linhas[1:]:
-            if all(not cell for cell in row): continue
-            linhas_com_cabecalho_original.append({header_original[i]: row[i] if i < len(row) else "" for i in range(len(header_original))})
+            yield from itertools.islice(_ler_csv(arquivo, "cp1252", dialeto), lidas, None)
+        except UnicodeDecodeError as e2:
+            raise _erro_codificacao(e2) from e2
+
+def _linhas_xlsx(arquivo: BinaryIO, aba: str | None = None) -> Iterator[list[str]]:
+    # read_only: as linhas são lidas do XML sob demanda, sem montar a planilha inteira
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        for row in (wb[aba] if aba else wb.active).iter_rows(values_only=True):
+            yield ["" if cell is None else str(cell) for cell in row]
+    finally:
+        wb.close()
+
+def _extensao(filename: str) -> str:
+    return (filename or "").split(".")[-1].lower()
 
+def _ler_planilha(fonte: bytes | BinaryIO, filename: str, aba: str | None = None) -> tuple[list[str], Iterator[list[str]]]:
+    """
+    Abre um arquivo CSV ou XLSX e retorna os cabeçalhos e um gerador das linhas de dados
+    (listas de texto na ordem das colunas; linhas totalmente vazias são puladas).
+    No XLSX lê a aba `aba` (padrão: a aba ativa).
+    """
+    ext = _extensao(filename)
+    if ext in ("csv", "txt"):
+        linhas = _linhas_csv(_como_arquivo(fonte))
     elif ext in ("xlsx", "xlsm"):
-        bio = io.BytesIO(bytes_data)
-        ws = load_workbook(bio, data_only=True).active
-        
-        header_iter = ws.iter_rows(min_row=1, max_row=1, values_only=True)
-        header_original = [str(cell or "") for cell in next(header_iter, [])]
-        
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if all(cell is None for cell in row): continue
-            linhas_com_cabecalho_original.append({header_original[i]: (str(row[i]) if i < len(header_original) and row[i] is not None else "") for i in range(len(header_original))})
-    
+        linhas = _linhas_xlsx(_como_arquivo(fonte), aba)
     else:
         raise ValueError(f"Formato de arquivo não suportado: .{ext}")
+    header_original = next(linhas, [])
+    return header_original, (row for row in linhas if any(row))
+
+def abas_da_planilha(fonte: bytes | BinaryIO, filename: str) -> list[str | None]:
+    """
+    Nomes das abas de um XLSX, na ordem do arquivo, lidos só do xl/workbook.xml
+    (sem abrir as planilhas). CSV tem uma "aba" só: [None].
+    """
+    ext = _extensao(filename)
+    if ext in ("csv", "txt"):
+        return [None]
+    if ext not in ("xlsx", "xlsm"):
+        raise ValueError(f"Formato de arquivo não suportado: .{ext}")
+    arquivo = _como_arquivo(fonte)
+    with zipfile.ZipFile(arquivo) as z:
+        raiz = ElementTree.fromstring(z.read("xl/workbook.xml"))
+    arquivo.seek(0)
+    return [el.get("name") for el in raiz.iter() if el.tag.endswith("}sheet") and el.get("name")]
+
+# --- MAPEAMENTO DE CABEÇALHOS ---
+# A tabela de apelidos de cada MAPA_IMPORT é compilada na primeira importação ou
+# prévia que usa o mapa (normalizada e já pré-processada para o fuzzy) e guardada
+# pela "assinatura" do mapa; os blueprints só passam o mapa. Para uma planilha,
+# cabeçalhos que batem exatamente com um apelido nem passam pelo fuzzy; os
+# restantes são pontuados contra todos os apelidos numa matriz só
+# (rapidfuzz.process.cdist, em C) e cada um fica com o melhor apelido da sua
+# linha. O resultado fica em memória pela tupla de cabeçalhos, e mapeamentos
+# confirmados pelo usuário são gravados em dados/ (ver confirmar_mapeamento).
+PONTUACAO_MINIMA = 80
+LIMITE_MEMO = 256
+ARQUIVO_CONFIRMADOS = "mapeamentos_importacao.json"
+
+class _MapaCompilado:
+    def __init__(self, mapa_sistema: dict[str, list[str]]):
+        self.campos = tuple(mapa_sistema.keys())
+        # {apelido normalizado: campo_do_sistema}
+        self.opcoes: dict[str, str] = {}
+        for campo_sistema, apelidos in mapa_sistema.items():
+            for apelido in (campo_sistema, *apelidos):
+                self.opcoes[_normalizar(apelido)] = campo_sistema
+        self.chaves = list(self.opcoes)
+        if rf_process is not None:
+            # o mesmo pré-processamento que o thefuzz refaria em toda chamada
+            self.processadas = [fz_utils.full_process(k, force_ascii=True) for k in self.chaves]
+
+    def pontuar(self, cabecalhos: tuple[str, ...]) -> dict[str, tuple[str | None, int]]:
+        """{cabeçalho: (campo ou None, pontuação)} para cada cabeçalho da planilha."""
+        resultado, pendentes = {}, []
+        for cabecalho in cabecalhos:
+            campo = self.opcoes.get(_normalizar(cabecalho))
+            if campo is not None:
+                resultado[cabecalho] = (campo, 100)  # igual a um apelido: dispensa o fuzzy
+            else:
+                pendentes.append(cabecalho)
+        if pendentes:
+            resultado.update(zip(pendentes, self._fuzzy([_normalizar(c) for c in pendentes])))
+        return resultado
+
+    def _fuzzy(self, cabecalhos: list[str]) -> list[tuple[str | None, int]]:
+        if rf_process is None:
+            achados = (process.extractOne(c, self.chaves, score_cutoff=PONTUACAO_MINIMA) for c in cabecalhos)
+            return [(self.opcoes[a[0]], a[1]) if a else (None, 0) for a in achados]
+        consultas = [fz_utils.full_process(fz_utils.full_process(c), force_ascii=True) for c in cabecalhos]
+        # linha = cabeçalho, coluna = apelido; abaixo do corte a pontuação vem 0
+        matriz = rf_process.cdist(consultas, self.processadas, scorer=rf_fuzz.WRatio, processor=None,
+                                  score_cutoff=PONTUACAO_MINIMA)
+        resultado = []
+        for linha, melhor in zip(matriz, matriz.argmax(axis=1)):
+            pontos = int(round(float(linha[melhor])))
+            resultado.append((self.opcoes[self.chaves[melhor]], pontos) if pontos else (None, 0))
+        return resultado
+
+_compilados: dict[tuple, _MapaCompilado] = {}
+_memo: "OrderedDict[tuple, dict]" = OrderedDict()
+_trava_memo = threading.Lock()
+
+def _assinatura_mapa(mapa_sistema: dict[str, list[str]]) -> tuple:
+    return tuple((campo, tuple(apelidos)) for campo, apelidos in mapa_sistema.items())
+
+def compilar_mapa(mapa_sistema: dict[str, list[str]]) -> _MapaCompilado:
+    """Tabela de apelidos pronta para o MAPA_IMPORT (compilada na primeira chamada com cada mapa)."""
+    chave = _assinatura_mapa(mapa_sistema)
+    compilado = _compilados.get(chave)
+    if compilado is None:
+        compilado = _compilados[chave] = _MapaCompilado(mapa_sistema)
+    return compilado
+
+_pasta_dados: Path | None = None  # processos do pool da importação em lote não têm app (ver ler_aba)
 
-    return header_original, linhas_com_cabecalho_original
+def _arquivo_confirmados() -> Path | None:
+    if not has_app_context():
+        return _pasta_dados / ARQUIVO_CONFIRMADOS if _pasta_dados else None
+    return Path(current_app.config["DIRETORIO_DADOS"]) / ARQUIVO_CONFIRMADOS
+
+def _id_confirmado(campos: tuple[str, ...], cabecalhos: tuple[str, ...]) -> str:
+    bruto = json.dumps([campos, [_normalizar(c) for c in cabecalhos]], ensure_ascii=False)
+    return hashlib.sha1(bruto.encode("utf-8")).hexdigest()
+
+def _confirmado(compilado: _MapaCompilado, cabecalhos: tuple[str, ...]) -> dict | None:
+    arquivo = _arquivo_confirmados()
+    if arquivo is None or not arquivo.exists():
+        return None
+    item = armazenamento_json.obter_por_id(arquivo, _id_confirmado(compilado.campos, cabecalhos))
+    if not item:
+        return None
+    # campos[i] é o campo da i-ésima coluna ("" = coluna ignorada)
+    resultado = {}
+    for cabecalho, campo in zip(cabecalhos, item.get("campos", [])):
+        resultado[cabecalho] = (campo, 100) if campo in compilado.campos else (None, 0)
+    return resultado
+
+def _pontuar_cabecalhos(cabecalhos_planilha: list[str], mapa_sistema: dict[str, list[str]]) -> dict[str, tuple[str | None, int]]:
+    compilado = compilar_mapa(mapa_sistema)
+    cabecalhos = tuple(cabecalhos_planilha)
+    confirmado = _confirmado(compilado, cabecalhos)
+    if confirmado is not None:
+        return confirmado  # layout já conhecido: sem fuzzy nenhum
+    chave = (id(compilado), cabecalhos)
+    with _trava_memo:
+        if chave in _memo:
+            _memo.move_to_end(chave)
+            return _memo[chave]
+    resultado = compilado.pontuar(cabecalhos)
+    with _trava_memo:
+        _memo[chave] = resultado
+        while len(_memo) > LIMITE_MEMO:
+            _memo.popitem(last=False)
+    return resultado
 
 def _mapear_cabecalhos_inteligente(cabecalhos_planilha: list[str], mapa_sistema: dict[str, list[str]]) -> dict:
     """Cria um mapa de correspondência entre os cabeçalhos da planilha e os campos do sistema."""
-    
-    # Cria um dicionário de "busca reversa": {apelido: campo_do_sistema}
-    opcoes_busca = {}
-    for campo_sistema, apelidos in mapa_sistema.items():
-        opcoes_busca[_normalizar(campo_sistema)] = campo_sistema
-        for apelido in apelidos:
-            opcoes_busca[_normalizar(apelido)] = campo_sistema
-            
-    mapa_automatico = {}
-    for cabecalho in cabecalhos_planilha:
-        # Encontra a melhor correspondência na nossa lista de opções de busca
-        resultado = process.extractOne(_normalizar(cabecalho), opcoes_busca.keys(), score_cutoff=80)
-        
-        if resultado:
-            melhor_match = resultado[0]
-            campo_sistema_correspondente = opcoes_busca[melhor_match]
-            mapa_automatico[cabecalho] = campo_sistema_correspondente
-            
-    return mapa_automatico
+    pontuados = _pontuar_cabecalhos(cabecalhos_planilha, mapa_sistema)
+    return {cabecalho: campo for cabecalho, (campo, _) in pontuados.items() if campo}
+
+def confirmar_mapeamento(cabecalhos_planilha: list[str], mapa_sistema: dict[str, list[str]], mapa: dict[str, str]) -> None:
+    """
+    Grava o mapeamento {cabeçalho: campo} aprovado pelo usuário para esta sequência de
+    cabeçalhos: a próxima planilha com o mesmo layout é mapeada direto, sem fuzzy.
+    """
+    arquivo = _arquivo_confirmados()
+    if arquivo is None:
+        raise RuntimeError("confirmar_mapeamento precisa de um contexto de aplicação")
+    compilado = compilar_mapa(mapa_sistema)
+    cabecalhos = tuple(cabecalhos_planilha)
+    item = {
+        "id": _id_confirmado(compilado.campos, cabecalhos),
+        "cabecalhos": list(cabecalhos),
+        "campos": [mapa.get(c) if mapa.get(c) in compilado.campos else "" for c in cabecalhos],
+    }
+    if not armazenamento_json.atualizar(arquivo, item["id"], item):
+        armazenamento_json.criar(arquivo, item)
 
 # --- FUNÇÕES PRINCIPAIS ---
 
-def importar_generico(bytes_data: bytes, filename: str, mapa_sistema: dict[str, list[str]]) -> list[dict]:
-    """
-    Processo de importação principal, agora mais organizado.
-    """
-    campos_do_sistema = list(mapa_sistema.keys())
-    cabecalhos_originais, linhas_brutas = _ler_planilha(bytes_data, filename)
-    
-    if not linhas_brutas:
-        return []
-
-    mapa_automatico = _mapear_cabecalhos_inteligente(cabecalhos_originais, mapa_sistema)
-    
-    saida_final = []
-    for linha in linhas_brutas:
-        # Inicia um novo registro com todos os campos do sistema vazios
-        novo_registro = {campo: "" for campo in campos_do_sistema}
-        
-        # Preenche o novo registro usando o mapa automático
-        for cabecalho_original, valor in linha.items():
-            if cabecalho_original in mapa_automatico:
-                campo_sistema = mapa_automatico[cabecalho_original]
-                novo_registro[campo_sistema] = valor.strip()
-                
-        saida_final.append(novo_registro)
-        
-    return saida_final
-
-def analisar_cabecalhos_planilha(bytes_data: bytes, filename: str, mapa_sistema: dict[str, list[str]]) -> list[dict]:
+def _projecao(cabecalhos: list[str], mapa_automatico: dict) -> list[tuple[int, str]]:
+    """(índice da coluna, campo do sistema) de cada cabeçalho reconhecido, na ordem da planilha."""
+    return [(i, mapa_automatico[c]) for i, c in enumerate(cabecalhos) if c in mapa_automatico]
+
+def _projetor(cabecalhos: list[str], mapa_automatico: dict, campos_do_sistema: list[str]):
+    """Função linha -> registro com todos os campos do sistema (os sem coluna ficam "")."""
+    projecao = _projecao(cabecalhos, mapa_automatico)
+    vazio = dict.fromkeys(campos_do_sistema, "")
+
+    def projetar(row: list[str]) -> dict:
+        registro = vazio.copy()
+        # Preenche pelas colunas reconhecidas (linhas curtas ficam com "")
+        for i, campo in projecao:
+            if i < len(row):
+                registro[campo] = row[i].strip()
+        return registro
+    return projetar
+
+def iterar_registros(fonte: bytes | BinaryIO, filename: str, mapa_sistema: dict[str, list[str]],
+                     aba: str | None = None) -> Iterator[dict]:
     """
-    MODO DETETIVE APRIMORADO: Mostra qual campo do sistema foi encontrado e a pontuação de similaridade.
+    Gera os registros da planilha um a um, já com os campos do sistema.
+    Só a linha atual fica em memória: quem consome (ex.: repo.criar_lote) decide o que guardar.
+    """
+    cabecalhos_originais, linhas = _ler_planilha(fonte, filename, aba)
+    projetar = _projetor(cabecalhos_originais, _mapear_cabecalhos_inteligente(cabecalhos_originais, mapa_sistema),
+                         list(mapa_sistema.keys()))
+    yield from map(projetar, linhas)
+
+def ler_aba(caminho: str, filename: str, aba: str | None, mapa_sistema: dict[str, list[str]],
+            pasta_dados: str | None = None) -> dict:
+    """
+    Lê uma aba inteira (ou o CSV) já com os campos do sistema. Feita para rodar num
+    processo do ProcessPoolExecutor da importação em lote: recebe só dados simples,
+    abre o arquivo pelo caminho e usa os mapeamentos confirmados de `pasta_dados`.
+    Devolve {"colunas": [campos reconhecidos], "registros": [...]}; a aba inteira volta
+    de uma vez, então quem chama limita quantas ficam em memória (importacoes._ler_lote).
     """
-    cabecalhos_originais, _ = _ler_planilha(bytes_data, filename)
-    opcoes_busca = {}
-    for campo_sistema, apelidos in mapa_sistema.items():
-        opcoes_busca[_normalizar(campo_sistema)] = campo_sistema
-        for apelido in apelidos:
-            opcoes_busca[_normalizar(apelido)] = campo_sistema
+    global _pasta_dados
+    _pasta_dados = Path(pasta_dados) if pasta_dados else None
+    with open(caminho, "rb") as f:
+        cabecalhos_originais, linhas = _ler_planilha(f, filename, aba)
+        mapa_automatico = _mapear_cabecalhos_inteligente(cabecalhos_originais, mapa_sistema)
+        projetar = _projetor(cabecalhos_originais, mapa_automatico, list(mapa_sistema.keys()))
+        registros = list(map(projetar, linhas)) if mapa_automatico else []
+    colunas = sorted(set(mapa_automatico.values()), key=list(mapa_sistema).index)
+    return {"colunas": colunas, "registros": registros}
 
+def importar_generico(fonte: bytes | BinaryIO, filename: str, mapa_sistema: dict[str, list[str]]) -> list[dict]:
+    """
+    Processo de importação principal: devolve a lista completa de registros.
+    Para arquivos grandes prefira iterar_registros (não guarda a planilha inteira).
+    """
+    return list(iterar_registros(fonte, filename, mapa_sistema))
+
+# --- PRÉVIA (sem gravar) ---
+LINHAS_PREVIA = 20
+MAX_LINHAS_PREVIA = 200
+PONTUACAO_CONFERIR = 90  # mapeamentos por aproximação abaixo disso geram aviso
+
+def previa_importacao(fonte: bytes | BinaryIO, filename: str, mapa_sistema: dict[str, list[str]],
+                      linhas: int = LINHAS_PREVIA, obrigatorios: tuple[str, ...] = (),
+                      chaves: tuple[tuple[str, ...], ...] = ()) -> dict:
+    """
+    Lê só o cabeçalho e as primeiras `linhas` linhas (o leitor é fechado em seguida) e
+    devolve o que a importação faria com elas: o mapeamento com as pontuações, os
+    registros de amostra já com os campos do sistema e avisos para o operador conferir.
+    `obrigatorios`: pelo menos um deles precisa vir preenchido (mesma regra do validar
+    do blueprint). `chaves`: chaves naturais da coleção (modo sincronizar).
+    """
+    linhas = min(max(int(linhas), 1), MAX_LINHAS_PREVIA)
+    cabecalhos, dados = _ler_planilha(fonte, filename)
+    try:
+        brutas = list(itertools.islice(dados, linhas))
+    finally:
+        dados.close()
+    pontuados = _pontuar_cabecalhos(cabecalhos, mapa_sistema)
+    campos = list(mapa_sistema.keys())
+    projetar = _projetor(cabecalhos, {c: campo for c, (campo, _) in pontuados.items() if campo}, campos)
+    amostra = [projetar(row) for row in brutas]
+
+    avisos = []
+    colunas_por_campo: dict[str, list[str]] = {}
+    for cabecalho in cabecalhos:
+        campo, pontuacao = pontuados[cabecalho]
+        if not campo:
+            avisos.append(f"Coluna '{cabecalho}' não reconhecida: será ignorada.")
+            continue
+        colunas_por_campo.setdefault(campo, []).append(cabecalho)
+        if pontuacao < PONTUACAO_CONFERIR:
+            avisos.append(f"Coluna '{cabecalho}' mapeada para '{campo}' por aproximação ({pontuacao}): confira.")
+    for campo, colunas in colunas_por_campo.items():
+        if len(colunas) > 1:
+            avisos.append(f"Colunas {', '.join(repr(c) for c in colunas)} mapeadas para '{campo}': vale a última.")
+        elif amostra and not any(r[campo] for r in amostra):
+            avisos.append(f"Coluna '{colunas[0]}' ({campo}) está vazia nas primeiras {len(amostra)} linhas.")
+    sem_coluna = [c for c in campos if c not in colunas_por_campo]
+    for campo in sem_coluna:
+        if campo in obrigatorios or any(campo in chave for chave in chaves):
+            avisos.append(f"Campo '{campo}' não encontrado na planilha.")
+    for n, registro in enumerate(amostra, start=1):
+        if obrigatorios and not any(registro.get(c) for c in obrigatorios):
+            avisos.append(f"Registro {n} da amostra: sem {' / '.join(obrigatorios)}; será ignorado.")
+        elif chaves and not any(all(registro.get(c) for c in chave) for chave in chaves):
+            avisos.append(f"Registro {n} da amostra: sem chave ({' ou '.join(' + '.join(ch) for ch in chaves)}); "
+                          "será ignorado no modo sincronizar.")
+
+    return {
+        "cabecalhos": list(cabecalhos),
+        "mapeamento": [{"original": c, "campo": pontuados[c][0], "pontuacao": pontuados[c][1]} for c in cabecalhos],
+        "campos": campos,
+        "campos_sem_coluna": sem_coluna,
+        "amostra": amostra,
+        "avisos": avisos,
+    }
+
+def analisar_cabecalhos_planilha(fonte: bytes | BinaryIO, filename: str, mapa_sistema: dict[str, list[str]]) -> list[dict]:
+    """
+    MODO DETETIVE APRIMORADO: Mostra qual campo do sistema foi encontrado e a pontuação de similaridade.
+    """
+    cabecalhos_originais, linhas = _ler_planilha(fonte, filename)
+    linhas.close()  # só o cabeçalho interessa
+    pontuados = _pontuar_cabecalhos(cabecalhos_originais, mapa_sistema)
     analise = []
     for cabecalho in cabecalhos_originais:
-        resultado = process.extractOne(_normalizar(cabecalho), opcoes_busca.keys(), score_cutoff=80)
-        if resultado:
-            melhor_match, pontuacao = resultado
-            campo_sistema = opcoes_busca[melhor_match]
-            analise.append({
-                "original": cabecalho,
-                "match": campo_sistema,
-                "pontuacao": pontuacao
-            })
-        else:
-            analise.append({
-                "original": cabecalho,
-                "match": "NÃO ENCONTRADO",
-                "pontuacao": 0
-            })
-            
-    return analise
\ No newline at end of file
+        campo_sistema, pontuacao = pontuados[cabecalho]
+        analise.append({
+            "original": cabecalho,
+            "match": campo_sistema or "NÃO ENCONTRADO",
+            "pontuacao": pontuacao
+        })
+    return analise
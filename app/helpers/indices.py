@@ -0,0 +1,205 @@
+from __future__ import annotations
+from pathlib import Path
+import itertools, threading
+
+from . import colecoes
+
+# --- ÍNDICES SECUNDÁRIOS EM MEMÓRIA ---
+# Usados pelos motores json/journal (o SQLite usa índices próprios).
+# Para cada coleção guardamos {campo: {valor normalizado: {ids}}} dos campos
+# declarados em colecoes.registrar(..., indices=...). O índice é montado uma vez
+# e depois mantido a cada criar/atualizar/excluir feito pela fachada. Ele carrega
+# a "versão" do armazenamento em que foi montado: se outro processo gravar, a
+# versão muda e o índice é remontado na próxima consulta.
+
+class _Indice:
+    def __init__(self, versao, campos: tuple[str, ...]):
+        self.versao = versao
+        self.campos = campos
+        self.mapa: dict[str, dict[str, set[str]]] = {c: {} for c in campos}
+        self.registros: dict[str, dict] = {}
+        self.ordem: dict[str, int] = {}  # posição de cada id, para devolver na ordem da coleção
+        self.proxima = 0
+        self.ordenados: dict[str, list[str]] = {}  # campo -> ids ordenados por ele (montado sob demanda)
+
+    def adicionar(self, item: dict) -> None:
+        id = item.get("id") or f"#{self.proxima}"  # registros antigos sem id
+        antigo = self.registros.get(id)
+        if antigo is not None:
+            self._desindexar(id, antigo)
+        self.registros[id] = item  # atualização mantém a posição do registro no dict
+        if id not in self.ordem:
+            self.ordem[id] = self.proxima
+            self.proxima += 1
+        for c in self.campos:
+            self.mapa[c].setdefault(colecoes.chave_indice(item.get(c)), set()).add(id)
+        self.ordenados.clear()
+
+    def remover(self, id: str) -> None:
+        item = self.registros.pop(id, None)
+        if item is None:
+            return
+        self.ordem.pop(id, None)
+        self._desindexar(id, item)
+        self.ordenados.clear()
+
+    def _desindexar(self, id: str, item: dict) -> None:
+        for c in self.campos:
+            chave = colecoes.chave_indice(item.get(c))
+            ids = self.mapa[c].get(chave)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self.mapa[c][chave]
+
+_indices: dict[str, _Indice] = {}
+_trava = threading.RLock()
+
+def _como_tupla(valor) -> tuple:
+    return tuple(valor) if isinstance(valor, (list, tuple, set)) else (valor,)
+
+def obter(path: Path, motor) -> _Indice:
+    """Índice da coleção, (re)montado se o armazenamento mudou desde a última vez."""
+    chave = str(path)
+    versao = motor.versao(path)
+    with _trava:
+        idx = _indices.get(chave)
+        if idx is not None and idx.versao == versao:
+            return idx
+        idx = _Indice(versao, colecoes.obter(path)["indices"])
+        for item in motor.listar(path):
+            idx.adicionar(item)
+        _indices[chave] = idx
+        return idx
+
+def ao_gravar(path: Path, versao_antes, versao_depois, gravados=(), removidos=()) -> None:
+    """Aplica uma gravação no índice; se ele estava desatualizado, só descarta."""
+    with _trava:
+        idx = _indices.get(str(path))
+        if idx is None:
+            return
+        if idx.versao != versao_antes:
+            del _indices[str(path)]
+            return
+        for item in gravados:
+            idx.adicionar(item)
+        for id in removidos:
+            idx.remover(id)
+        idx.versao = versao_depois
+
+def _ids(idx: _Indice, campo: str, valores) -> set[str]:
+    ids = set()
+    for v in _como_tupla(valores):
+        ids |= idx.mapa[campo].get(colecoes.chave_indice(v), set())
+    return ids
+
+def _selecionar(idx: _Indice, criterios: dict, excluir: dict | None,
+                permitidos: set[str] | None = None) -> tuple[set[str] | None, dict]:
+    """Resolve o que dá pelo índice; devolve (ids ou None = todos, critérios que sobraram)."""
+    ids, restantes = None, {}
+    indexados = [_ids(idx, c, v) for c, v in criterios.items() if c in idx.mapa]
+    if permitidos is not None:
+        indexados.append(permitidos & idx.registros.keys())
+    if indexados:
+        indexados.sort(key=len)  # começa pelo menor conjunto
+        ids = indexados[0].intersection(*indexados[1:])
+    restantes.update({c: v for c, v in criterios.items() if c not in idx.mapa})
+    for c, v in (excluir or {}).items():
+        if c in idx.mapa:
+            ids = (set(idx.registros) if ids is None else ids) - _ids(idx, c, v)
+        else:
+            restantes[f"!{c}"] = v
+    return ids, restantes
+
+def _confere(item: dict, criterios: dict) -> bool:
+    for c, v in criterios.items():
+        negado = c.startswith("!")
+        aceitos = {colecoes.chave_indice(x) for x in _como_tupla(v)}
+        if (colecoes.chave_indice(item.get(c.lstrip("!"))) in aceitos) == negado:
+            return False
+    return True
+
+def filtrar(idx: _Indice, criterios: dict, excluir: dict | None = None,
+            permitidos: set[str] | None = None) -> list[dict]:
+    """
+    Registros cujos campos batem com `criterios` (valor ou tupla de valores aceitos)
+    e não batem com `excluir`, na ordem da coleção. Campos sem índice são
+    conferidos registro a registro. `permitidos` limita a um conjunto de ids
+    (ex.: o resultado da busca textual).
+    """
+    ids, restantes = _selecionar(idx, criterios, excluir, permitidos)
+    if ids is None:
+        candidatos = list(idx.registros.values())
+    else:
+        candidatos = [idx.registros[i] for i in sorted(ids, key=idx.ordem.__getitem__)]
+    if restantes:
+        candidatos = [r for r in candidatos if _confere(r, restantes)]
+    return candidatos
+
+def contar(idx: _Indice, criterios: dict, excluir: dict | None = None,
+           permitidos: set[str] | None = None) -> int:
+    ids, restantes = _selecionar(idx, criterios, excluir, permitidos)
+    if not restantes:
+        return len(idx.registros) if ids is None else len(ids)
+    return len(filtrar(idx, criterios, excluir, permitidos))
+
+def contar_por(idx: _Indice, campo: str, criterios: dict, excluir: dict | None = None) -> dict[str, int]:
+    """{valor normalizado de `campo`: quantidade} dos registros que batem com os critérios."""
+    ids, restantes = _selecionar(idx, criterios, excluir)
+    if restantes or campo not in idx.mapa:
+        contagem: dict[str, int] = {}
+        for r in filtrar(idx, criterios, excluir):
+            chave = colecoes.chave_indice(r.get(campo))
+            contagem[chave] = contagem.get(chave, 0) + 1
+        return contagem
+    grupos = idx.mapa[campo].items()
+    if ids is None:
+        return {v: len(s) for v, s in grupos if s}
+    return {v: n for v, s in grupos if (n := len(s & ids))}
+
+def _ordenados(idx: _Indice, campo: str) -> list[str]:
+    ids = idx.ordenados.get(campo)
+    if ids is None:
+        regs = idx.registros
+        ids = idx.ordenados[campo] = sorted(regs, key=lambda i: colecoes.chave_indice(regs[i].get(campo)))
+    return ids
+
+def pagina(idx: _Indice, criterios: dict, excluir: dict | None = None, permitidos: set[str] | None = None,
+           ordem: tuple[str, bool] | None = None, offset: int = 0, limit: int = 50) -> tuple[list[dict], int]:
+    """
+    Uma janela [offset, offset + limit) do resultado de filtrar() e o total de registros
+    que batem, sem montar a lista inteira. `ordem` = (campo, decrescente) ou None para a
+    ordem da coleção. A ordem por campo fica guardada no índice até a próxima gravação.
+    """
+    ids, restantes = _selecionar(idx, criterios, excluir, permitidos)
+    regs = idx.registros
+    total = len(regs) if ids is None else len(ids)
+    # Percorrer a coleção (ou a ordem guardada) até encher a janela custa por volta de
+    # (offset + limit) * len(regs) / len(ids) testes; com poucos ids é melhor ordenar só eles
+    if ids is not None and len(ids) ** 2 * 4 < (offset + limit) * len(regs):
+        sequencia = sorted(ids, key=idx.ordem.__getitem__)
+        if ordem:
+            sequencia.sort(key=lambda i: colecoes.chave_indice(regs[i].get(ordem[0])))
+            if ordem[1]:
+                sequencia.reverse()
+    else:
+        if ordem:
+            sequencia = _ordenados(idx, ordem[0])
+            sequencia = reversed(sequencia) if ordem[1] else sequencia
+        else:
+            sequencia = regs.keys()
+        if ids is not None:
+            sequencia = (i for i in sequencia if i in ids)
+    if not restantes:
+        return [regs[i] for i in itertools.islice(sequencia, offset, offset + limit)], total
+    janela, total = [], 0
+    for i in sequencia:
+        if _confere(regs[i], restantes):
+            if offset <= total < offset + limit:
+                janela.append(regs[i])
+            total += 1
+    return janela, total
+
+def descartar(path: Path) -> None:
+    with _trava:
+        _indices.pop(str(path), None)
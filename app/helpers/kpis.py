@@ -0,0 +1,219 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import Counter
+from itertools import islice
+from pathlib import Path
+import threading
+
+from flask import current_app
+
+from . import colecoes, repositorio as repo
+from .cache_ttl import CacheTTL
+
+# --- KPIs DO PAINEL ---
+# O painel (rota "/") lia cinco coleções inteiras a cada visita. Aqui cada
+# coleção usada por ele tem um agregado em memória: guarda, por id, só os campos
+# que entram nos KPIs e os totais que eles somam (contadores por tipo de licença,
+# por filial, por status da VPN, soma do estoque, itens com estoque baixo,
+# entregas mais recentes). Como os índices (helpers/indices), o agregado é
+# montado uma vez, lembra a versão do armazenamento e é atualizado pela fachada
+# (repositorio -> ao_gravar) em O(1) por registro gravado; se outro processo
+# gravar, a versão muda e ele é remontado na próxima leitura.
+TOP_LICENCAS = 5
+TOP_FILIAIS = 10
+ULTIMAS_ENTREGAS = 5
+ESTOQUE_BAIXO_ATE = 5
+VPN_PENDENTE = ("PENDENTE", "AGUARDANDO", "")
+
+def _inteiro(valor) -> int:
+    try:
+        return int(valor or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def _ajustar(contador: Counter, chave, sinal: int) -> None:
+    contador[chave] += sinal
+    if contador[chave] <= 0:
+        del contador[chave]
+
+class _Agregado(ABC):
+    campos: tuple[str, ...] = ()
+    padroes: dict = {}
+
+    def __init__(self, versao):
+        self.versao = versao
+        self.registros: dict[str, dict] = {}  # id -> campos usados (na ordem da coleção)
+        self.sem_id = 0
+
+    def gravar(self, item: dict) -> None:
+        id = item.get("id")
+        if not id:  # registros antigos sem id
+            id, self.sem_id = f"#{self.sem_id}", self.sem_id + 1
+        antigo = self.registros.get(id)
+        if antigo is not None:
+            self._somar(id, self._com_padroes(antigo), -1)
+        # os motores gravam o registro inteiro: campo que não veio deixou de existir
+        # (e continua ausente, como no registro: quem exibe aplica o próprio padrão)
+        novo = {c: item[c] for c in self.campos if c in item}
+        self.registros[id] = novo
+        self._somar(id, self._com_padroes(novo), 1)
+
+    def remover(self, id: str) -> None:
+        antigo = self.registros.pop(id, None)
+        if antigo is not None:
+            self._somar(id, self._com_padroes(antigo), -1)
+
+    def _com_padroes(self, guardado: dict) -> dict:
+        return {c: guardado.get(c, self.padroes.get(c)) for c in self.campos}
+
+    @abstractmethod
+    def _somar(self, id: str, valores: dict, sinal: int) -> None:
+        """Soma (sinal=1) ou tira (sinal=-1) os valores de um registro dos totais."""
+
+class _Licencas(_Agregado):
+    campos = ("licenca", "situacao")
+    padroes = {"licenca": ""}
+
+    def __init__(self, versao):
+        super().__init__(versao)
+        self.ativas_por_tipo: Counter = Counter()
+        self.inativas = 0
+
+    def _somar(self, id, valores, sinal):
+        if colecoes.chave_indice(valores["situacao"]) == "INATIVO":
+            self.inativas += sinal
+        else:
+            _ajustar(self.ativas_por_tipo, valores["licenca"], sinal)
+
+class _Vpn(_Agregado):
+    campos = ("status",)
+
+    def __init__(self, versao):
+        super().__init__(versao)
+        self.por_status: Counter = Counter()
+
+    def _somar(self, id, valores, sinal):
+        _ajustar(self.por_status, colecoes.chave_indice(valores["status"]), sinal)
+
+class _Equipamentos(_Agregado):
+    campos = ("filial",)
+    padroes = {"filial": "Sem Filial"}
+
+    def __init__(self, versao):
+        super().__init__(versao)
+        self.por_filial: Counter = Counter()
+
+    def _somar(self, id, valores, sinal):
+        _ajustar(self.por_filial, valores["filial"], sinal)
+
+class _Estoque(_Agregado):
+    campos = ("qtd_estoque",)
+
+    def __init__(self, versao):
+        super().__init__(versao)
+        self.total = 0
+        self.baixo: set[str] = set()
+
+    def _somar(self, id, valores, sinal):
+        qtd = _inteiro(valores["qtd_estoque"])
+        self.total += sinal * qtd
+        if sinal > 0 and 0 < qtd <= ESTOQUE_BAIXO_ATE:
+            self.baixo.add(id)
+        elif sinal < 0:
+            self.baixo.discard(id)
+
+class _Entregas(_Agregado):
+    campos = ("glpi", "solicitante", "produto_nome", "qtd")
+
+    def _somar(self, id, valores, sinal):
+        pass  # a ordem de self.registros já é a da coleção (novas no fim)
+
+    def ultimas(self, n: int) -> list[dict]:
+        return [{"id": id, **self.registros[id]} for id in islice(reversed(self.registros), n)]
+
+AGREGADOS = {
+    "licencas.json": _Licencas,
+    "vpn.json": _Vpn,
+    "equipamentos.json": _Equipamentos,
+    "perifericos_estoque.json": _Estoque,
+    "perifericos_entregas.json": _Entregas,
+}
+
+_agregados: dict[str, _Agregado] = {}
+_trava = threading.RLock()
+
+def obter(path: Path, motor) -> _Agregado:
+    """Agregado da coleção, (re)montado se o armazenamento mudou desde a última vez."""
+    chave = str(path)
+    versao = motor.versao(path)
+    with _trava:
+        ag = _agregados.get(chave)
+        if ag is not None and ag.versao == versao:
+            return ag
+        ag = AGREGADOS[Path(path).name](versao)
+        for item in motor.listar(path):
+            ag.gravar(item)
+        _agregados[chave] = ag
+        return ag
+
+def ao_gravar(path: Path, versao_antes, versao_depois, gravados=(), removidos=()) -> None:
+    """Aplica uma gravação no agregado; se ele estava desatualizado, só descarta."""
+    if Path(path).name not in AGREGADOS:
+        return
+    with _trava:
+        ag = _agregados.get(str(path))
+        if ag is None:
+            return
+        if ag.versao != versao_antes:
+            del _agregados[str(path)]
+            return
+        for item in gravados:
+            ag.gravar(item)
+        for id in removidos:
+            ag.remover(id)
+        ag.versao = versao_depois
+
+def iniciar(pasta: str | Path | None = None) -> None:
+    """Monta os agregados de todas as coleções do painel (na subida da aplicação)."""
+    pasta = Path(pasta or current_app.config["DIRETORIO_DADOS"])
+    mot = repo.motor()
+    with _trava:
+        for arquivo in AGREGADOS:
+            _agregados.pop(str(pasta / arquivo), None)
+            obter(pasta / arquivo, mot)
+
+def painel(pasta: str | Path | None = None) -> dict:
+    """Os KPIs e os dados dos gráficos do painel, lidos dos agregados."""
+    pasta = Path(pasta or current_app.config["DIRETORIO_DADOS"])
+    mot = repo.motor()
+    with _trava:
+        lic = obter(pasta / "licencas.json", mot)
+        vpn = obter(pasta / "vpn.json", mot)
+        eqp = obter(pasta / "equipamentos.json", mot)
+        estoque = obter(pasta / "perifericos_estoque.json", mot)
+        entregas = obter(pasta / "perifericos_entregas.json", mot)
+
+        top_licencas = lic.ativas_por_tipo.most_common(TOP_LICENCAS)
+        top_filiais = eqp.por_filial.most_common(TOP_FILIAIS)
+        return {
+            "vpn_pendentes": sum(vpn.por_status[s] for s in VPN_PENDENTE),
+            "lic_inativos": lic.inativas,
+            "total_equipamentos": len(eqp.registros),
+            "total_licencas": sum(lic.ativas_por_tipo.values()),
+            "ultimas_entregas": entregas.ultimas(ULTIMAS_ENTREGAS),
+
+            "total_perifericos_estoque": estoque.total,
+            "itens_estoque_baixo": len(estoque.baixo),
+
+            "licencas_chart_data": {"labels": [i[0] for i in top_licencas], "data": [i[1] for i in top_licencas]},
+            "equip_chart_data": {"labels": [i[0] for i in top_filiais], "data": [i[1] for i in top_filiais]},
+        }
+
+# O painel e a API (blueprints/painel) leem os KPIs por aqui: o resultado de
+# painel() fica PAINEL_CACHE_SEGUNDOS em cache, com um único recálculo por vez.
+_cache_painel = CacheTTL()
+
+def painel_em_cache() -> tuple[dict, str]:
+    """(KPIs do painel, ETag), recalculados no máximo a cada PAINEL_CACHE_SEGUNDOS."""
+    return _cache_painel.obter(current_app.config["DIRETORIO_DADOS"], painel,
+                               ttl=current_app.config["PAINEL_CACHE_SEGUNDOS"])
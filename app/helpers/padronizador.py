@@ -1,6 +1,30 @@
 # app/helpers/padronizador.
+from __future__ import annotations
+from functools import lru_cache
+import re
+import threading
 import unicodedata
 
+from thefuzz import fuzz, process
+
+from ..constants import ALIASES_FILIAIS
+
+# --- FILIAIS ---
+# O casador de cada lista oficial é montado uma vez (e reaproveitado) com:
+#   - um dict exato {texto simplificado: filial}, que inclui o nome sem o código
+#     ("riopreto"), o código com e sem zero ("01", "1") e os apelidos de
+#     constants.ALIASES_FILIAIS ("saojosedoriopreto");
+#   - um dict com os pedaços de cada nome (o texto da planilha contido no nome
+#     oficial, ex.: "Ribeirao"); pedaços que servem a duas filiais ficam de fora;
+#   - uma regex com todos os nomes/apelidos, do maior para o menor, para achar o
+#     nome dentro do texto ("Tracbel Agro Orlandia"), só como palavras inteiras
+#     ("Francana" não é Franca, "Tupanci" não é Tupa);
+#   - por último, aproximação (thefuzz) para erros de digitação.
+# As respostas ficam num LRU: numa planilha os mesmos poucos valores se repetem.
+MIN_PEDACO = 4              # pedaços menores que isso ("rio", "a") não identificam filial
+PONTUACAO_MINIMA_FILIAL = 90
+LIMITE_MEMO_FILIAIS = 4096
+
 def _simplificar_texto(texto: str) -> str:
     """Função interna para limpar e normalizar um texto para comparação."""
     if not texto:
@@ -13,25 +37,109 @@ def _simplificar_texto(texto: str) -> str:
     texto = "".join(c for c in texto if c.isalnum())
     return texto
 
-def encontrar_filial_correspondente(texto_da_planilha: str, lista_oficial_filiais: list[str]) -> str:
+def _palavras(texto: str) -> str:
+    """Como _simplificar_texto, mas com as palavras separadas por um espaço ("rio preto")."""
+    texto = "".join(c for c in unicodedata.normalize('NFD', texto.lower()) if unicodedata.category(c) != 'Mn')
+    return " ".join(re.findall(r"[a-z0-9]+", texto))
+
+class _CasadorFiliais:
+    def __init__(self, filiais: tuple[str, ...], aliases: tuple[tuple[str, str], ...]):
+        self.exatos: dict[str, str] = {}
+        nomes: dict[str, str] = {}  # nome simplificado (sem código) / apelido -> filial
+        palavras: dict[str, str] = {}  # o mesmo, em palavras ("rio preto" e "riopreto") -> filial
+        def incluir(texto: str, filial: str) -> None:
+            if _simplificar_texto(texto):
+                nomes.setdefault(_simplificar_texto(texto), filial)
+                palavras.setdefault(_palavras(texto), filial)
+                palavras.setdefault(_simplificar_texto(texto), filial)
+        for filial in filiais:
+            self.exatos.setdefault(_simplificar_texto(filial), filial)
+            codigo = re.match(r"\s*(\d+)\s*-\s*(.*)", filial)
+            if codigo:
+                self.exatos.setdefault(codigo.group(1), filial)
+                self.exatos.setdefault(str(int(codigo.group(1))), filial)
+                incluir(codigo.group(2), filial)
+            else:
+                incluir(filial, filial)
+        for apelido, filial in aliases:
+            if filial in filiais:
+                incluir(apelido, filial)
+        for nome, filial in nomes.items():
+            self.exatos.setdefault(nome, filial)
+
+        pedacos: dict[str, set[str]] = {}
+        for nome, filial in nomes.items():
+            for i in range(len(nome)):
+                for j in range(i + MIN_PEDACO, len(nome) + 1):
+                    pedacos.setdefault(nome[i:j], set()).add(filial)
+        self.pedacos = {p: next(iter(f)) for p, f in pedacos.items() if len(f) == 1}
+
+        self.nomes = nomes
+        self.palavras = palavras
+        ordenados = sorted(palavras, key=len, reverse=True)
+        self.regex = (re.compile(r"(?<![a-z0-9])(?:" + "|".join(map(re.escape, ordenados)) + r")(?![a-z0-9])")
+                      if ordenados else None)
+        self.procurar = lru_cache(maxsize=LIMITE_MEMO_FILIAIS)(self._procurar)
+
+    def _procurar(self, texto: str) -> str | None:
+        simples = _simplificar_texto(texto)
+        if not simples:
+            return None
+        if simples in self.exatos:
+            return self.exatos[simples]
+        if simples in self.pedacos:
+            return self.pedacos[simples]
+        achado = self.regex.search(_palavras(texto)) if self.regex else None
+        if achado:
+            return self.palavras[achado.group(0)]
+        if len(simples) >= MIN_PEDACO:
+            melhor = process.extractOne(simples, list(self.nomes), scorer=fuzz.ratio,
+                                        score_cutoff=PONTUACAO_MINIMA_FILIAL)
+            if melhor:
+                return self.nomes[melhor[0]]
+        return None
+
+_casadores: dict[tuple, _CasadorFiliais] = {}
+_trava = threading.Lock()
+
+def _casador(lista_oficial_filiais, aliases) -> _CasadorFiliais:
+    chave = (tuple(lista_oficial_filiais), tuple(aliases.items()))
+    casador = _casadores.get(chave)
+    if casador is None:
+        with _trava:
+            casador = _casadores.setdefault(chave, _CasadorFiliais(*chave))
+    return casador
+
+def procurar_filial(texto: str, lista_oficial_filiais: list[str], aliases: dict[str, str] | None = None) -> str | None:
+    """Filial oficial correspondente ao texto, ou None se nenhuma servir."""
+    if not texto or not lista_oficial_filiais:
+        return None
+    return _casador(lista_oficial_filiais, ALIASES_FILIAIS if aliases is None else aliases).procurar(texto)
+
+def encontrar_filial_correspondente(texto_da_planilha: str, lista_oficial_filiais: list[str],
+                                    aliases: dict[str, str] | None = None) -> str:
     """
     Compara um texto de filial (da planilha) com a lista oficial e retorna a correspondência correta.
+    Sem correspondência, devolve o texto original. `aliases` (padrão: constants.ALIASES_FILIAIS)
+    traz outros nomes conhecidos de cada filial.
     """
     if not texto_da_planilha or not lista_oficial_filiais:
         return texto_da_planilha # Retorna o original se a entrada for vazia
+    casador = _casador(lista_oficial_filiais, ALIASES_FILIAIS if aliases is None else aliases)
+    return casador.procurar(texto_da_planilha) or texto_da_planilha
 
-    texto_simplificado = _simplificar_texto(texto_da_planilha)
-
-    # 1ª Tentativa: Busca por correspondência exata (após simplificação)
-    for filial_oficial in lista_oficial_filiais:
-        if _simplificar_texto(filial_oficial) == texto_simplificado:
-            return filial_oficial # Encontrou! Retorna o nome oficial.
-
-    # 2ª Tentativa: Busca parcial (se o texto da planilha está contido no nome oficial)
-    # Isso resolve casos como "Rio Preto" contido em "01-Rio Preto"
-    for filial_oficial in lista_oficial_filiais:
-        if texto_simplificado in _simplificar_texto(filial_oficial):
-            return filial_oficial # Encontrou! Retorna o nome oficial.
-
-    # Se não encontrar nenhuma correspondência, retorna o texto original da planilha
-    return texto_da_planilha
\ No newline at end of file
+def canonicalizar_coluna(registros, campo: str, lista_oficial_filiais: list[str],
+                         aliases: dict[str, str] | None = None):
+    """
+    encontrar_filial_correspondente aplicado ao `campo` de cada registro, sob demanda (para
+    o pipeline da importação): cada valor distinto do lote é resolvido uma vez só, sem
+    disputar o LRU compartilhado com as outras importações.
+    """
+    casador = _casador(lista_oficial_filiais, ALIASES_FILIAIS if aliases is None else aliases)
+    resolvidos: dict[str, str] = {}
+    for item in registros:
+        valor = item.get(campo, '')
+        if valor not in resolvidos:
+            resolvidos[valor] = (casador.procurar(valor) if valor else None) or valor
+        item[campo] = resolvidos[valor]
+        yield item
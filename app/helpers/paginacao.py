@@ -0,0 +1,54 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from flask import request
+
+from . import repositorio as repo
+
+# Paginação das telas *_listar: lê ?page=, ?per_page= e ?sort= da URL e pede
+# ao repositório só a janela da página (repo.listar_pagina). Os demais
+# parâmetros (q, filial, status...) continuam na URL e são preservados pelos
+# links gerados em macros.html (paginacao / th_ordem).
+POR_PAGINA = 50
+MAX_POR_PAGINA = 500
+
+@dataclass
+class Pagina:
+    registros: list[dict]
+    total: int
+    pagina: int
+    por_pagina: int
+    ordem: str
+
+    @property
+    def paginas(self) -> int:
+        return max(1, -(-self.total // self.por_pagina))
+
+    @property
+    def inicio(self) -> int:
+        return (self.pagina - 1) * self.por_pagina + 1 if self.total else 0
+
+    @property
+    def fim(self) -> int:
+        return min(self.pagina * self.por_pagina, self.total)
+
+def _inteiro(nome: str, padrao: int) -> int:
+    try:
+        return int(request.args.get(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+def paginar(path: Path, filtro: dict | None = None, excluir: dict | None = None,
+            busca: str = "", ordem_padrao: str | None = None) -> Pagina:
+    """Página pedida na URL do resultado de repo.filtrar(path, excluir, busca, **filtro)."""
+    por_pagina = min(max(_inteiro("per_page", POR_PAGINA), 1), MAX_POR_PAGINA)
+    pagina = max(_inteiro("page", 1), 1)
+    ordem = request.args.get("sort", "").strip() or ordem_padrao or ""
+    regs, total = repo.listar_pagina(path, filtro, ordem, (pagina - 1) * por_pagina, por_pagina,
+                                     excluir=excluir, busca=busca)
+    if not regs and pagina > 1 and total:
+        # Página além do fim (ex.: registros excluídos): mostra a última
+        pagina = -(-total // por_pagina)
+        regs, total = repo.listar_pagina(path, filtro, ordem, (pagina - 1) * por_pagina, por_pagina,
+                                         excluir=excluir, busca=busca)
+    return Pagina(regs, total, pagina, por_pagina, ordem)
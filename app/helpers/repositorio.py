@@ -0,0 +1,174 @@
+from __future__ import annotations
+from importlib import import_module
+from pathlib import Path
+from flask import current_app, has_app_context
+
+from . import colecoes, indices, busca as indice_busca, cache_exportacao, filiais, kpis, serie_kpis
+
+# Motores de armazenamento disponíveis (todos com as mesmas funções:
+# listar, obter_por_id, criar, criar_lote, gravar_lote, atualizar, excluir).
+# O motor é escolhido em app.config["MOTOR_DADOS"]; o padrão continua sendo o JSON.
+MOTORES = {
+    "json": "armazenamento_json",
+    "journal": "armazenamento_journal",
+    "sqlite": "armazenamento_sqlite",
+}
+
+def motor():
+    """Retorna o módulo do motor configurado para a aplicação atual."""
+    nome = current_app.config.get("MOTOR_DADOS", "json") if has_app_context() else "json"
+    if nome not in MOTORES:
+        raise ValueError(f"Motor de dados desconhecido: {nome}")
+    return import_module(f".{MOTORES[nome]}", __package__)
+
+def _indices_nativos(mot) -> bool:
+    """Motores com consulta própria (SQLite) dispensam os índices em memória."""
+    return hasattr(mot, "filtrar")
+
+def _derivados(mot) -> list:
+    """
+    Estruturas mantidas a cada gravação (índices, busca textual, KPIs do painel, série
+    histórica dos KPIs e exportações em cache). A série vem depois dos KPIs, que ela lê.
+    """
+    if _indices_nativos(mot):
+        return [indice_busca, kpis, serie_kpis, cache_exportacao]
+    return [indices, indice_busca, kpis, serie_kpis, cache_exportacao]
+
+def _notificar(path: Path, mot, antes, gravados=(), removidos=()) -> None:
+    depois = mot.versao(path)
+    for d in _derivados(mot):
+        d.ao_gravar(path, antes, depois, gravados, removidos)
+
+def listar(path: Path) -> list[dict]:
+    return motor().listar(path)
+
+def versao(path: Path):
+    """Muda a cada gravação na coleção (inclusive por outro processo)."""
+    return motor().versao(path)
+
+def _preparar(path: Path, itens):
+    """Campos derivados calculados na gravação (hoje, o filial_id; ver helpers/filiais)."""
+    preparar = filiais.preparar_gravacao(path)
+    return itens if preparar is None else map(preparar, itens)
+
+def criar(path: Path, dados: dict) -> dict:
+    dados = next(iter(_preparar(path, [dados])))
+    mot = motor()
+    antes = mot.versao(path)
+    item = mot.criar(path, dados)
+    _notificar(path, mot, antes, gravados=[item])
+    return item
+
+def criar_lote(path: Path, registros, validar=None) -> dict:
+    mot = motor()
+    antes = mot.versao(path)
+    res = mot.criar_lote(path, _preparar(path, registros), validar=validar)
+    if res["inseridos"]:
+        _notificar(path, mot, antes, gravados=res["registros"])
+    return res
+
+def gravar_lote(path: Path, itens: list[dict]) -> None:
+    """Grava registros completos (com id) de uma vez: atualiza os existentes e insere os novos."""
+    if not itens:
+        return
+    itens = list(_preparar(path, itens))
+    mot = motor()
+    antes = mot.versao(path)
+    mot.gravar_lote(path, itens)
+    _notificar(path, mot, antes, gravados=itens)
+
+def atualizar(path: Path, id: str, dados: dict) -> bool:
+    dados = next(iter(_preparar(path, [dados])))
+    mot = motor()
+    antes = mot.versao(path)
+    ok = mot.atualizar(path, id, dados)
+    if ok:
+        _notificar(path, mot, antes, gravados=[{**dados, "id": id}])
+    return ok
+
+def excluir(path: Path, id: str) -> bool:
+    mot = motor()
+    antes = mot.versao(path)
+    ok = mot.excluir(path, id)
+    if ok:
+        _notificar(path, mot, antes, removidos=[id])
+    return ok
+
+def obter_por_id(path: Path, id: str) -> dict | None:
+    return motor().obter_por_id(path, id)
+
+# --- CONSULTAS POR ÍNDICE ---
+
+def filtrar(path: Path, excluir: dict | None = None, busca: str = "", **criterios) -> list[dict]:
+    """
+    Registros com campo == valor (ou valor em uma tupla), comparando sem diferenciar
+    maiúsculas e espaços nas pontas. `excluir` tira os que batem com os critérios dados
+    e `busca` restringe aos que contêm o termo em algum campo de busca da coleção.
+    Ex.: filtrar(p, filial="02-Catanduva"), filtrar(p, excluir={"situacao": "INATIVO"}, busca="silva").
+    """
+    mot = motor()
+    permitidos = indice_busca.ids(indice_busca.obter(path, mot), busca) if busca.strip() else None
+    if _indices_nativos(mot):
+        regs = mot.filtrar(path, criterios, excluir)
+        return regs if permitidos is None else [r for r in regs if r.get("id") in permitidos]
+    # Os registros do índice são compartilhados entre as leituras: devolve cópias
+    return [dict(r) for r in indices.filtrar(indices.obter(path, mot), criterios, excluir, permitidos)]
+
+def contar(path: Path, excluir: dict | None = None, busca: str = "", **criterios) -> int:
+    mot = motor()
+    if busca.strip():
+        return len(filtrar(path, excluir, busca, **criterios))
+    if _indices_nativos(mot):
+        return mot.contar(path, criterios, excluir)
+    return indices.contar(indices.obter(path, mot), criterios, excluir)
+
+def contar_por(path: Path, campo: str, excluir: dict | None = None, **criterios) -> dict[str, int]:
+    """
+    Quantos registros há por valor de `campo` (normalizado como nos índices), entre os que
+    batem com os critérios. Com `campo` indexado sai direto do índice (ou de um GROUP BY).
+    Ex.: contar_por(p, "filial_id", excluir={"situacao": "INATIVO"}) -> {"01": 120, "02": 80}.
+    """
+    mot = motor()
+    if _indices_nativos(mot):
+        return mot.contar_por(path, campo, criterios, excluir)
+    return indices.contar_por(indices.obter(path, mot), campo, criterios, excluir)
+
+def _ordem(path: Path, ordem: str | None) -> tuple[str, bool] | None:
+    """"campo" ou "-campo" (decrescente); só vale para os CAMPOS registrados da coleção."""
+    if not ordem:
+        return None
+    campo = ordem.lstrip("-")
+    if campo not in colecoes.obter(path)["campos"]:
+        return None
+    return campo, ordem.startswith("-")
+
+def listar_pagina(path: Path, filtro: dict | None = None, ordem: str | None = None, offset: int = 0,
+                  limit: int = 50, excluir: dict | None = None, busca: str = "") -> tuple[list[dict], int]:
+    """
+    Uma página de filtrar(): (registros de offset a offset + limit, total que bate com o filtro).
+    `filtro` tem a mesma forma dos critérios de filtrar(); `ordem` é "campo" ou "-campo"
+    (padrão: ordem da coleção). Não copia nem monta a coleção inteira.
+    """
+    mot = motor()
+    permitidos = indice_busca.ids(indice_busca.obter(path, mot), busca) if busca.strip() else None
+    ordem = _ordem(path, ordem)
+    offset, limit = max(int(offset), 0), max(int(limit), 0)
+    if _indices_nativos(mot):
+        return mot.pagina(path, filtro or {}, excluir, permitidos, ordem, offset, limit)
+    janela, total = indices.pagina(indices.obter(path, mot), filtro or {}, excluir, permitidos, ordem, offset, limit)
+    return [dict(r) for r in janela], total
+
+def buscar(path: Path, termo: str, limite: int = 20) -> list[tuple[float, dict]]:
+    """Melhores registros para o termo, já ordenados por relevância: [(pontuação, registro)]."""
+    mot = motor()
+    achados = indice_busca.pontuar(indice_busca.obter(path, mot), termo, limite)
+    if _indices_nativos(mot):
+        por_id = lambda id: mot.obter_por_id(path, id)
+    else:
+        por_id = indices.obter(path, mot).registros.get  # evita varrer a lista a cada id
+    resultado = []
+    for nota, id in achados:
+        item = por_id(id)
+        if item:
+            resultado.append((nota, dict(item)))
+    return resultado
@@ -1,42 +1,124 @@
-
+# app/helpers/seguranca.py
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Optional
-from pathlib import Path
-from flask_login import LoginManager, UserMixin
+from collections import OrderedDict, deque
+from functools import lru_cache
+import hmac
+import threading
+import time
+
+from flask import current_app, has_app_context
 from werkzeug.security import generate_password_hash, check_password_hash
-import json
-
-login_manager = LoginManager()
-login_manager.login_view = "auth.login"
-
-@dataclass
-class Usuario(UserMixin):
-    id: str
-    nome: str
-    papel: str
-    senha_hash: str
-    def verificar_senha(self, s: str) -> bool: return check_password_hash(self.senha_hash, s)
-
-def _arquivo(app) -> Path:
-    return Path(app.config["DIRETORIO_DADOS"]) / "usuarios.json"
-
-def carregar(app) -> dict:
-    p = _arquivo(app)
-    if not p.exists():
-        base = {
-            "admin": {"login":"admin","nome":"Administrador TI","papel":"ti","senha_hash": generate_password_hash("admin123")},
-            "leitor": {"login":"leitor","nome":"Usuário Leitura","papel":"leitura","senha_hash": generate_password_hash("leitor123")},
-        }
-        p.write_text(json.dumps(base, ensure_ascii=False, indent=2), encoding="utf-8")
-    return json.loads(p.read_text(encoding="utf-8"))
-
-def obter(app, login: str) -> Optional[Usuario]:
-    d = carregar(app).get(login)
-    if not d: return None
-    return Usuario(id=d["login"], nome=d["nome"], papel=d["papel"], senha_hash=d["senha_hash"])
-
-def registrar_login_manager(app):
-    login_manager.init_app(app)
-    @login_manager.user_loader
-    def load(uid: str): return obter(app, uid)
+
+# --- SENHAS ---
+# O usuarios.json guarda só o hash da senha (campo senha_hash, no formato do
+# werkzeug "método$sal$hash", ex.: "scrypt:32768:8:1$..."). O algoritmo e o fator
+# de custo vêm de SENHA_METODO. Se ele mudar, os hashes antigos continuam valendo
+# e são refeitos com os parâmetros novos no próximo login certo de cada usuário
+# (precisa_rehash). Senhas ainda em texto (campo senha, do formato antigo) são
+# aceitas e convertidas no primeiro login de cada usuário; para converter o
+# arquivo inteiro de uma vez: `flask --app run migrar-senhas`
+# (blueprints/auth -> Usuario.migrar_senhas).
+METODO_PADRAO = "scrypt:32768:8:1"
+
+def metodo() -> str:
+    if has_app_context():
+        return current_app.config.get("SENHA_METODO") or METODO_PADRAO
+    return METODO_PADRAO
+
+@lru_cache(maxsize=8)
+def _normalizado(metodo_: str) -> str:
+    """Método como o werkzeug grava no hash ("scrypt" -> "scrypt:32768:8:1")."""
+    return generate_password_hash("", method=metodo_).split("$", 1)[0]
+
+@lru_cache(maxsize=8)
+def _hash_ficticio(metodo_: str) -> str:
+    return generate_password_hash("portal-ti", method=metodo_)
+
+def gerar_hash(senha: str, metodo_: str | None = None) -> str:
+    return generate_password_hash(senha, method=metodo_ or metodo())
+
+def verificar(cadastro: dict | None, senha: str) -> bool:
+    """Confere a senha com o cadastro. Login inexistente custa o mesmo que senha errada."""
+    if not cadastro:
+        check_password_hash(_hash_ficticio(metodo()), senha)
+        return False
+    if cadastro.get("senha_hash"):
+        return check_password_hash(cadastro["senha_hash"], senha)
+    if "senha" in cadastro:  # formato antigo, em texto
+        return hmac.compare_digest(str(cadastro["senha"]).encode(), senha.encode())
+    return False
+
+def precisa_rehash(cadastro: dict) -> bool:
+    """True se a senha está em texto ou foi gerada com outro método/fator de custo."""
+    h = cadastro.get("senha_hash")
+    return not h or h.split("$", 1)[0] != _normalizado(metodo())
+
+def medir(metodo_: str, segundos: float = 3.0) -> tuple[int, float]:
+    """(verificações, segundos) de um núcleo conferindo senhas com o método, por ~`segundos`."""
+    h = generate_password_hash("senha-de-teste", method=metodo_)
+    check_password_hash(h, "senha-de-teste")  # aquece
+    n, inicio = 0, time.perf_counter()
+    while True:
+        check_password_hash(h, "senha-de-teste")
+        n += 1
+        decorrido = time.perf_counter() - inicio
+        if decorrido >= segundos:
+            return n, decorrido
+
+# --- LIMITE DE TENTATIVAS DE LOGIN ---
+# Cada verificação de senha é cara de propósito, então rajadas de tentativas são
+# recusadas antes de calcular qualquer hash. Contam-se as tentativas dos últimos
+# LOGIN_JANELA_SEGUNDOS por login (LOGIN_MAX_TENTATIVAS) e por IP
+# (LOGIN_MAX_TENTATIVAS_IP, mais folgado: a filial inteira sai pelo mesmo IP).
+# A tentativa é registrada antes da verificação, para que requisições em paralelo
+# também contem; login certo zera o contador do login e devolve a vaga no do IP.
+# Fica só em memória, por processo, com no máximo MAX_CHAVES chaves (saem as
+# usadas há mais tempo).
+MAX_CHAVES = 10_000
+
+class Limitador:
+    def __init__(self, max_chaves: int = MAX_CHAVES):
+        self.max_chaves = max_chaves
+        self._tentativas: OrderedDict[tuple, deque] = OrderedDict()
+        self._trava = threading.Lock()
+
+    def _recentes(self, chave: tuple, desde: float) -> deque:
+        d = self._tentativas.get(chave)
+        if d is None:
+            d = self._tentativas[chave] = deque()
+        while d and d[0] <= desde:
+            d.popleft()
+        self._tentativas.move_to_end(chave)
+        return d
+
+    def tentar(self, login: str, ip: str | None) -> int:
+        """Registra uma tentativa. Devolve 0 se pode verificar a senha, ou quantos segundos esperar."""
+        cfg = current_app.config
+        janela = cfg["LOGIN_JANELA_SEGUNDOS"]
+        agora = time.monotonic()
+        limites = [(("login", login.lower()), cfg["LOGIN_MAX_TENTATIVAS"]),
+                   (("ip", ip or ""), cfg["LOGIN_MAX_TENTATIVAS_IP"])]
+        with self._trava:
+            filas = [(self._recentes(chave, agora - janela), maximo) for chave, maximo in limites]
+            espera = max((d[0] + janela - agora for d, maximo in filas if maximo and len(d) >= maximo),
+                         default=0)
+            if espera > 0:
+                return max(1, int(espera + 0.999))
+            for d, _ in filas:
+                d.append(agora)
+            while len(self._tentativas) > self.max_chaves:
+                self._tentativas.popitem(last=False)
+            return 0
+
+    def sucesso(self, login: str, ip: str | None) -> None:
+        with self._trava:
+            self._tentativas.pop(("login", login.lower()), None)
+            d = self._tentativas.get(("ip", ip or ""))
+            if d:
+                d.pop()
+
+    def limpar(self) -> None:
+        with self._trava:
+            self._tentativas.clear()
+
+limitador = Limitador()
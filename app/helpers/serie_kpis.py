@@ -0,0 +1,197 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+import csv, os, tempfile, threading, time
+
+from flask import current_app
+
+try:  # trava entre processos (só existe em sistemas Unix)
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from . import filiais, kpis
+
+# --- SÉRIE HISTÓRICA DOS KPIs ---
+# O painel só conhece o estado atual. Para as tendências, os KPIs são
+# fotografados em linhas compactas (data, métrica, dimensão, valor) acrescentadas
+# ao fim de dados/kpis_serie.csv. A fotografia é tirada depois de uma gravação
+# em uma das COLECOES (ver ao_gravar; no máximo uma vez a cada INTERVALO_SEGUNDOS
+# por processo) e pelo comando `flask --app run registrar-kpis`, que deve ser
+# agendado (cron) uma vez por dia para que dias sem gravação também tenham ponto.
+# A dimensão é o filial_id (helpers/filiais) ou "" para o total.
+# Vale o último valor de cada dia. Na primeira fotografia de um dia novo o
+# arquivo é compactado: fica um valor por dia nos últimos DIAS_DIARIOS dias, um
+# por semana até RETENCAO_DIAS e nada mais antigo. Acréscimos e compactação
+# passam pela trava de arquivo dados/kpis_serie.lock, então vários workers podem
+# gravar sem perder linhas. As consultas leem só essa série, guardada em memória
+# enquanto o arquivo não muda.
+ARQUIVO_SERIE = "kpis_serie.csv"
+ARQUIVO_TRAVA = "kpis_serie.lock"
+INTERVALO_SEGUNDOS = 3600
+DIAS_DIARIOS = 120
+RETENCAO_DIAS = 730
+SEM_FILIAL = "sem_filial"  # dimensão dos registros sem filial reconhecida ("" é o total)
+
+# Métricas gravadas: chave -> rótulo
+METRICAS = {
+    "licencas_ativas": "Licenças ativas",
+    "licencas_inativas": "Licenças inativas",
+    "equipamentos": "Equipamentos",
+    "cameras": "Câmeras",
+    "impressoras": "Impressoras",
+    "vpn_pendentes": "VPNs pendentes",
+    "estoque_perifericos": "Periféricos em estoque",
+    "estoque_baixo": "Itens com estoque baixo",
+}
+
+# Coleções cujas gravações mudam algum KPI da série
+COLECOES = {"licencas", "vpn", "equipamentos", "cameras", "impressoras",
+            "perifericos_estoque", "perifericos_entregas"}
+
+class _Serie:
+    def __init__(self, assinatura):
+        self.assinatura = assinatura
+        self.pontos: dict[tuple[str, str], dict[str, int]] = {}  # (métrica, dimensão) -> {data: valor}
+        self.ultima_data = ""
+
+    def adicionar(self, dia: str, metrica: str, dimensao: str, valor: int) -> None:
+        self.pontos.setdefault((metrica, dimensao), {})[dia] = valor
+        self.ultima_data = max(self.ultima_data, dia)
+
+_series: dict[str, _Serie] = {}
+_ultima_foto: dict[str, float] = {}
+_trava = threading.RLock()
+
+def caminho(pasta: str | Path | None = None) -> Path:
+    return Path(pasta or current_app.config["DIRETORIO_DADOS"]) / ARQUIVO_SERIE
+
+@contextmanager
+def _exclusivo(path: Path):
+    """Trava de arquivo para acrescentar à série e para compactá-la."""
+    if fcntl is None:
+        yield
+        return
+    with open(path.parent / ARQUIVO_TRAVA, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _assinatura(path: Path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _ler(path: Path) -> _Serie:
+    """Série do arquivo, relida só quando ele muda (inclusive por outro processo)."""
+    assinatura = _assinatura(path)
+    with _trava:
+        serie = _series.get(str(path))
+        if serie is not None and serie.assinatura == assinatura:
+            return serie
+        serie = _Serie(assinatura)
+        if assinatura is not None:
+            with open(path, newline="", encoding="utf-8") as f:
+                for linha in csv.reader(f):
+                    if len(linha) == 4 and linha[3].lstrip("-").isdigit():
+                        serie.adicionar(linha[0], linha[1], linha[2], int(linha[3]))
+        _series[str(path)] = serie
+        return serie
+
+def medir(kpis_painel: dict, pasta: str | Path | None = None) -> list[tuple[str, str, int]]:
+    """(métrica, dimensão, valor) do momento: totais do painel e contagens por filial."""
+    linhas = [
+        ("licencas_inativas", "", kpis_painel["lic_inativos"]),
+        ("estoque_perifericos", "", kpis_painel["total_perifericos_estoque"]),
+        ("estoque_baixo", "", kpis_painel["itens_estoque_baixo"]),
+    ]
+    totais = dict.fromkeys((i[0] for i in filiais.INDICADORES), 0)
+    for filial_id, contagens in filiais.resumo(pasta).items():
+        for indicador, n in contagens.items():
+            linhas.append((indicador, filial_id or SEM_FILIAL, n))
+            totais[indicador] += n
+    linhas.extend((indicador, "", n) for indicador, n in totais.items())
+    return linhas
+
+def registrar(pasta: str | Path | None = None, forcar: bool = False) -> int:
+    """
+    Acrescenta a fotografia de hoje, se a última deste processo tem mais de
+    INTERVALO_SEGUNDOS (ou com forcar=True). Devolve quantas linhas gravou.
+    """
+    path = caminho(pasta)
+    agora = time.monotonic()
+    with _trava:
+        ultima = _ultima_foto.get(str(path))
+        if not forcar and ultima is not None and agora - ultima < INTERVALO_SEGUNDOS:
+            return 0
+        _ultima_foto[str(path)] = agora
+        hoje = date.today().isoformat()
+        linhas = [(hoje, m, d, v) for m, d, v in medir(kpis.painel(path.parent), path.parent)]
+        with _exclusivo(path):
+            serie = _ler(path)  # sob a trava: inclui o que outro processo acabou de gravar
+            dia_novo = serie.ultima_data != hoje  # as fotografias repetidas de ontem podem ser compactadas
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows(linhas)
+            for linha in linhas:
+                serie.adicionar(*linha)
+            serie.assinatura = _assinatura(path)
+            if dia_novo:
+                _compactar(path, date.today())
+        return len(linhas)
+
+def ao_gravar(path: Path, versao_antes, versao_depois, gravados=(), removidos=()) -> None:
+    """Chamado pelo repositório depois de cada gravação (ver repositorio._derivados)."""
+    if Path(path).stem in COLECOES:
+        registrar(Path(path).parent)
+
+def compactar(pasta: str | Path | None = None, hoje: date | None = None) -> int:
+    """Reescreve o arquivo com um valor por dia/semana e sem o que passou da retenção."""
+    path = caminho(pasta)
+    with _trava, _exclusivo(path):
+        return _compactar(path, hoje or date.today())
+
+def _compactar(path: Path, hoje: date) -> int:
+    diario_desde = (hoje - timedelta(days=DIAS_DIARIOS)).isoformat()
+    guardar_desde = (hoje - timedelta(days=RETENCAO_DIAS)).isoformat()
+    serie = _ler(path)
+    if serie.assinatura is None:
+        return 0
+    linhas = []
+    for (metrica, dimensao), por_dia in serie.pontos.items():
+        semanas: dict[tuple, str] = {}
+        for dia in sorted(por_dia):
+            if dia < guardar_desde:
+                continue
+            if dia < diario_desde:
+                semanas[date.fromisoformat(dia).isocalendar()[:2]] = dia  # fica o último da semana
+            else:
+                linhas.append((dia, metrica, dimensao, por_dia[dia]))
+        linhas.extend((dia, metrica, dimensao, por_dia[dia]) for dia in semanas.values())
+    linhas.sort()
+    fd, tmp = tempfile.mkstemp(prefix=".kpis_serie-", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(linhas)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _series.pop(str(path), None)
+    return len(linhas)
+
+def tendencia(metrica: str, dimensao: str = "", dias: int = 90, pasta: str | Path | None = None) -> dict:
+    """{"labels": [datas], "data": [valores]} da métrica nos últimos `dias` dias."""
+    serie = _ler(caminho(pasta))
+    desde = (date.today() - timedelta(days=dias)).isoformat()
+    por_dia = serie.pontos.get((metrica, dimensao), {})
+    dias_serie = sorted(d for d in por_dia if d >= desde)
+    return {"labels": dias_serie, "data": [por_dia[d] for d in dias_serie]}
+
+def versao(pasta: str | Path | None = None):
+    """Muda sempre que a série muda (para ETag)."""
+    return _ler(caminho(pasta)).assinatura
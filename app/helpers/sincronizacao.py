@@ -0,0 +1,122 @@
+from __future__ import annotations
+from pathlib import Path
+import uuid
+
+from . import colecoes, repositorio as repo
+
+# --- IMPORTAÇÃO EM MODO SINCRONIZAR ---
+# No modo normal cada linha da planilha vira um registro novo, então reimportar o
+# export do mês duplica a coleção. Aqui cada linha é casada com o registro que já
+# existe pela chave natural da coleção (colecoes.registrar(..., chaves=...)):
+#   1. uma passada pela coleção monta {(chave, valor normalizado): id};
+#   2. uma passada pela planilha junta, por registro, os campos que as linhas
+#      trouxeram preenchidos (ou o registro inteiro, se a chave é nova);
+#   3. esses campos são aplicados sobre os registros e separados em inseridos /
+#      atualizados / sem alteração; quem não apareceu na planilha é "ausente" (e
+#      pode ser alterado, ex.: inativado);
+#   4. tudo o que mudou vai para o armazenamento numa única gravação (repo.gravar_lote).
+# Células vazias não apagam valores existentes: a planilha pode simplesmente não
+# ter aquela coluna. Linhas repetidas na planilha caem no mesmo registro.
+# A planilha chega sob demanda e pode levar minutos para ser lida; se a coleção
+# mudou nesse meio-tempo (edição pela web, outra importação), o passo 3 usa os
+# registros relidos no fim, e não a foto do começo: a edição não é sobrescrita
+# pelo valor antigo, registros excluídos não voltam e os cadastrados durante a
+# importação não contam como ausentes.
+
+def _texto(valor) -> str:
+    return "" if valor is None else str(valor).strip()
+
+def _chave(item: dict, campos: tuple[str, ...]) -> str | None:
+    """Valor normalizado da chave; None se algum dos campos estiver vazio."""
+    partes = [colecoes.chave_indice(item.get(c)) for c in campos]
+    return "\x1f".join(partes) if all(partes) else None
+
+def _assinatura(item: dict, campos) -> tuple:
+    return tuple(_texto(item.get(c)) for c in campos)
+
+def _por_id(path: Path) -> dict[str, dict]:
+    return {item["id"]: item for item in repo.listar(path) if item.get("id")}
+
+def sincronizar(path: Path, registros, validar=None, marcar_ausentes=None, padroes=None, ajustar=None) -> dict:
+    """
+    Aplica a planilha sobre a coleção casando pela chave natural.
+    `validar(item)` tem o mesmo papel do criar_lote; linhas sem nenhuma chave preenchida
+    também são ignoradas. `padroes` preenche os campos vazios só dos registros novos.
+    `ajustar(atual, novo)` (opcional) recebe cada registro alterado antes e depois da
+    planilha e devolve a versão a gravar. `marcar_ausentes(item)` (opcional) recebe cada
+    registro que não apareceu na planilha e devolve a versão a gravar, ou None para
+    deixá-lo como está.
+    Devolve {"inseridos", "atualizados", "inalterados", "ausentes", "marcados", "ignorados", "registros"}.
+    """
+    chaves = colecoes.obter(path)["chaves"]
+    if not chaves:
+        raise ValueError(f"A coleção {colecoes.nome_da_colecao(path)} não tem chave natural para sincronizar.")
+
+    versao = repo.versao(path)
+    atuais = _por_id(path)
+    por_chave: dict[tuple[int, str], str] = {}
+    for id, item in atuais.items():
+        for n, campos in enumerate(chaves):
+            valor = _chave(item, campos)
+            if valor is not None:
+                por_chave.setdefault((n, valor), id)
+
+    mudancas: dict[str, dict] = {}  # id -> campos da planilha (dos novos, o registro inteiro)
+    novos, vistos = set(), set()
+    ignorados = 0
+    for dados in registros:
+        if validar and not validar(dados):
+            ignorados += 1
+            continue
+        valores = [(n, v) for n, campos in enumerate(chaves) if (v := _chave(dados, campos)) is not None]
+        if not valores:
+            ignorados += 1
+            continue
+        id = next((por_chave[k] for k in valores if k in por_chave), None)
+        if id is None:
+            id = dados.get("id") or str(uuid.uuid4())
+            mudancas[id] = {c: v for c, v in dados.items() if c != "id"}
+            novos.add(id)
+        else:
+            preenchidos = {c: v for c, v in dados.items() if c != "id" and _texto(v)}
+            mudancas[id] = {**mudancas.get(id, {}), **preenchidos}
+        vistos.add(id)
+        for k in valores:
+            por_chave.setdefault(k, id)
+
+    ausentes_ids = [id for id in atuais if id not in vistos]
+    if repo.versao(path) != versao:
+        atuais = _por_id(path)  # a coleção mudou enquanto a planilha era lida
+
+    gravar: dict[str, dict] = {}  # id -> registro final (novos e alterados)
+    inalterados = 0
+    for id, campos in mudancas.items():
+        if id in novos:
+            vazios = {c: v for c, v in (padroes or {}).items() if not _texto(campos.get(c))}
+            gravar[id] = {**campos, **vazios, "id": id}
+            continue
+        atual = atuais.get(id)
+        if atual is None:
+            continue  # excluído durante a importação
+        if _assinatura(atual, campos) == _assinatura(campos, campos):
+            inalterados += 1
+            continue
+        novo = {**atual, **campos, "id": id}
+        gravar[id] = ajustar(atual, novo) if ajustar else novo
+    atualizados = len(gravar) - len(novos)
+
+    ausentes = marcados = 0
+    for id in ausentes_ids:
+        item = atuais.get(id)
+        if item is None:
+            continue
+        ausentes += 1
+        novo = marcar_ausentes(item) if marcar_ausentes else None
+        if novo is not None:
+            gravar[id] = {**novo, "id": id}
+            marcados += 1
+
+    itens = list(gravar.values())
+    repo.gravar_lote(path, itens)
+    return {"inseridos": len(novos), "atualizados": atualizados, "inalterados": inalterados,
+            "ausentes": ausentes, "marcados": marcados, "ignorados": ignorados, "registros": itens}
@@ -0,0 +1,74 @@
+from __future__ import annotations
+import hashlib, os, shutil, tempfile
+
+from flask import Request, current_app, has_app_context
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# --- UPLOADS ---
+# O Werkzeug grava cada arquivo enviado num stream criado por
+# Request._get_file_stream. Aqui esse stream é um ArquivoRecebido: fica em
+# memória até EM_MEMORIA_ATE e depois vai para um arquivo temporário, calcula o
+# SHA-256 enquanto os bytes chegam e recusa (413) o que passar de
+# IMPORTACAO_MAX_BYTES sem ler o resto. A importação em segundo plano fica com
+# o próprio stream (receber): não há segunda cópia do arquivo nem releitura
+# para calcular o hash.
+EM_MEMORIA_ATE = 1024 * 1024
+BLOCO = 1024 * 1024
+
+class ArquivoRecebido(tempfile.SpooledTemporaryFile):
+    def __init__(self, limite_bytes: int | None = None):
+        super().__init__(max_size=EM_MEMORIA_ATE, mode="w+b")
+        self.limite_bytes = limite_bytes
+        self.tamanho = 0
+        self._hash = hashlib.sha256()
+        self._entregue = False
+
+    def write(self, dados) -> int:
+        self.tamanho += len(dados)
+        if self.limite_bytes and self.tamanho > self.limite_bytes:
+            raise RequestEntityTooLarge()
+        self._hash.update(dados)
+        return super().write(dados)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def close(self) -> None:
+        # Depois de entregue a um job, o fim da requisição não fecha o arquivo: quem fecha é o job
+        if not self._entregue:
+            super().close()
+
+    def fechar(self) -> None:
+        self._entregue = False
+        self.close()
+
+def _limite() -> int | None:
+    return current_app.config.get("IMPORTACAO_MAX_BYTES") if has_app_context() else None
+
+class Requisicao(Request):
+    """Request da aplicação (app.request_class): uploads vão direto para um ArquivoRecebido."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return ArquivoRecebido(_limite())
+
+def receber(arq) -> ArquivoRecebido:
+    """
+    Fica com o arquivo enviado (`arq` = FileStorage), já posicionado no início, para
+    ser lido depois do fim da requisição; chamar .fechar() ao terminar.
+    """
+    stream = arq.stream
+    if not isinstance(stream, ArquivoRecebido):  # ex.: app sem a Requisicao acima
+        stream = ArquivoRecebido(_limite())
+        shutil.copyfileobj(arq.stream, stream, BLOCO)
+    stream._entregue = True
+    stream.seek(0)
+    return stream
+
+def copiar_para_disco(arquivo: ArquivoRecebido, sufixo: str = "") -> str:
+    """Cópia com nome no disco, para outro processo abrir pelo caminho; quem chama apaga."""
+    fd, caminho = tempfile.mkstemp(prefix="importacao-", suffix=sufixo)
+    with os.fdopen(fd, "wb") as destino:
+        arquivo.seek(0)
+        shutil.copyfileobj(arquivo, destino, BLOCO)
+    arquivo.seek(0)
+    return caminho
@@ -9,7 +9,11 @@ sys.path.insert(0, str(project_root))
 
 from app import criar_app
 
-app = criar_app()
+# Com `python run.py`, os processos da importação em lote ("spawn", ver
+# helpers/importacoes) reimportam este arquivo como __mp_main__; eles só precisam
+# de helpers/importador e não devem refazer a subida do app.
+if __name__ != '__mp_main__':
+    app = criar_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,39 @@
+# tests/conftest.py
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Deixa o pacote "app" importável rodando o pytest de qualquer pasta
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import criar_app  # noqa: E402
+from app.helpers import seguranca  # noqa: E402
+
+USUARIOS = [
+    {"id": "1", "login": "admin", "senha": "admin123", "nome": "Administrador TI", "papel": "ti"},
+    {"id": "2", "login": "leitor", "senha": "leitor123", "nome": "Leitor", "papel": "leitura"},
+]
+
+@pytest.fixture
+def aplicacao(tmp_path, monkeypatch):
+    """App com uma pasta de dados vazia (só os usuários), importações na própria requisição."""
+    dados = tmp_path / "dados"
+    dados.mkdir()
+    (dados / "usuarios.json").write_text(json.dumps(USUARIOS), encoding="utf-8")
+    monkeypatch.setenv("PORTAL_DIRETORIO_DADOS", str(dados))
+    monkeypatch.setenv("PORTAL_EXPORTACAO_CACHE_DIR", str(tmp_path / "exportacoes"))
+    monkeypatch.setenv("PORTAL_SENHA_METODO", "pbkdf2:sha256:1000")  # hash barato nos testes
+    app = criar_app()
+    app.config.update(TESTING=True, IMPORTACAO_EM_SEGUNDO_PLANO=False, IMPORTACAO_PROCESSOS=0)
+    yield app
+    seguranca.limitador.limpar()
+
+@pytest.fixture
+def cliente(aplicacao):
+    """Cliente de teste já logado como TI."""
+    c = aplicacao.test_client()
+    assert c.post("/auth/login", data={"login": "admin", "senha": "admin123"}).status_code == 302
+    return c
@@ -0,0 +1,179 @@
+# tests/test_armazenamento_journal.py
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+from app.helpers import armazenamento_journal as journal
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+@pytest.fixture
+def colecao(tmp_path):
+    yield tmp_path / "teste.json"
+    journal._colecoes.clear()
+
+def _reabrir():
+    """Esquece o estado em memória, como um processo que acabou de subir."""
+    journal._colecoes.clear()
+
+def _outro_processo(path: Path, codigo: str) -> None:
+    """Roda `codigo` num processo Python separado, com `journal` e `path` definidos."""
+    script = ("from pathlib import Path\n"
+              "from app.helpers import armazenamento_journal as journal\n"
+              f"path = Path({str(path)!r})\n" + textwrap.dedent(codigo))
+    subprocess.run([sys.executable, "-c", script], cwd=RAIZ, check=True,
+                   env={**os.environ, "PYTHONPATH": str(RAIZ)})
+
+def _por_id(path: Path) -> dict:
+    return {it["id"]: it for it in journal.listar(path)}
+
+def test_ida_e_volta(colecao):
+    a = journal.criar(colecao, {"nome": "Ana", "filial": "02-Catanduva"})
+    b = journal.criar(colecao, {"id": "fixo", "nome": "Bruno", "qtd": 3})
+    assert [it["id"] for it in journal.listar(colecao)] == [a["id"], "fixo"]
+    assert journal.obter_por_id(colecao, "fixo") == {"id": "fixo", "nome": "Bruno", "qtd": 3}
+
+    copia = journal.obter_por_id(colecao, a["id"])
+    copia["nome"] = "alterado fora do motor"
+    assert journal.obter_por_id(colecao, a["id"])["nome"] == "Ana"
+
+    antes = journal.versao(colecao)
+    assert journal.atualizar(colecao, b["id"], {"nome": "Bruno S."})  # substitui o registro inteiro
+    assert journal.versao(colecao) != antes
+    assert journal.obter_por_id(colecao, "fixo") == {"id": "fixo", "nome": "Bruno S."}
+    assert not journal.atualizar(colecao, "nao-existe", {"nome": "x"})
+
+    assert journal.excluir(colecao, a["id"])
+    assert not journal.excluir(colecao, a["id"])
+    estado = _por_id(colecao)
+
+    _reabrir()
+    assert _por_id(colecao) == estado == {"fixo": {"id": "fixo", "nome": "Bruno S."}}
+
+def test_alterar_o_resultado_de_listar_nao_mexe_no_estado(colecao):
+    journal.criar(colecao, {"id": "1", "nome": "Ana"})
+    itens = journal.listar(colecao)
+    itens[0]["nome"] = "alterado fora do motor"
+    assert journal.listar(colecao) == [{"id": "1", "nome": "Ana"}]
+
+def test_criar_lote_e_gravar_lote(colecao):
+    res = journal.criar_lote(colecao, iter([{"nome": "A"}, {"nome": ""}, {"nome": "B"}]),
+                             validar=lambda it: it["nome"])
+    assert (res["inseridos"], res["ignorados"]) == (2, 1)
+    a, b = res["registros"]
+
+    journal.gravar_lote(colecao, [{**a, "nome": "A2"}, {"id": "novo", "nome": "C"}])
+    _reabrir()
+    assert [(it["id"], it["nome"]) for it in journal.listar(colecao)] == [(a["id"], "A2"), (b["id"], "B"), ("novo", "C")]
+
+def test_json_legado_vira_snapshot(colecao):
+    colecao.write_text(json.dumps([{"id": "1", "nome": "Ana"}, {"nome": "Sem id"}]), encoding="utf-8")
+    original = colecao.read_bytes()
+
+    itens = journal.listar(colecao)
+    assert [it["nome"] for it in itens] == ["Ana", "Sem id"]
+    assert itens[0]["id"] == "1" and itens[1]["id"]
+    assert colecao.read_bytes() == original  # o JSON antigo não é mexido
+
+    journal.criar(colecao, {"nome": "Nova"})
+    _reabrir()
+    assert len(journal.listar(colecao)) == 3
+
+def test_linha_quebrada_no_fim_do_log(colecao):
+    journal.criar(colecao, {"id": "1", "nome": "Ana"})
+    col = journal._abrir(colecao)
+    with open(col.log, "ab") as f:
+        f.write(b'{"op": "put", "id": "2", "dados": {"id": "2", "no')  # queda no meio da gravação
+
+    _reabrir()
+    assert list(_por_id(colecao)) == ["1"]
+    journal.criar(colecao, {"id": "3", "nome": "Carla"})
+
+    _reabrir()
+    assert list(_por_id(colecao)) == ["1", "3"]
+
+def test_compactar_mantem_o_estado(colecao):
+    for i in range(50):
+        journal.criar(colecao, {"id": str(i), "nome": f"Pessoa {i}"})
+    for i in range(0, 50, 2):
+        journal.excluir(colecao, str(i))
+    journal.atualizar(colecao, "1", {"nome": "Um"})
+    estado = _por_id(colecao)
+
+    journal.compactar(colecao)
+    col = journal._abrir(colecao)
+    assert col.log.stat().st_size == 0
+    assert {it["id"] for it in json.loads(col.snapshot.read_text(encoding="utf-8"))} == set(estado)
+
+    _reabrir()
+    assert _por_id(colecao) == estado
+
+def test_compactacao_em_segundo_plano(colecao, monkeypatch):
+    monkeypatch.setattr(journal, "COMPACTAR_MIN_BYTES", 2048)
+    for i in range(100):
+        journal.criar(colecao, {"id": str(i), "nome": f"Pessoa {i}", "obs": "x" * 50})
+    col = journal._abrir(colecao)
+    limite = time.monotonic() + 10
+    while col.compactando and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert json.loads(col.snapshot.read_text(encoding="utf-8"))  # compactou pelo menos uma vez
+    estado = _por_id(colecao)
+    assert len(estado) == 100
+
+    _reabrir()
+    assert _por_id(colecao) == estado
+
+def test_le_gravacoes_de_outro_processo(colecao):
+    journal.criar(colecao, {"id": "1", "nome": "Ana"})
+    antes = journal.versao(colecao)
+
+    _outro_processo(colecao, """
+        journal.criar(path, {"id": "2", "nome": "Bruno"})
+        journal.atualizar(path, "1", {"nome": "Ana Maria"})
+    """)
+    assert journal.versao(colecao) != antes
+    assert _por_id(colecao) == {"1": {"id": "1", "nome": "Ana Maria"}, "2": {"id": "2", "nome": "Bruno"}}
+
+def test_reaplica_o_log_depois_que_outro_processo_compacta(colecao):
+    for i in range(10):
+        journal.criar(colecao, {"id": str(i), "nome": f"Pessoa {i}"})
+    assert journal._abrir(colecao).offset > 0
+
+    # O outro processo grava, compacta (snapshot e log novos) e grava de novo
+    _outro_processo(colecao, """
+        journal.excluir(path, "0")
+        journal.criar(path, {"id": "10", "nome": "Pessoa 10"})
+        journal.compactar(path)
+        journal.atualizar(path, "5", {"nome": "Cinco"})
+        journal.criar(path, {"id": "11", "nome": "Pessoa 11"})
+    """)
+    esperado = {str(i): {"id": str(i), "nome": f"Pessoa {i}"} for i in range(1, 12)}
+    esperado["5"] = {"id": "5", "nome": "Cinco"}
+    assert _por_id(colecao) == esperado
+
+    # E a próxima gravação deste processo vai para o log novo, sem perder nada
+    journal.criar(colecao, {"id": "12", "nome": "Pessoa 12"})
+    esperado["12"] = {"id": "12", "nome": "Pessoa 12"}
+    assert _por_id(colecao) == esperado
+    _reabrir()
+    assert _por_id(colecao) == esperado
+
+def test_outro_processo_le_o_que_este_compactou(colecao):
+    for i in range(5):
+        journal.criar(colecao, {"id": str(i), "nome": f"Pessoa {i}"})
+    journal.compactar(colecao)
+    journal.excluir(colecao, "4")
+
+    saida = colecao.parent / "saida.json"
+    _outro_processo(colecao, f"""
+        import json
+        Path({str(saida)!r}).write_text(json.dumps(sorted(it["id"] for it in journal.listar(path))))
+    """)
+    assert json.loads(saida.read_text()) == ["0", "1", "2", "3"]
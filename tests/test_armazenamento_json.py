@@ -0,0 +1,40 @@
+# tests/test_armazenamento_json.py
+
+import json
+
+import pytest
+
+from app.helpers import armazenamento_json
+
+@pytest.fixture
+def colecao(tmp_path):
+    yield tmp_path / "teste.json"
+    armazenamento_json.limpar_cache()
+
+def test_ida_e_volta(colecao):
+    a = armazenamento_json.criar(colecao, {"nome": "Ana", "filial": "02-Catanduva"})
+    armazenamento_json.gravar_lote(colecao, [{**a, "nome": "Ana Maria"}, {"id": "fixo", "nome": "Bruno"}])
+    assert armazenamento_json.atualizar(colecao, "fixo", {"nome": "Bruno S."})
+    assert not armazenamento_json.atualizar(colecao, "nao-existe", {"nome": "x"})
+    esperado = [{"id": a["id"], "nome": "Ana Maria", "filial": "02-Catanduva"}, {"id": "fixo", "nome": "Bruno S."}]
+    assert armazenamento_json.listar(colecao) == esperado
+    assert json.loads(colecao.read_text(encoding="utf-8")) == esperado
+
+    assert armazenamento_json.excluir(colecao, a["id"])
+    assert not armazenamento_json.excluir(colecao, a["id"])
+    armazenamento_json.limpar_cache()
+    assert armazenamento_json.listar(colecao) == [{"id": "fixo", "nome": "Bruno S."}]
+
+def test_alterar_o_resultado_de_listar_nao_mexe_no_cache(colecao):
+    armazenamento_json.criar(colecao, {"id": "1", "nome": "Ana"})
+    armazenamento_json.listar(colecao)  # deixa a coleção no cache
+    itens = armazenamento_json.listar(colecao)
+    itens[0]["nome"] = "alterado fora do motor"
+    itens.append({"id": "2"})
+    assert armazenamento_json.listar(colecao) == [{"id": "1", "nome": "Ana"}]
+    assert armazenamento_json.estatisticas_cache()["hits"] >= 2
+
+def test_le_de_novo_quando_outro_processo_grava(colecao):
+    armazenamento_json.criar(colecao, {"id": "1", "nome": "Ana"})
+    colecao.write_text(json.dumps([{"id": "1", "nome": "Ana"}, {"id": "2", "nome": "Bruno"}]), encoding="utf-8")
+    assert [it["id"] for it in armazenamento_json.listar(colecao)] == ["1", "2"]
@@ -0,0 +1,142 @@
+# tests/test_armazenamento_sqlite.py
+
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from app.helpers import armazenamento_sqlite as sqlite, colecoes
+
+DADOS = Path(__file__).resolve().parents[1] / "dados"
+
+@pytest.fixture
+def colecao(tmp_path):
+    colecoes.registrar("teste", ["nome", "filial", "situacao", "qtd"], indices=("filial", "situacao"))
+    yield tmp_path / "teste.json"
+    colecoes.COLECOES.pop("teste", None)
+    _fechar(tmp_path)
+
+def _fechar(pasta: Path) -> None:
+    """Fecha as conexões desta thread com o banco da pasta (o tmp_path some depois do teste)."""
+    con = getattr(sqlite._local, "conexoes", {}).pop(str(pasta / sqlite.ARQUIVO_BANCO), None)
+    if con is not None:
+        con.close()
+
+def _total(path: Path) -> int:
+    con, tabela, _ = sqlite._preparar(path)
+    return con.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()[0]
+
+def test_ida_e_volta(colecao):
+    a = sqlite.criar(colecao, {"nome": "Ana", "filial": "02-Catanduva", "situacao": "ATIVO"})
+    # Valores que não são texto e campos fora dos CAMPOS passam pela coluna extras
+    b = {"id": "fixo", "nome": "Bruno", "qtd": 3, "tags": ["a", "b"], "obs": None, "ativo": True}
+    sqlite.criar(colecao, b)
+    assert [it["id"] for it in sqlite.listar(colecao)] == [a["id"], "fixo"]
+    assert sqlite.obter_por_id(colecao, a["id"]) == a
+    assert sqlite.obter_por_id(colecao, "fixo") == b
+    assert sqlite.obter_por_id(colecao, "nao-existe") is None
+
+    v = sqlite.versao(colecao)
+    assert sqlite.atualizar(colecao, "fixo", {"nome": "Bruno S.", "filial": "03-Barretos"})  # substitui tudo
+    assert sqlite.versao(colecao)[2] == v[2] + 1
+    assert sqlite.obter_por_id(colecao, "fixo") == {"id": "fixo", "nome": "Bruno S.", "filial": "03-Barretos"}
+    assert not sqlite.atualizar(colecao, "nao-existe", {"nome": "x"})
+    assert sqlite.versao(colecao)[2] == v[2] + 1
+
+    assert sqlite.excluir(colecao, a["id"])
+    assert not sqlite.excluir(colecao, a["id"])
+    assert sqlite.versao(colecao)[2] == v[2] + 2
+    assert sqlite.listar(colecao) == [{"id": "fixo", "nome": "Bruno S.", "filial": "03-Barretos"}]
+
+def test_criar_lote_e_gravar_lote(colecao, monkeypatch):
+    monkeypatch.setattr(sqlite, "TAMANHO_LOTE", 7)
+    res = sqlite.criar_lote(colecao, ({"nome": f"P{i}", "qtd": i} for i in range(30)),
+                            validar=lambda it: it["qtd"] % 3)
+    assert (res["inseridos"], res["ignorados"]) == (20, 10)
+    assert sqlite.listar(colecao) == res["registros"]
+
+    primeiro = res["registros"][0]
+    sqlite.gravar_lote(colecao, [{**primeiro, "nome": "Alterado"}, {"id": "novo", "nome": "Novo"}])
+    itens = sqlite.listar(colecao)
+    assert len(itens) == 21
+    assert itens[0] == {**primeiro, "nome": "Alterado"}  # atualizado no lugar, mantém a ordem
+    assert itens[-1] == {"id": "novo", "nome": "Novo"}
+
+def test_criar_lote_com_erro_nao_grava_nada(colecao):
+    def registros():
+        yield {"nome": "A"}
+        raise RuntimeError("planilha quebrada")
+
+    with pytest.raises(RuntimeError):
+        sqlite.criar_lote(colecao, registros())
+    assert sqlite.listar(colecao) == []
+
+def test_consultas_por_indice(colecao):
+    sqlite.gravar_lote(colecao, [
+        {"id": "1", "nome": "Ana", "filial": "02-Catanduva", "situacao": "ATIVO"},
+        {"id": "2", "nome": "Bruno", "filial": " 02-catanduva ", "situacao": "INATIVO"},
+        {"id": "3", "nome": "Carla", "filial": "03-Barretos", "situacao": "ativo"},
+        {"id": "4", "nome": "Davi", "filial": "03-Barretos"},
+    ])
+    ids = lambda itens: [it["id"] for it in itens]
+
+    assert ids(sqlite.filtrar(colecao, {"filial": "02-CATANDUVA"})) == ["1", "2"]
+    assert ids(sqlite.filtrar(colecao, {"situacao": "ATIVO"}, excluir={"filial": "02-Catanduva"})) == ["3"]
+    assert ids(sqlite.filtrar(colecao, {"nome": ["ana", "davi"]})) == ["1", "4"]  # campo sem índice
+    assert sqlite.contar(colecao, {"situacao": ["ATIVO", "INATIVO"]}) == 3
+    assert sqlite.contar(colecao, {}, excluir={"nome": "Ana"}) == 3
+    assert sqlite.contar_por(colecao, "situacao", {}) == {"ATIVO": 2, "INATIVO": 1, "": 1}
+    assert sqlite.contar_por(colecao, "nome", {"filial": "03-Barretos"}) == {"CARLA": 1, "DAVI": 1}
+
+    assert sqlite.pagina(colecao, {}, ordem=("nome", True), offset=1, limit=2) == (
+        [sqlite.obter_por_id(colecao, "3"), sqlite.obter_por_id(colecao, "2")], 4)
+    janela, total = sqlite.pagina(colecao, {"filial": "03-Barretos"}, permitidos={"3", "4"}, offset=1)
+    assert (ids(janela), total) == (["4"], 2)
+
+def test_iterar_json_em_blocos_pequenos(tmp_path):
+    itens = [{"id": str(i), "nome": f"José {i}", "obs": "vírgula, ] e [ no texto", "n": i} for i in range(50)]
+    arquivo = tmp_path / "teste.json"
+    arquivo.write_text(json.dumps(itens, ensure_ascii=False, indent=2), encoding="utf-8")
+    for tamanho in (1, 7, 64 * 1024):
+        assert list(sqlite._iterar_json(arquivo, tamanho)) == itens
+    arquivo.write_text("[]", encoding="utf-8")
+    assert list(sqlite._iterar_json(arquivo, 1)) == []
+
+def test_migrar_de_json(colecao, monkeypatch):
+    monkeypatch.setattr(sqlite, "TAMANHO_LOTE", 100)
+    pasta = colecao.parent
+    itens = [{"id": str(i), "nome": f"Pessoa {i}", "filial": "02-Catanduva", "qtd": i} for i in range(250)]
+    itens += [{"nome": "Sem id"}, {"id": "", "nome": "Id vazio"}]
+    colecao.write_text(json.dumps(itens), encoding="utf-8")
+    (pasta / "vazia.json").write_text("[]", encoding="utf-8")
+    (pasta / "usuarios.json").write_text(json.dumps([{"id": "u", "login": "admin"}]), encoding="utf-8")
+
+    assert sqlite.migrar_de_json(pasta) == {"teste": 252, "vazia": 0}
+    assert _total(colecao) == 252
+    migrados = {it["id"]: it for it in sqlite.listar(colecao)}
+    assert all(migrados[str(i)] == itens[i] for i in range(250))
+    assert sqlite.contar(colecao, {"filial": "02-catanduva"}) == 250
+    assert sqlite.versao(colecao)[2] == 1
+    assert not sqlite._preparar(pasta / "usuarios.json")[0].execute(
+        'SELECT 1 FROM "usuarios" LIMIT 1').fetchone()
+
+    # Coleção que já tem linhas é pulada; substituir=True apaga e copia de novo
+    sqlite.criar(colecao, {"nome": "Criado depois"})
+    assert sqlite.migrar_de_json(pasta) == {"vazia": 0}
+    assert _total(colecao) == 253
+    assert sqlite.migrar_de_json(pasta, substituir=True) == {"teste": 252, "vazia": 0}
+    assert _total(colecao) == 252
+
+def test_migrar_os_dados_do_repositorio(tmp_path):
+    for arquivo in DADOS.glob("*.json"):
+        shutil.copy(arquivo, tmp_path / arquivo.name)
+    try:
+        resultado = sqlite.migrar_de_json(tmp_path)
+        assert resultado
+        for stem, total in resultado.items():
+            arquivo = tmp_path / f"{stem}.json"
+            esperado = len(json.loads(arquivo.read_text(encoding="utf-8")))
+            assert total == esperado == _total(arquivo), stem
+    finally:
+        _fechar(tmp_path)
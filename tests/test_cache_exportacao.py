@@ -0,0 +1,109 @@
+# tests/test_cache_exportacao.py
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from app.helpers import cache_exportacao, repositorio as repo
+
+@pytest.fixture
+def equipamentos(aplicacao):
+    path = Path(aplicacao.config["DIRETORIO_DADOS"]) / "equipamentos.json"
+    with aplicacao.app_context():
+        repo.gravar_lote(path, [
+            {"id": "1", "nome": "Ana", "tipo": "Notebook", "numero_serie": "SN-1", "filial": "02-Catanduva"},
+            {"id": "2", "nome": "Bruno", "tipo": "Desktop", "numero_serie": "SN-2", "filial": "14-Franca"},
+        ])
+    return path
+
+def _no_cache(aplicacao, colecao: str = "equipamentos") -> list[Path]:
+    return sorted(Path(aplicacao.config["EXPORTACAO_CACHE_DIR"]).glob(f"{colecao}-*"))
+
+def _exportar(cliente, **cabecalhos):
+    # buffered: o CSV sai em streaming e só é publicado no cache depois de todo enviado
+    return cliente.get("/equipamentos/exportar?formato=csv", headers=cabecalhos, buffered=True)
+
+def test_segunda_exportacao_sai_do_cache(aplicacao, cliente, equipamentos):
+    primeira = _exportar(cliente)
+    assert primeira.status_code == 200 and primeira.get_etag()[0]
+    assert "SN-2" in primeira.get_data(as_text=True)
+    [arquivo] = _no_cache(aplicacao)
+    assert arquivo.read_bytes() == primeira.get_data()
+
+    segunda = _exportar(cliente)
+    assert segunda.get_etag() == primeira.get_etag()
+    assert segunda.get_data() == primeira.get_data()
+    assert segunda.content_length == len(primeira.get_data())
+
+def test_if_none_match_responde_304(cliente, equipamentos):
+    etag = _exportar(cliente).get_etag()[0]
+    resp = _exportar(cliente, **{"If-None-Match": f'"{etag}"'})
+    assert resp.status_code == 304
+    assert resp.get_data() == b""
+
+def test_gravacao_na_colecao_invalida_o_cache(aplicacao, cliente, equipamentos):
+    antes = _exportar(cliente)
+    with aplicacao.app_context():
+        repo.criar(equipamentos.parent / "cameras.json", {"nome": "Portaria"})
+        assert len(_no_cache(aplicacao)) == 1  # outra coleção não mexe nas exportações desta
+        repo.criar(equipamentos, {"nome": "Carla", "tipo": "Monitor", "numero_serie": "SN-3"})
+        assert _no_cache(aplicacao) == []
+
+    depois = _exportar(cliente, **{"If-None-Match": f'"{antes.get_etag()[0]}"'})
+    assert depois.status_code == 200
+    assert depois.get_etag() != antes.get_etag()
+    assert "SN-3" in depois.get_data(as_text=True)
+
+def test_gravacao_de_outro_processo_muda_a_chave(aplicacao, cliente, equipamentos):
+    antes = _exportar(cliente)
+    registros = json.loads(equipamentos.read_text(encoding="utf-8"))
+    registros.append({"id": "3", "nome": "Carla", "numero_serie": "SN-3"})
+    equipamentos.write_text(json.dumps(registros), encoding="utf-8")  # sem passar pelo repositorio
+
+    depois = _exportar(cliente)
+    assert depois.get_etag() != antes.get_etag()
+    assert "SN-3" in depois.get_data(as_text=True)
+
+def test_filtros_e_formato_entram_na_chave(cliente, equipamentos):
+    todos = _exportar(cliente)
+    franca = cliente.get("/equipamentos/exportar?formato=csv&filial=14-Franca")
+    assert franca.get_etag() != todos.get_etag()
+    assert "SN-1" not in franca.get_data(as_text=True)
+    xlsx = cliente.get("/equipamentos/exportar")
+    assert xlsx.status_code == 200 and xlsx.get_etag() not in (todos.get_etag(), franca.get_etag())
+    assert xlsx.get_data()[:2] == b"PK"
+
+def test_arquivo_apagado_do_cache_e_gerado_de_novo(aplicacao, cliente, equipamentos):
+    primeira = _exportar(cliente)
+    for arquivo in _no_cache(aplicacao):
+        arquivo.unlink()
+    segunda = _exportar(cliente)
+    assert segunda.status_code == 200
+    assert segunda.get_data() == primeira.get_data()
+    assert len(_no_cache(aplicacao)) == 1
+
+def test_download_interrompido_ou_desatualizado_nao_fica_no_cache(aplicacao):
+    pedacos = cache_exportacao.gravar_enquanto_envia(iter([b"a", b"b"]), "equipamentos", "k1", ".csv", lambda: True)
+    next(pedacos)
+    pedacos.close()  # cliente desistiu no meio
+    assert list(cache_exportacao.gravar_enquanto_envia(iter([b"a"]), "equipamentos", "k2", ".csv",
+                                                       lambda: False)) == [b"a"]
+    pasta = Path(aplicacao.config["EXPORTACAO_CACHE_DIR"])
+    assert list(pasta.iterdir()) == []
+
+def test_poda_tira_primeiro_o_menos_usado(aplicacao):
+    cache_exportacao.configurar(aplicacao.config["EXPORTACAO_CACHE_DIR"], 25)
+    for i, chave in enumerate(("a", "b", "c")):
+        tmp = cache_exportacao.temporario()
+        tmp.write_bytes(b"x" * 10)
+        os.utime(tmp, (1000 + i, 1000 + i))
+        cache_exportacao.publicar(tmp, "cameras", chave, ".csv")
+        os.utime(cache_exportacao._arquivo("cameras", chave, ".csv"), (1000 + i, 1000 + i))
+    assert not cache_exportacao._arquivo("cameras", "a", ".csv").exists()
+    cache_exportacao.obter("cameras", "b", ".csv").close()  # usado agora
+    tmp = cache_exportacao.temporario()
+    tmp.write_bytes(b"x" * 10)
+    cache_exportacao.publicar(tmp, "cameras", "d", ".csv")
+    assert [p.name for p in _no_cache(aplicacao, "cameras")] == ["cameras-b.csv", "cameras-d.csv"]
@@ -0,0 +1,129 @@
+# tests/test_importacoes.py
+
+import io
+import json
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.helpers import importacoes
+
+@pytest.fixture(autouse=True)
+def _sem_jobs_em_memoria():
+    yield
+    importacoes._jobs.clear()
+
+def _csv(*nomes: str) -> bytes:
+    linhas = ["nome;email"] + [f"{n};{n.lower()}@x.com" for n in nomes]
+    return ("\r\n".join(linhas) + "\r\n").encode("utf-8")
+
+def _importar(cliente, conteudo: bytes, nome: str = "licencas.csv", **campos) -> str:
+    """Envia a planilha para /licencas/importar e devolve o id do job."""
+    resp = cliente.post("/licencas/importar", data={"arquivo": (io.BytesIO(conteudo), nome), **campos},
+                        content_type="multipart/form-data")
+    assert resp.status_code == 302
+    return parse_qs(urlsplit(resp.location).query)["job"][0]
+
+def _espelho(aplicacao) -> dict[str, dict]:
+    arquivo = Path(aplicacao.config["DIRETORIO_DADOS"]) / importacoes.ARQUIVO_JOBS
+    return {it["id"]: it for it in json.loads(arquivo.read_text(encoding="utf-8"))}
+
+def test_job_concluido_fica_no_espelho_em_disco(aplicacao, cliente):
+    job_id = _importar(cliente, _csv("Ana", "Bruno"))
+    job = cliente.get(f"/importacoes/{job_id}").get_json()
+    assert (job["estado"], job["lidos"], job["gravados"], job["colecao"]) == ("concluido", 2, 2, "licencas")
+    assert job["concluido_em"]
+    assert _espelho(aplicacao)[job_id] == job
+
+    # Outro processo (sem o job na memória) responde pelo espelho
+    importacoes._jobs.clear()
+    assert cliente.get(f"/importacoes/{job_id}").get_json() == job
+
+def test_job_com_erro_tambem_vai_para_o_disco(aplicacao, cliente):
+    job_id = _importar(cliente, b"isto nao e um xlsx", "licencas.xlsx")
+    importacoes._jobs.clear()
+    job = cliente.get(f"/importacoes/{job_id}").get_json()
+    assert job["estado"] == "erro"
+    assert job["mensagem"].startswith("Falha na importação")
+
+def test_job_desconhecido(cliente):
+    assert cliente.get("/importacoes/nao-existe").status_code == 404
+
+def test_importacao_em_segundo_plano(aplicacao, cliente):
+    aplicacao.config["IMPORTACAO_EM_SEGUNDO_PLANO"] = True
+    job_id = _importar(cliente, _csv("Ana"))
+    limite = time.monotonic() + 10
+    while (job := cliente.get(f"/importacoes/{job_id}").get_json())["estado"] in ("na_fila", "processando"):
+        assert time.monotonic() < limite
+        time.sleep(0.05)
+    assert (job["estado"], job["gravados"]) == ("concluido", 1)
+    assert _espelho(aplicacao)[job_id]["estado"] == "concluido"
+
+def test_tabela_de_jobs_e_podada(aplicacao, cliente, monkeypatch):
+    monkeypatch.setattr(importacoes, "MANTER_JOBS", 2)
+    ids = [_importar(cliente, _csv(nome)) for nome in ("Ana", "Bruno", "Carla")]
+    assert set(_espelho(aplicacao)) == set(ids[1:])
+
+def _registro(aplicacao) -> dict[str, dict]:
+    arquivo = Path(aplicacao.config["DIRETORIO_DADOS"]) / importacoes.ARQUIVO_REGISTRO
+    return {it["id"]: it for it in json.loads(arquivo.read_text(encoding="utf-8"))}
+
+def _licencas(aplicacao) -> list[dict]:
+    return json.loads((Path(aplicacao.config["DIRETORIO_DADOS"]) / "licencas.json").read_text(encoding="utf-8"))
+
+def test_mesmo_arquivo_nao_e_importado_de_novo(aplicacao, cliente):
+    conteudo = _csv("Ana", "Bruno")
+    primeiro = _importar(cliente, conteudo)
+    [registro] = _registro(aplicacao).values()
+    assert (registro["colecao"], registro["job"], registro["arquivo"]) == ("licencas", primeiro, "licencas.csv")
+    assert registro["tamanho"] == len(conteudo)
+
+    segundo = _importar(cliente, conteudo, "copia.csv")  # o nome não importa, só o conteúdo
+    job = cliente.get(f"/importacoes/{segundo}").get_json()
+    assert (job["estado"], job["duplicado_de"], job["lidos"], job["gravados"]) == ("concluido", primeiro, 0, 0)
+    assert "já foi importado" in job["mensagem"]
+    assert len(_licencas(aplicacao)) == 2
+    assert _registro(aplicacao)[registro["id"]]["job"] == primeiro
+
+def test_reimportar_repete_a_importacao(aplicacao, cliente):
+    conteudo = _csv("Ana", "Bruno")
+    _importar(cliente, conteudo)
+    segundo = _importar(cliente, conteudo, reimportar="1")
+    job = cliente.get(f"/importacoes/{segundo}").get_json()
+    assert (job["duplicado_de"], job["gravados"]) == ("", 2)
+    assert len(_licencas(aplicacao)) == 4
+    [registro] = _registro(aplicacao).values()
+    assert registro["job"] == segundo
+
+def test_arquivo_diferente_e_importado(aplicacao, cliente):
+    _importar(cliente, _csv("Ana"))
+    job = cliente.get(f"/importacoes/{_importar(cliente, _csv('Bruno'))}").get_json()
+    assert (job["duplicado_de"], job["gravados"]) == ("", 1)
+    assert len(_registro(aplicacao)) == 2
+
+def test_importacao_com_erro_nao_fica_registrada(aplicacao, cliente):
+    conteudo = b"isto nao e um xlsx"
+    _importar(cliente, conteudo, "licencas.xlsx")
+    job = cliente.get(f"/importacoes/{_importar(cliente, conteudo, 'licencas.xlsx')}").get_json()
+    assert (job["estado"], job["duplicado_de"]) == ("erro", "")
+    assert _registro(aplicacao) == {}
+
+def test_lote_pula_so_os_arquivos_ja_importados(aplicacao, cliente):
+    ja_importado = _csv("Ana")
+    primeiro = _importar(cliente, ja_importado)
+    resp = cliente.post("/licencas/importar", content_type="multipart/form-data", data={"arquivo": [
+        (io.BytesIO(ja_importado), "filial_01.csv"), (io.BytesIO(_csv("Bruno", "Carla")), "filial_02.csv")]})
+    job = importacoes.obter(parse_qs(urlsplit(resp.location).query)["job"][0])
+    assert (job["estado"], job["gravados"]) == ("concluido", 2)
+    assert [(p["arquivo"], p.get("duplicado_de", "")) for p in job["planilhas"]] == \
+        [("filial_01.csv", primeiro), ("filial_02.csv", "")]
+    assert "1 arquivo(s) já importado(s) antes foram pulados" in job["mensagem"]
+    assert {r["arquivo"] for r in _registro(aplicacao).values()} == {"licencas.csv", "filial_02.csv"}
+
+def test_registro_e_podado(aplicacao, cliente, monkeypatch):
+    monkeypatch.setattr(importacoes, "MANTER_REGISTROS", 2)
+    for nome in ("Ana", "Bruno", "Carla"):
+        _importar(cliente, _csv(nome), f"{nome}.csv")
+    assert [r["arquivo"] for r in _registro(aplicacao).values()] == ["Bruno.csv", "Carla.csv"]
@@ -0,0 +1,64 @@
+# tests/test_importador.py
+
+import pytest
+
+from app.helpers import importador
+
+def _csv(linhas: list[str], codificacao: str) -> bytes:
+    return ("\r\n".join(linhas) + "\r\n").encode(codificacao)
+
+def _ler(conteudo: bytes) -> tuple[list[str], list[list[str]]]:
+    cabecalho, linhas = importador._ler_planilha(conteudo, "planilha.csv")
+    return cabecalho, list(linhas)
+
+def _muitas_linhas() -> list[str]:
+    """Cabeçalho e linhas só em ASCII, mais que a amostra usada para detectar a codificação."""
+    linhas = ["nome;filial"] + [f"Pessoa {i};Catanduva" for i in range(5000)]
+    assert len("\r\n".join(linhas)) > importador.AMOSTRA_CSV
+    return linhas
+
+def test_acento_em_cp1252_depois_da_amostra():
+    conteudo = _csv(_muitas_linhas() + ["José;São José do Rio Preto"], "cp1252")
+    cabecalho, linhas = _ler(conteudo)
+    assert cabecalho == ["nome", "filial"]
+    assert len(linhas) == 5001
+    assert linhas[0] == ["Pessoa 0", "Catanduva"]
+    assert linhas[-1] == ["José", "São José do Rio Preto"]
+
+def test_acento_em_utf8_depois_da_amostra():
+    conteudo = _csv(_muitas_linhas() + ["José;São José do Rio Preto"], "utf-8")
+    assert _ler(conteudo)[1][-1] == ["José", "São José do Rio Preto"]
+
+@pytest.mark.parametrize("codificacao", ["utf-8", "utf-8-sig", "cp1252"])
+def test_codificacoes_do_excel(codificacao):
+    cabecalho, linhas = _ler(_csv(["Nome,Função", "Ana,Técnica", "Bruno,Análise"], codificacao))
+    assert cabecalho == ["Nome", "Função"]
+    assert linhas == [["Ana", "Técnica"], ["Bruno", "Análise"]]
+
+def test_byte_invalido_falha_com_mensagem():
+    with pytest.raises(ValueError, match="0x81"):
+        _ler(b"nome;filial\r\n\x81;Catanduva\r\n")
+    with pytest.raises(ValueError, match="0x81"):
+        _ler(_csv(_muitas_linhas(), "ascii") + b"\x81;Catanduva\r\n")
+
+MAPA = {
+    "nome": ["colaborador", "nome completo"],
+    "filial": ["unidade", "filial / loja"],
+    "numero_serie": ["n° de série", "serial"],
+}
+CABECALHOS = ("Colaborador", "UNIDADE ", "Número de Série", "Nome do Colaborador", "Seriall", "Observações", "")
+
+def test_pontuar_cabecalhos():
+    resultado = importador._MapaCompilado(MAPA).pontuar(CABECALHOS)
+    assert resultado["Colaborador"] == ("nome", 100)
+    assert resultado["UNIDADE "] == ("filial", 100)
+    assert resultado["Número de Série"][0] == "numero_serie"
+    assert resultado["Nome do Colaborador"][0] == "nome"
+    assert resultado["Seriall"][0] == "numero_serie"
+    assert resultado["Observações"] == (None, 0)
+    assert resultado[""] == (None, 0)
+
+def test_pontuar_sem_rapidfuzz_da_o_mesmo_resultado(monkeypatch):
+    esperado = importador._MapaCompilado(MAPA).pontuar(CABECALHOS)
+    monkeypatch.setattr(importador, "rf_process", None)
+    assert importador._MapaCompilado(MAPA).pontuar(CABECALHOS) == esperado
@@ -0,0 +1,43 @@
+# tests/test_kpis.py
+
+from pathlib import Path
+
+from flask import Flask, render_template_string
+
+from app.helpers import kpis
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+def test_ultimas_entregas_sem_campos_usam_o_padrao_do_template():
+    entregas = kpis._Entregas(None)
+    entregas.gravar({"id": "1", "glpi": "123", "solicitante": "Ana", "produto_nome": "Mouse", "qtd": "2"})
+    entregas.gravar({"id": "2", "solicitante": "Bruno"})
+    assert entregas.ultimas(5) == [{"id": "2", "solicitante": "Bruno"},
+                                   {"id": "1", "glpi": "123", "solicitante": "Ana", "produto_nome": "Mouse", "qtd": "2"}]
+
+    # Mesmo trecho de templates/index.html
+    linha = ("{% for e in entregas %}{{ e.get('glpi', '-') }}|{{ e.get('solicitante', 'N/A') }}|"
+             "{{ e.get('produto_nome', 'N/A') }}|{{ e.get('qtd', '0') }};{% endfor %}")
+    assert "entrega.get('glpi', '-')" in (RAIZ / "app/templates/index.html").read_text(encoding="utf-8")
+    with Flask(__name__).app_context():
+        assert render_template_string(linha, entregas=entregas.ultimas(5)) == "-|Bruno|N/A|0;123|Ana|Mouse|2;"
+
+def test_agregados_com_campos_ausentes_e_regravacao():
+    lic = kpis._Licencas(None)
+    lic.gravar({"id": "1", "licenca": "Office", "situacao": "ATIVO"})
+    lic.gravar({"id": "2", "situacao": "ativo"})  # sem licenca: conta como ""
+    lic.gravar({"id": "3", "licenca": "Office", "situacao": "INATIVO"})
+    assert (dict(lic.ativas_por_tipo), lic.inativas) == ({"Office": 1, "": 1}, 1)
+
+    lic.gravar({"id": "1", "situacao": "INATIVO"})  # registro inteiro: a licenca saiu
+    lic.gravar({"id": "3", "licenca": "Windows"})
+    lic.remover("2")
+    assert (dict(lic.ativas_por_tipo), lic.inativas) == ({"Windows": 1}, 1)
+    assert lic.registros["1"] == {"situacao": "INATIVO"}
+
+    eqp = kpis._Equipamentos(None)
+    eqp.gravar({"id": "1", "filial": "02-Catanduva"})
+    eqp.gravar({"id": "2"})
+    assert dict(eqp.por_filial) == {"02-Catanduva": 1, "Sem Filial": 1}
+    eqp.gravar({"id": "2", "filial": "02-Catanduva"})
+    assert dict(eqp.por_filial) == {"02-Catanduva": 2}
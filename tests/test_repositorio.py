@@ -0,0 +1,38 @@
+# tests/test_repositorio.py
+
+import pytest
+from flask import Flask
+
+from app.helpers import armazenamento_journal, armazenamento_json, colecoes, repositorio as repo
+
+@pytest.fixture(params=["json", "journal", "sqlite"])
+def colecao(request, tmp_path):
+    colecoes.registrar("teste", ["nome", "filial"], indices=("filial",), busca=("nome",))
+    app = Flask(__name__)
+    app.config.update(MOTOR_DADOS=request.param, DIRETORIO_DADOS=str(tmp_path))
+    with app.app_context():
+        yield tmp_path / "teste.json"
+    colecoes.COLECOES.pop("teste", None)
+    armazenamento_json.limpar_cache()
+    armazenamento_journal._colecoes.clear()
+
+def test_alterar_resultados_nao_mexe_nas_proximas_leituras(colecao):
+    repo.gravar_lote(colecao, [{"id": "1", "nome": "Ana", "filial": "02-Catanduva"},
+                               {"id": "2", "nome": "Bruno", "filial": "03-Barretos"}])
+    leituras = [
+        lambda: repo.listar(colecao),
+        lambda: repo.filtrar(colecao, filial="02-Catanduva"),
+        lambda: repo.filtrar(colecao, busca="ana"),
+        lambda: repo.listar_pagina(colecao, {"filial": "02-Catanduva"})[0],
+        lambda: repo.listar_pagina(colecao, ordem="-nome")[0],
+        lambda: [item for _, item in repo.buscar(colecao, "ana")],
+    ]
+    for ler in leituras:
+        for item in ler():
+            item["nome"] = "alterado fora do repositório"
+            item["filial"] = "99-Outra"
+    assert repo.listar(colecao) == [{"id": "1", "nome": "Ana", "filial": "02-Catanduva"},
+                                    {"id": "2", "nome": "Bruno", "filial": "03-Barretos"}]
+    assert [it["id"] for it in repo.filtrar(colecao, filial="02-Catanduva")] == ["1"]
+    assert repo.contar(colecao, filial="99-Outra") == 0
+    assert repo.contar_por(colecao, "filial") == {"02-CATANDUVA": 1, "03-BARRETOS": 1}
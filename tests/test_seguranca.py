@@ -0,0 +1,89 @@
+# tests/test_seguranca.py
+
+import pytest
+
+from app.helpers import seguranca
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+@pytest.fixture
+def relogio(monkeypatch):
+    r = Relogio()
+    monkeypatch.setattr(seguranca.time, "monotonic", r)
+    return r
+
+@pytest.fixture
+def limitador(aplicacao, relogio):
+    aplicacao.config.update(LOGIN_JANELA_SEGUNDOS=60, LOGIN_MAX_TENTATIVAS=3, LOGIN_MAX_TENTATIVAS_IP=5)
+    with aplicacao.app_context():
+        yield seguranca.Limitador()
+
+def test_bloqueia_o_login_depois_do_maximo(limitador, relogio):
+    assert [limitador.tentar("ana", "10.0.0.1") for _ in range(3)] == [0, 0, 0]
+    relogio.agora += 20
+    assert limitador.tentar("ANA", "10.0.0.2") == 40  # mesmo login, outro IP, sem diferenciar maiúsculas
+    assert limitador.tentar("bruno", "10.0.0.1") == 0
+
+def test_janela_expira(limitador, relogio):
+    for _ in range(3):
+        limitador.tentar("ana", "10.0.0.1")
+        relogio.agora += 10
+    assert limitador.tentar("ana", "10.0.0.1") == 30
+    relogio.agora += 30.5  # a primeira tentativa saiu da janela
+    assert limitador.tentar("ana", "10.0.0.1") == 0
+    assert limitador.tentar("ana", "10.0.0.1") == 10
+
+def test_tentativa_recusada_nao_conta(limitador, relogio):
+    for _ in range(3):
+        limitador.tentar("ana", "10.0.0.1")
+    for _ in range(10):
+        assert limitador.tentar("ana", "10.0.0.1")
+    relogio.agora += 60
+    assert limitador.tentar("ana", "10.0.0.1") == 0
+
+def test_sucesso_zera_o_login_e_devolve_a_vaga_do_ip(limitador):
+    for _ in range(3):
+        limitador.tentar("ana", "10.0.0.1")
+    limitador.sucesso("Ana", "10.0.0.1")
+    assert [limitador.tentar("ana", "10.0.0.1") for _ in range(3)] == [0, 0, 0]  # IP: 3 - 1 + 3 = 5
+    assert limitador.tentar("bruno", "10.0.0.1") > 0
+
+def test_limite_por_ip(limitador):
+    for login in ("a", "b", "c", "d", "e"):
+        assert limitador.tentar(login, "10.0.0.1") == 0
+    assert limitador.tentar("f", "10.0.0.1") == 60
+    assert limitador.tentar("f", "10.0.0.9") == 0
+
+def test_limite_zero_desliga(aplicacao, limitador):
+    aplicacao.config.update(LOGIN_MAX_TENTATIVAS=0, LOGIN_MAX_TENTATIVAS_IP=0)
+    assert all(limitador.tentar("ana", "10.0.0.1") == 0 for _ in range(50))
+
+def test_chaves_mais_antigas_saem_primeiro(aplicacao, relogio):
+    aplicacao.config.update(LOGIN_JANELA_SEGUNDOS=60, LOGIN_MAX_TENTATIVAS=1, LOGIN_MAX_TENTATIVAS_IP=0)
+    with aplicacao.app_context():
+        limitador = seguranca.Limitador(max_chaves=4)  # login + IP de cada tentativa
+        limitador.tentar("ana", "10.0.0.1")
+        limitador.tentar("bruno", "10.0.0.2")
+        assert limitador.tentar("ana", "10.0.0.1") > 0  # usada agora: vai para o fim da fila
+        limitador.tentar("carla", "10.0.0.3")
+        assert len(limitador._tentativas) == 4
+        assert limitador.tentar("ana", "10.0.0.1") > 0
+        assert limitador.tentar("bruno", "10.0.0.2") == 0  # esquecido
+
+def test_rota_de_login_responde_429_sem_conferir_a_senha(aplicacao, monkeypatch):
+    aplicacao.config.update(LOGIN_MAX_TENTATIVAS=2)
+    verificacoes = []
+    verificar = seguranca.verificar
+    monkeypatch.setattr(seguranca, "verificar", lambda u, s: verificacoes.append(s) or verificar(u, s))
+    c = aplicacao.test_client()
+    for _ in range(2):
+        assert c.post("/auth/login", data={"login": "admin", "senha": "errada"}).status_code == 302
+    resp = c.post("/auth/login", data={"login": "admin", "senha": "admin123"})
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) > 0
+    assert verificacoes == ["errada", "errada"]
@@ -0,0 +1,79 @@
+# tests/test_serie_kpis.py
+
+import csv
+import os
+import subprocess
+import sys
+import textwrap
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+from flask import Flask
+
+from app.helpers import armazenamento_json, repositorio as repo, serie_kpis
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+@pytest.fixture
+def pasta(tmp_path):
+    yield tmp_path
+    serie_kpis._series.clear()
+    serie_kpis._ultima_foto.clear()
+    armazenamento_json.limpar_cache()
+
+def _linhas(pasta: Path) -> list[list[str]]:
+    with open(serie_kpis.caminho(pasta), newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+def test_varios_processos_acrescentando_e_compactando_nao_perdem_linhas(pasta):
+    # Cada processo grava métricas só dele e compacta a série a cada fotografia
+    script = textwrap.dedent(f"""
+        import sys
+        from app.helpers import kpis, serie_kpis
+        n = sys.argv[1]
+        kpis.painel = lambda pasta=None: {{}}
+        for i in range(40):
+            serie_kpis.medir = lambda painel, pasta, i=i: [(f"p{{n}}_{{i}}", "", i)]
+            serie_kpis.registrar({str(pasta)!r}, forcar=True)
+            serie_kpis.compactar({str(pasta)!r})
+    """)
+    env = {**os.environ, "PYTHONPATH": str(RAIZ)}
+    processos = [subprocess.Popen([sys.executable, "-c", script, str(n)], cwd=RAIZ, env=env) for n in range(4)]
+    assert all(p.wait() == 0 for p in processos)
+    metricas = {linha[1] for linha in _linhas(pasta)}
+    assert metricas == {f"p{n}_{i}" for n in range(4) for i in range(40)}
+
+def test_gravacao_numa_colecao_do_painel_fotografa_uma_vez_por_intervalo(pasta):
+    app = Flask(__name__)
+    app.config.update(MOTOR_DADOS="json", DIRETORIO_DADOS=str(pasta))
+    with app.app_context():
+        repo.criar(pasta / "ferias.json", {"nome": "Ana"})  # não entra na série
+        assert not serie_kpis.caminho(pasta).exists()
+
+        repo.criar(pasta / "cameras.json", {"nome": "Portaria", "filial": "02-Catanduva"})
+        hoje = date.today().isoformat()
+        linhas = _linhas(pasta)
+        assert [hoje, "cameras", "", "1"] in linhas
+
+        repo.criar(pasta / "cameras.json", {"nome": "Pátio", "filial": "02-Catanduva"})
+        assert _linhas(pasta) == linhas  # dentro do INTERVALO_SEGUNDOS
+
+        assert serie_kpis.registrar(pasta, forcar=True)
+        assert [hoje, "cameras", "", "2"] in _linhas(pasta)
+        assert serie_kpis.tendencia("cameras", pasta=pasta) == {"labels": [hoje], "data": [2]}
+
+def test_compactar_deixa_um_valor_por_dia_e_por_semana(pasta):
+    hoje = date(2026, 6, 30)
+    dias = [hoje - timedelta(days=d) for d in (0, 0, 1, 130, 131, 132, serie_kpis.RETENCAO_DIAS + 1)]
+    with open(serie_kpis.caminho(pasta), "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows((d.isoformat(), "cameras", "", str(n)) for n, d in enumerate(dias))
+
+    assert serie_kpis.compactar(pasta, hoje) == 3
+    semana = {d.isocalendar()[:2] for d in dias[3:6]}
+    assert len(semana) == 1  # 130-132 dias atrás caem na mesma semana
+    assert _linhas(pasta) == [
+        [dias[3].isoformat(), "cameras", "", "3"],  # o dia mais recente da semana
+        [dias[2].isoformat(), "cameras", "", "2"],
+        [hoje.isoformat(), "cameras", "", "1"],     # vale o último valor do dia
+    ]
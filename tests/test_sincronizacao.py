@@ -0,0 +1,92 @@
+# tests/test_sincronizacao.py
+
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from app.blueprints import licencas
+from app.helpers import importacoes, repositorio as repo, sincronizacao
+
+@pytest.fixture
+def contexto(aplicacao):
+    with aplicacao.app_context():
+        yield Path(aplicacao.config["DIRETORIO_DADOS"]) / "licencas.json"
+
+def _gravar(path: Path, linhas, **opcoes) -> dict:
+    job = importacoes.Job("licencas", "export.csv", str(path.parent), modo="sincronizar")
+    return licencas._gravar(iter(linhas), job, sincronizar=True, **opcoes)
+
+def _por_email(path: Path) -> dict[str, dict]:
+    return {it["email"]: it for it in repo.listar(path)}
+
+@pytest.fixture
+def cadastro(contexto):
+    repo.gravar_lote(contexto, [
+        {"id": "a", "email": "ana@x.com", "nome": "Ana", "licenca": "E3", "situacao": "ATIVO"},
+        {"id": "b", "email": "bruno@x.com", "nome": "Bruno", "licenca": "E3", "situacao": "INATIVO",
+         "data_desligamento": "2026-01-31"},
+        {"id": "c", "email": "carla@x.com", "nome": "Carla", "licenca": "E3", "situacao": "ATIVO"},
+        {"id": "d", "matricula": "123", "nome": "Davi", "licenca": "F3", "situacao": "INATIVO",
+         "data_desligamento": "2026-02-28", "email": ""},
+    ])
+    return contexto
+
+def test_contagens_de_inseridos_atualizados_e_ausentes(cadastro):
+    res = _gravar(cadastro, [
+        {"email": "ANA@x.com ", "nome": "Ana", "licenca": "E5", "situacao": ""},  # atualiza a licença
+        {"email": "carla@x.com", "nome": "Carla", "licenca": "E3"},               # igual ao gravado
+        {"email": "eva@x.com", "nome": "Eva", "licenca": "E3"},                   # nova
+        {"email": "eva@x.com", "nome": "Eva", "cargo": "Analista"},               # repetida: mesmo registro
+        {"nome": "Sem chave"},                                                      # ignorada
+    ])
+    assert {k: res[k] for k in ("inseridos", "atualizados", "inalterados", "ausentes", "marcados", "ignorados")} == \
+        {"inseridos": 1, "atualizados": 1, "inalterados": 1, "ausentes": 2, "marcados": 0, "ignorados": 1}
+
+    atuais = {it["id"]: it for it in repo.listar(cadastro)}
+    assert len(atuais) == 5
+    assert atuais["a"]["licenca"] == "E5"  # casou sem diferenciar maiúsculas e espaços
+    eva = next(it for it in atuais.values() if it["email"] == "eva@x.com")
+    assert (eva["licenca"], eva["cargo"], eva["situacao"]) == ("E3", "Analista", "ATIVO")
+    assert atuais["b"]["situacao"] == "INATIVO"  # ausente, mas sem inativar_ausentes
+
+def test_padrao_nao_sobrescreve_a_situacao_gravada(cadastro):
+    res = _gravar(cadastro, [{"email": "bruno@x.com", "nome": "Bruno", "licenca": "E5", "situacao": ""}])
+    assert (res["inseridos"], res["atualizados"]) == (0, 1)
+    bruno = _por_email(cadastro)["bruno@x.com"]
+    assert (bruno["situacao"], bruno["data_desligamento"], bruno["licenca"]) == ("INATIVO", "2026-01-31", "E5")
+
+def test_reativado_pela_planilha_limpa_o_desligamento(cadastro):
+    _gravar(cadastro, [{"email": "bruno@x.com", "situacao": "ativo"},
+                       {"matricula": "123", "situacao": "INATIVO", "licenca": "F3"}])
+    atuais = {it["id"]: it for it in repo.listar(cadastro)}
+    assert (atuais["b"]["situacao"], atuais["b"]["data_desligamento"]) == ("ativo", "")
+    assert (atuais["d"]["situacao"], atuais["d"]["data_desligamento"]) == ("INATIVO", "2026-02-28")
+
+def test_inativar_ausentes(cadastro):
+    res = _gravar(cadastro, [{"email": "ana@x.com", "nome": "Ana"}], inativar_ausentes=True)
+    assert (res["ausentes"], res["marcados"]) == (3, 1)  # Bruno e Davi já estavam inativos
+    atuais = {it["id"]: it for it in repo.listar(cadastro)}
+    assert atuais["a"]["situacao"] == "ATIVO"
+    assert (atuais["c"]["situacao"], atuais["c"]["data_desligamento"]) == ("INATIVO", date.today().isoformat())
+    assert atuais["b"]["data_desligamento"] == "2026-01-31"
+
+def test_edicao_durante_a_leitura_nao_e_perdida(cadastro):
+    def linhas():
+        yield {"email": "ana@x.com", "licenca": "E5"}
+        # Edição pela web e cadastro novo enquanto a planilha ainda é lida
+        repo.atualizar(cadastro, "a", {**repo.obter_por_id(cadastro, "a"), "cargo": "Gerente"})
+        repo.criar(cadastro, {"email": "novo@x.com", "nome": "Novo", "situacao": "ATIVO"})
+        repo.excluir(cadastro, "c")
+        yield {"email": "carla@x.com", "licenca": "E5"}
+
+    res = _gravar(cadastro, linhas(), inativar_ausentes=True)
+    atuais = _por_email(cadastro)
+    assert (atuais["ana@x.com"]["licenca"], atuais["ana@x.com"]["cargo"]) == ("E5", "Gerente")
+    assert "carla@x.com" not in atuais                 # excluída não volta
+    assert atuais["novo@x.com"]["situacao"] == "ATIVO"  # cadastrado durante a leitura não é ausente
+    assert res["atualizados"] == 1
+
+def test_colecao_sem_chave_natural(contexto):
+    with pytest.raises(ValueError, match="chave natural"):
+        sincronizacao.sincronizar(contexto.parent / "perifericos_estoque.json", [{"produto": "Mouse"}])